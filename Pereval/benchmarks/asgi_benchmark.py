@@ -0,0 +1,201 @@
+"""
+Сравнение пропускной способности чтения перевалов: WSGI с пулом потоков против ASGI.
+
+Приложения вызываются в том же процессе без сети: WSGI-приложение — из
+клиентских потоков, не более --wsgi-threads одновременно (как gunicorn с
+потоками), ASGI-приложение — из корутин в одном цикле событий с асинхронными
+представлениями (PEREVAL_ASYNC_READS). Каждый из --concurrency клиентов
+отправляет следующий запрос после ответа на предыдущий.
+
+Кэш ответов отключён, чтобы каждый запрос читал БД. Задержка --db-latency-ms
+добавляется к каждому SQL-запросу и имитирует сетевую БД: с SQLite в памяти
+запросы почти ничего не стоят, и разница между моделями не видна. Пока время
+ответа определяется процессором (сериализация, переходы между потоками в
+sync_to_async), WSGI быстрее; ASGI выигрывает, когда запросы в основном ждут БД.
+
+Запуск из каталога Pereval:
+    python benchmarks/asgi_benchmark.py --concurrency 10 50 200
+"""
+import argparse
+import asyncio
+import importlib
+import io
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pereval_project.settings')
+os.environ['FSTR_CACHE_BACKEND'] = 'django.core.cache.backends.dummy.DummyCache'
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.asgi import get_asgi_application  # noqa: E402
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+from django.urls import clear_url_caches  # noqa: E402
+
+from pereval_app.models import Coords, PerevalAdded, User  # noqa: E402
+
+EMAIL = 'bench@example.com'
+
+# Как в рабочем развёртывании: без DEBUG запросы к БД не накапливаются в connection.queries
+settings.DEBUG = False
+settings.ALLOWED_HOSTS = ['localhost']
+
+
+def fill(count):
+    user = User.objects.create(email=EMAIL, last_name='Тест', first_name='Тест', middle_name='Тест', phone='0')
+    coords = Coords.objects.bulk_create([Coords(latitude=43.0, longitude=42.0, height=3000) for _ in range(count)])
+    perevals = PerevalAdded.objects.bulk_create([
+        PerevalAdded(user=user, coords=item, beauty_title='пер.', title=f'Перевал Эльбрус {i}', other_titles='')
+        for i, item in enumerate(coords)
+    ])
+    return [pereval.id for pereval in perevals]
+
+
+def add_db_latency(latency):
+    """Задержка перед каждым SQL-запросом во всех соединениях."""
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(latency)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(wrapper)
+
+    connection_created.connect(install, weak=False)
+    connection.execute_wrappers.append(wrapper)
+
+
+def use_async_reads(enabled):
+    """Переключает представления чтения и перечитывает конфигурацию URL."""
+    settings.PEREVAL_ASYNC_READS = enabled
+    for module in ['pereval_app.urls', 'pereval_project.urls']:
+        importlib.reload(importlib.import_module(module))
+    clear_url_caches()
+
+
+def request_paths(ids, total):
+    paths = []
+    for i in range(total):
+        kind = i % 3
+        if kind == 0:
+            paths.append((f'/api/submitData/{ids[i % len(ids)]}/', ''))
+        elif kind == 1:
+            paths.append(('/api/submitData/list/', urlencode({'user__email': EMAIL, 'page_size': 10})))
+        else:
+            paths.append(('/api/submitData/search/', urlencode({'q': 'эльбрус', 'page_size': 10})))
+    return paths
+
+
+def run_wsgi(paths, concurrency, threads):
+    application = get_wsgi_application()
+    workers = threading.Semaphore(threads)
+    timings = []
+
+    def call(path, query):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        }
+        started = time.perf_counter()
+        with workers:
+            statuses = []
+            body = b''.join(application(environ, lambda status, headers: statuses.append(status)))
+        timings.append(time.perf_counter() - started)
+        assert statuses[0].startswith('200'), (path, statuses[0], body[:200])
+
+    def client(client_paths):
+        for path, query in client_paths:
+            call(path, query)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, [paths[i::concurrency] for i in range(concurrency)]))
+    return time.perf_counter() - started, timings
+
+
+def run_asgi(paths, concurrency):
+    application = get_asgi_application()
+    timings = []
+
+    async def call(path, query):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'headers': [(b'host', b'localhost')], 'server': ('localhost', 80),
+        }
+        messages = []
+        requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        finished = asyncio.Event()
+
+        async def receive():
+            # Тело запроса, затем отключение клиента после ответа
+            if requests:
+                return requests.pop()
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body'):
+                finished.set()
+
+        started = time.perf_counter()
+        await application(scope, receive, send)
+        timings.append(time.perf_counter() - started)
+        assert messages[0]['status'] == 200, (path, messages)
+
+    async def client(client_paths):
+        for path, query in client_paths:
+            await call(path, query)
+
+    async def main():
+        await asyncio.gather(*[client(paths[i::concurrency]) for i in range(concurrency)])
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return time.perf_counter() - started, timings
+
+
+def report(name, concurrency, elapsed, timings):
+    timings = sorted(timing * 1000 for timing in timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f'{name:>5} x{concurrency:<4}: {len(timings) / elapsed:8.1f} запр/с, '
+        f'медиана {statistics.median(timings):8.2f} мс, p95 {p95:8.2f} мс'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=1000, help='Количество перевалов')
+    parser.add_argument('--requests', type=int, default=600, help='Количество запросов на один замер')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 200], help='Число клиентов')
+    parser.add_argument('--wsgi-threads', type=int, default=8, help='Потоков у WSGI-сервера')
+    parser.add_argument('--db-latency-ms', type=float, default=2, help='Задержка каждого SQL-запроса')
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        paths = request_paths(fill(args.count), args.requests)
+        add_db_latency(args.db_latency_ms / 1000)
+        for concurrency in args.concurrency:
+            use_async_reads(False)
+            report('WSGI', concurrency, *run_wsgi(paths, concurrency, args.wsgi_threads))
+            use_async_reads(True)
+            report('ASGI', concurrency, *run_asgi(paths, concurrency))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""
+Замер всех эндпоинтов pereval_app/urls.py на синтетических данных.
+
+Создаёт тестовую БД (для SQLite — в памяти) и временный каталог медиафайлов,
+заполняет их командой generate_dataset и вызывает каждый эндпоинт через
+django.test.Client в том же процессе, без сети. Для каждого эндпоинта
+выводит p50/p95/p99 и среднее время ответа, пропускную способность, число
+SQL-запросов на запрос и коды ответов. Результат — JSON, пригодный для
+сравнения между коммитами: с --compare сравнивает p50 с прошлым замером
+и завершается с кодом 1, если какой-то эндпоинт стал медленнее порога.
+
+Запуск из каталога Pereval:
+    python benchmarks/endpoint_benchmark.py --output before.json
+    python benchmarks/endpoint_benchmark.py --compare before.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pereval_project.settings')
+os.environ.setdefault('FSTR_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from pereval_app import tiles, urls  # noqa: E402
+from pereval_app.models import PerevalAdded, PerevalArea, UploadSession, User  # noqa: E402
+
+settings.ALLOWED_HOSTS = ['testserver']
+
+
+def percentile(timings, fraction):
+    """Процентиль отсортированного списка методом ближайшего ранга."""
+    index = max(0, min(len(timings) - 1, round(fraction * len(timings) + 0.5) - 1))
+    return timings[index]
+
+
+def jpeg_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (120, 160, 200)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class Scenarios:
+    """
+         Запросы к каждому эндпоинту по имени URL.
+
+         Метод сценария получает номер итерации, готовит данные (это время
+         не замеряется) и возвращает (метод HTTP, путь, параметры Client).
+     """
+    def __init__(self, rng):
+        self.rng = rng
+        self.emails = list(User.objects.values_list('email', flat=True))
+        self.ids = list(PerevalAdded.objects.values_list('id', flat=True))
+        self.areas = list(PerevalArea.objects.values_list('id', flat=True))
+        self.new_ids = list(PerevalAdded.objects.filter(status=PerevalAdded.NEW).values_list('id', flat=True))
+        self.image = jpeg_bytes()
+
+    def payload(self, i):
+        return {
+            'user': {
+                'email': self.rng.choice(self.emails), 'last_name': 'Тест', 'first_name': 'Тест',
+                'middle_name': 'Тест', 'phone': '79990000000'
+            },
+            'coords': {'latitude': 43.35, 'longitude': 42.44, 'height': 3200},
+            'images': [],
+            'beauty_title': 'пер.',
+            'title': f'Замер {i}',
+            'other_titles': 'Замер',
+            'connect': '',
+            'level_spring': '1A', 'level_summer': '1A', 'level_autumn': '1A', 'level_winter': '2A'
+        }
+
+    def submit_data(self, i):
+        return 'post', reverse('submit_data'), {'data': self.payload(i), 'content_type': 'application/json'}
+
+    def submit_data_batch(self, i):
+        data = [self.payload(i) for _ in range(20)]
+        return 'post', reverse('submit_data_batch'), {'data': data, 'content_type': 'application/json'}
+
+    def submit_data_detail(self, i):
+        return 'get', reverse('submit_data_detail', args=[self.rng.choice(self.ids)]), {}
+
+    def submit_data_update(self, i):
+        pk = self.new_ids[i % len(self.new_ids)]
+        data = {'title': f'Изменён {i}'}
+        return 'patch', reverse('submit_data_update', args=[pk]), {'data': data, 'content_type': 'application/json'}
+
+    def submit_data_list(self, i):
+        return 'get', reverse('submit_data_list'), {'data': {'user__email': self.rng.choice(self.emails)}}
+
+    def submit_data_export(self, i):
+        return 'get', reverse('submit_data_export'), {}
+
+    def submit_data_nearby(self, i):
+        params = {'lat': 43.2, 'lon': 42.5, 'radius_km': 50}
+        return 'get', reverse('submit_data_nearby'), {'data': params}
+
+    def submit_data_bbox(self, i):
+        params = {'lat_min': 42.5, 'lat_max': 44, 'lon_min': 41.5, 'lon_max': 43.5}
+        return 'get', reverse('submit_data_bbox'), {'data': params}
+
+    def submit_data_search(self, i):
+        return 'get', reverse('submit_data_search'), {'data': {'q': self.rng.choice(['эльбрус', 'казбек', 'ушба'])}}
+
+    def area_passes(self, i):
+        return 'get', reverse('area_passes', args=[self.rng.choice(self.areas)]), {}
+
+    def stats(self, i):
+        return 'get', reverse('stats'), {}
+
+    def tile(self, i):
+        # Масштабы от обзорного до отдельных перевалов; тайлы повторяются и попадают в кэш
+        z = self.rng.choice([2, 5, 8, 11, 14])
+        x, y = tiles.point_tile(43.2 + self.rng.uniform(-1, 1), 42.5 + self.rng.uniform(-1, 1), z)
+        return 'get', reverse('tile', args=[z, x, y]), {}
+
+    def sync(self, i):
+        return 'get', reverse('sync'), {'data': {'user__email': self.rng.choice(self.emails)}}
+
+    def moderation_claim(self, i):
+        data = {'moderator': f'moderator{i % 4}', 'limit': 10}
+        return 'post', reverse('moderation_claim'), {'data': data, 'content_type': 'application/json'}
+
+    def moderation_resolve(self, i):
+        moderator = f'moderator{i % 4}'
+        ids = list(PerevalAdded.objects.filter(claimed_by=moderator).values_list('id', flat=True)[:10])
+        data = {'moderator': moderator, 'accept': ids[:5], 'reject': ids[5:] or [0]}
+        return 'post', reverse('moderation_resolve'), {'data': data, 'content_type': 'application/json'}
+
+    def upload_create(self, i):
+        data = {'filename': f'bench_{i}.jpg', 'size': len(self.image)}
+        return 'post', reverse('upload_create'), {'data': data, 'content_type': 'application/json'}
+
+    def upload_session(self, i):
+        session = UploadSession.objects.create(filename=f'bench_{i}.jpg', size=len(self.image))
+        return 'put', reverse('upload_session', args=[session.id]), {
+            'data': self.image,
+            'content_type': 'application/octet-stream',
+            'HTTP_CONTENT_RANGE': f'bytes 0-{len(self.image) - 1}/{len(self.image)}',
+        }
+
+    def upload_finalize(self, i):
+        session = UploadSession.objects.create(filename=f'bench_{i}.jpg', size=len(self.image))
+        Client().put(
+            reverse('upload_session', args=[session.id]), self.image, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes 0-{len(self.image) - 1}/{len(self.image)}'
+        )
+        # Очередь модерации забирает новые перевалы с начала, поэтому берём последний
+        pereval = PerevalAdded.objects.filter(status=PerevalAdded.NEW).latest('id')
+        data = {'pereval': pereval.id, 'title': f'Замер {i}'}
+        return 'post', reverse('upload_finalize', args=[session.id]), {
+            'data': data, 'content_type': 'application/json'
+        }
+
+
+# Тяжёлые эндпоинты замеряются меньшее число раз
+ITERATIONS_DIVISOR = {'submit_data_export': 10}
+
+
+def run_endpoint(client, scenario, iterations):
+    timings, queries, statuses, sizes = [], [], Counter(), []
+    for i in range(iterations):
+        method, path, kwargs = scenario(i)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, **kwargs)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+            timings.append(time.perf_counter() - started)
+        queries.append(len(captured))
+        statuses[response.status_code] += 1
+        sizes.append(len(content))
+
+    timings = sorted(timing * 1000 for timing in timings)
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'throughput_rps': round(iterations / (sum(timings) / 1000), 1),
+        'queries_per_request': round(statistics.mean(queries), 2),
+        'max_queries': max(queries),
+        'response_bytes': round(statistics.mean(sizes)),
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """Эндпоинты, у которых p50 вырос больше чем в threshold раз относительно прошлого замера."""
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = json.load(file)['endpoints']
+    regressions = []
+    for name, result in results['endpoints'].items():
+        before = baseline.get(name)
+        if before and result['p50_ms'] > before['p50_ms'] * threshold:
+            regressions.append(f'{name}: p50 {before["p50_ms"]} -> {result["p50_ms"]} мс')
+        if before and result['queries_per_request'] > before['queries_per_request']:
+            regressions.append(
+                f'{name}: запросов к БД {before["queries_per_request"]} -> {result["queries_per_request"]}'
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--passes', type=int, default=5000)
+    parser.add_argument('--iterations', type=int, default=200, help='Запросов к каждому эндпоинту')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', nargs='+', help='Замерять только эти эндпоинты (имена URL)')
+    parser.add_argument('--output', help='Файл для JSON, по умолчанию stdout')
+    parser.add_argument('--compare', help='JSON прошлого замера для сравнения')
+    parser.add_argument('--threshold', type=float, default=1.2, help='Допустимый рост p50 при сравнении')
+    args = parser.parse_args()
+
+    names = [pattern.name for pattern in urls.urlpatterns]
+    missing = [name for name in names if not hasattr(Scenarios, name)]
+    if missing:
+        parser.error(f'Нет сценария для эндпоинтов: {", ".join(missing)}')
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with tempfile.TemporaryDirectory() as media_root:
+            settings.MEDIA_ROOT = media_root
+            call_command(
+                'generate_dataset', users=args.users, passes=args.passes, seed=args.seed, stdout=io.StringIO()
+            )
+            scenarios = Scenarios(random.Random(args.seed))
+            client = Client()
+            endpoints = {}
+            for name in args.only or names:
+                iterations = max(1, args.iterations // ITERATIONS_DIVISOR.get(name, 1))
+                endpoints[name] = run_endpoint(client, getattr(scenarios, name), iterations)
+                print(f'{name}: p50 {endpoints[name]["p50_ms"]} мс', file=sys.stderr)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'dataset': {'users': args.users, 'passes': args.passes, 'seed': args.seed},
+        'endpoints': endpoints,
+    }
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for line in regressions:
+            print(f'Регрессия: {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
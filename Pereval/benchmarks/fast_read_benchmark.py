@@ -0,0 +1,86 @@
+"""
+Сравнение чтения перевалов: PerevalAddedSerializer с JSONRenderer против fast_read с orjson.
+
+Создаёт тестовую БД (для SQLite — в памяти), заполняет её командой
+generate_dataset и для каждого размера выборки замеряет полный путь ответа
+списка: чтение из БД, построение данных и кодирование JSON. Перед замером
+проверяет, что оба пути дают одинаковые байты.
+
+Запуск из каталога Pereval:
+    python benchmarks/fast_read_benchmark.py --rows 1000 10000
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pereval_project.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from pereval_app import fast_read  # noqa: E402
+from pereval_app.models import PerevalAdded  # noqa: E402
+from pereval_app.serializers import PerevalAddedSerializer  # noqa: E402
+
+# Без DEBUG запросы к БД не накапливаются в connection.queries
+settings.DEBUG = False
+
+
+def serializer_path(queryset):
+    return JSONRenderer().render(PerevalAddedSerializer(queryset.with_related(), many=True).data)
+
+
+def fast_path(queryset):
+    return fast_read.render(fast_read.build_perevals(fast_read.pereval_rows(queryset)))
+
+
+def measure(function, queryset, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(queryset)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000], help='Размеры выборки')
+    parser.add_argument('--repeat', type=int, default=5, help='Повторов замера, берётся медиана')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with tempfile.TemporaryDirectory() as media_root:
+            settings.MEDIA_ROOT = media_root
+            call_command(
+                'generate_dataset', users=200, passes=max(args.rows), seed=args.seed, stdout=io.StringIO()
+            )
+            for rows in args.rows:
+                queryset = PerevalAdded.objects.order_by('-datetime', '-id')[:rows]
+                body = fast_path(queryset)
+                assert body == serializer_path(queryset), 'Ответы различаются'
+
+                slow = measure(serializer_path, queryset, args.repeat)
+                fast = measure(fast_path, queryset, args.repeat)
+                print(
+                    f'{rows:>6} строк: сериализатор {slow:9.1f} мс, fast_read {fast:8.1f} мс, '
+                    f'ускорение {slow / fast:4.1f}x, ответ {len(body) / 1024:8.0f} КиБ'
+                )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Сравнение поиска перевалов рядом с точкой: индекс ячеек сетки против полного просмотра.
+
+Создаёт тестовую БД (для SQLite — в памяти), заполняет её случайными перевалами
+и замеряет время запросов GET /submitData/nearby/ на уровне ORM.
+
+Запуск из каталога Pereval:
+    python benchmarks/geo_benchmark.py --count 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pereval_project.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+from pereval_app import geo  # noqa: E402
+from pereval_app.models import Coords, PerevalAdded, User  # noqa: E402
+
+BATCH_SIZE = 10000
+
+
+def fill(count, seed):
+    rng = random.Random(seed)
+    user = User.objects.create(
+        email='bench@example.com', last_name='Тест', first_name='Тест', middle_name='Тест', phone='0'
+    )
+    for start in range(0, count, BATCH_SIZE):
+        size = min(BATCH_SIZE, count - start)
+        coords = [
+            Coords(latitude=rng.uniform(-60, 75), longitude=rng.uniform(-180, 180), height=rng.randint(0, 7000))
+            for _ in range(size)
+        ]
+        for item in coords:
+            item.update_grid_cell()
+        Coords.objects.bulk_create(coords, batch_size=BATCH_SIZE)
+        PerevalAdded.objects.bulk_create([
+            PerevalAdded(user=user, coords=item, beauty_title='пер.', title=f'Перевал {start + i}', other_titles='')
+            for i, item in enumerate(coords)
+        ], batch_size=BATCH_SIZE)
+
+
+def nearby_indexed(lat, lon, radius_km):
+    candidates = PerevalAdded.objects.in_bbox(*geo.bbox_around(lat, lon, radius_km))
+    return [
+        pk for pk, latitude, longitude in candidates.values_list('id', 'coords__latitude', 'coords__longitude')
+        if geo.haversine_km(lat, lon, latitude, longitude) <= radius_km
+    ]
+
+
+def nearby_full_scan(lat, lon, radius_km):
+    lat_min, lat_max, lon_min, lon_max = geo.bbox_around(lat, lon, radius_km)
+    candidates = PerevalAdded.objects.filter(
+        coords__latitude__range=(lat_min, lat_max),
+        coords__longitude__range=(min(lon_min, lon_max), max(lon_min, lon_max)),
+    )
+    return [
+        pk for pk, latitude, longitude in candidates.values_list('id', 'coords__latitude', 'coords__longitude')
+        if geo.haversine_km(lat, lon, latitude, longitude) <= radius_km
+    ]
+
+
+def measure(function, points, radius_km):
+    timings = []
+    found = 0
+    for lat, lon in points:
+        started = time.perf_counter()
+        found += len(function(lat, lon, radius_km))
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), max(timings), found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=1_000_000, help='Количество перевалов')
+    parser.add_argument('--queries', type=int, default=50, help='Количество запросов на способ поиска')
+    parser.add_argument('--radius-km', type=float, default=25)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        started = time.perf_counter()
+        fill(args.count, args.seed)
+        print(f'Заполнено {args.count} перевалов за {time.perf_counter() - started:.1f} с')
+
+        rng = random.Random(args.seed + 1)
+        points = [(rng.uniform(-55, 70), rng.uniform(-175, 175)) for _ in range(args.queries)]
+
+        for name, function in [('индекс ячеек', nearby_indexed), ('полный просмотр', nearby_full_scan)]:
+            median, worst, found = measure(function, points, args.radius_km)
+            print(f'{name:>16}: медиана {median:8.2f} мс, максимум {worst:8.2f} мс, найдено {found}')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Иерархия районов PerevalArea в виде таблицы замыкания.
+
+PerevalArea хранит только родителя (id_parent, 0 у корня). Для каждой пары
+«район — вложенный в него район» на любой глубине, включая сам район, в
+PerevalAreaClosure есть строка, поэтому перевалы района вместе со всеми
+вложенными выбираются одним подзапросом по индексу (ancestor, descendant)
+независимо от глубины дерева (PerevalAddedQuerySet.in_area). Страницы
+перевалов небольшого поддерева выбираются по каждому району отдельно (page_keys).
+
+Таблица обновляется сигналами при сохранении района и явно — при
+bulk_create; manage.py rebuild_area_closure строит её заново.
+"""
+import heapq
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import PerevalAdded, PerevalArea, PerevalAreaClosure
+
+
+class AreaCycleError(ValueError):
+    pass
+
+
+def closure_rows(parents):
+    """
+         Строки замыкания (ancestor, descendant, depth) для дерева {id района: id родителя}.
+
+         Родитель, которого нет в дереве, считается корнем; на цикле в данных
+         подъём к корню останавливается.
+     """
+    rows = []
+    for area_id in parents:
+        rows.append((area_id, area_id, 0))
+        seen = {area_id}
+        parent, depth = parents[area_id], 1
+        while parent in parents and parent not in seen:
+            rows.append((parent, area_id, depth))
+            seen.add(parent)
+            parent, depth = parents[parent], depth + 1
+    return rows
+
+
+def page_keys(area_id, paginator, request):
+    """
+         Ключи {'datetime', 'id'} страницы перевалов района и вложенных районов, от новых к старым.
+
+         В небольшом поддереве (до PEREVAL_AREA_MERGE_MAX_AREAS районов) страница
+         каждого района выбирается по индексу (area, -datetime, -id) с тем же
+         курсором, и страницы сливаются: сортируется не больше page_size + 1
+         записей на район, а не всё поддерево. Большое поддерево выбирается одним
+         запросом с соединением по таблице замыкания (PerevalAddedQuerySet.in_area).
+         Если района нет, выбрасывается PerevalArea.DoesNotExist.
+     """
+    # В замыкании у каждого района есть строка с ним самим
+    limit = settings.PEREVAL_AREA_MERGE_MAX_AREAS
+    area_ids = list(
+        PerevalAreaClosure.objects.filter(ancestor_id=area_id).values_list('descendant_id', flat=True)[:limit + 1]
+    )
+    if not area_ids:
+        raise PerevalArea.DoesNotExist
+    if len(area_ids) > limit:
+        return paginator.set_page(list(
+            paginator.page_queryset(PerevalAdded.objects.in_area(area_id), request).values('datetime', 'id')
+        ))
+
+    queries = [
+        paginator.page_queryset(PerevalAdded.objects.filter(area_id=pk), request).values('datetime', 'id')
+        for pk in area_ids
+    ]
+    if len(queries) > 1 and connections[queries[0].db].features.supports_slicing_ordering_in_compound:
+        keys = list(queries[0].union(*queries[1:], all=True))
+    else:
+        keys = [key for query in queries for key in query]
+    return paginator.set_page(
+        heapq.nlargest(paginator.page_size + 1, keys, key=lambda key: (key['datetime'], key['id']))
+    )
+
+
+def record_created(areas):
+    """Добавляет строки замыкания для новых районов; их родители должны быть уже учтены."""
+    paths = defaultdict(list)
+    links = PerevalAreaClosure.objects.filter(descendant_id__in={area.id_parent for area in areas})
+    for ancestor_id, descendant_id, depth in links.values_list('ancestor_id', 'descendant_id', 'depth'):
+        paths[descendant_id].append((ancestor_id, depth))
+
+    PerevalAreaClosure.objects.bulk_create(
+        [PerevalAreaClosure(ancestor_id=area.id, descendant_id=area.id, depth=0) for area in areas]
+        + [
+            PerevalAreaClosure(ancestor_id=ancestor_id, descendant_id=area.id, depth=depth + 1)
+            for area in areas for ancestor_id, depth in paths[area.id_parent]
+        ]
+    )
+
+
+def check_parent(area, parent_id):
+    """Запрещает перенос района внутрь самого себя."""
+    if PerevalAreaClosure.objects.filter(ancestor_id=area.id, descendant_id=parent_id).exists():
+        raise AreaCycleError(f'Район {area.id} нельзя перенести внутрь самого себя')
+
+
+def move(area):
+    """Переносит поддерево района под нового родителя area.id_parent."""
+    with transaction.atomic():
+        subtree = dict(
+            PerevalAreaClosure.objects.filter(ancestor_id=area.id).values_list('descendant_id', 'depth')
+        )
+        # Связи поддерева со старыми предками
+        PerevalAreaClosure.objects.filter(descendant_id__in=subtree).exclude(ancestor_id__in=subtree).delete()
+        ancestors = PerevalAreaClosure.objects.filter(descendant_id=area.id_parent).values_list('ancestor_id', 'depth')
+        PerevalAreaClosure.objects.bulk_create([
+            PerevalAreaClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=above + 1 + below)
+            for ancestor_id, above in ancestors
+            for descendant_id, below in subtree.items()
+        ])
+
+
+def rebuild():
+    """Строит таблицу замыкания заново по id_parent всех районов; возвращает количество строк."""
+    with transaction.atomic():
+        rows = closure_rows(dict(PerevalArea.objects.values_list('id', 'id_parent')))
+        PerevalAreaClosure.objects.all().delete()
+        PerevalAreaClosure.objects.bulk_create(
+            [PerevalAreaClosure(ancestor_id=a, descendant_id=d, depth=depth) for a, d, depth in rows],
+            batch_size=2000
+        )
+    return len(rows)
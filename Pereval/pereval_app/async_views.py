@@ -0,0 +1,95 @@
+"""
+Асинхронные представления чтения перевалов для запуска под ASGI.
+
+Повторяют ответы SubmitDataDetailView, SubmitDataListView и SubmitDataSearchView,
+но читают БД через асинхронный ORM (aget, async for) и не занимают поток
+на время запроса. Подключаются вместо синхронных при PEREVAL_ASYNC_READS
+(pereval_project/asgi.py включает настройку по умолчанию), см. urls.py.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.utils.urls import replace_query_param
+
+from . import fast_read
+from .caching import aget_detail, aset_detail
+from .models import PerevalAdded
+from .pagination import PerevalCursorPagination
+from .search import search_ids
+from .serializers import PerevalAddedSerializer, SearchQuerySerializer
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status_code)
+
+
+@require_GET
+async def pereval_detail(request, id):
+    cached, version = await aget_detail(id)
+    if cached is None:
+        try:
+            pereval = await PerevalAdded.objects.with_related().aget(id=id)
+        except PerevalAdded.DoesNotExist:
+            return json_response({"message": "Запись не найдена", "status": 404}, status.HTTP_404_NOT_FOUND)
+        body = JSONRenderer().render(PerevalAddedSerializer(pereval).data)
+        etag = await aset_detail(id, body, version)
+    else:
+        body, etag = cached
+
+    # Клиент уже получал эту версию перевала
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    return response
+
+
+@require_GET
+async def pereval_list(request):
+    # Request из DRF нужен пагинации для query_params
+    request = Request(request)
+    email = request.query_params.get('user__email', None)
+    if not email:
+        return json_response({"message": "Не указан email пользователя", "status": 400}, status.HTTP_400_BAD_REQUEST)
+
+    perevals = PerevalAdded.objects.filter(user__email=email)
+    paginator = PerevalCursorPagination()
+    try:
+        page = paginator.set_page(await fast_read.apereval_rows(paginator.page_queryset(perevals, request)))
+    except ValidationError as e:
+        return json_response({"message": e.detail, "status": 400}, status.HTTP_400_BAD_REQUEST)
+
+    if not page and 'cursor' not in request.query_params:
+        return json_response(
+            {"message": "Нет записей для указанного пользователя", "status": 404}, status.HTTP_404_NOT_FOUND
+        )
+
+    body = {"next": paginator.get_next_link(), "results": await fast_read.abuild_perevals(page)}
+    return HttpResponse(fast_read.render(body), content_type='application/json')
+
+
+@require_GET
+async def pereval_search(request):
+    query = SearchQuerySerializer(data=request.GET)
+    if not query.is_valid():
+        return json_response({"message": query.errors, "status": 400}, status.HTTP_400_BAD_REQUEST)
+    data = query.validated_data
+    page_size = min(data.get('page_size', settings.PEREVAL_LIST_PAGE_SIZE), settings.PEREVAL_LIST_MAX_PAGE_SIZE)
+
+    # Лишняя запись показывает, есть ли следующая страница
+    ids = await sync_to_async(search_ids)(data['q'], limit=page_size + 1, offset=(data['page'] - 1) * page_size)
+    next_link = None
+    if len(ids) > page_size:
+        next_link = replace_query_param(request.build_absolute_uri(), 'page', data['page'] + 1)
+
+    ids = ids[:page_size]
+    rows = fast_read.rows_in_order(await fast_read.apereval_rows(PerevalAdded.objects.filter(id__in=ids)), ids)
+    body = {"next": next_link, "results": await fast_read.abuild_perevals(rows)}
+    return HttpResponse(fast_read.render(body), content_type='application/json')
@@ -0,0 +1,62 @@
+"""
+Подсчёт ссылок на файлы изображений, сохранённые по хешу содержимого.
+
+attach() и detach() вызываются при создании и удалении PerevalImage:
+сигналами для одиночных записей и явно при bulk_create.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ImageBlob
+from .storage import blob_sha256, image_storage
+
+
+def by_count(names):
+    """Имена файлов, сохранённых по хешу, сгруппированные по числу ссылок: {число: [имена]}."""
+    groups = defaultdict(list)
+    for name, count in Counter(names).items():
+        if blob_sha256(name) is not None:
+            groups[count].append(name)
+    return groups
+
+
+def attach(names):
+    """
+         Увеличивает счётчики ссылок на файлы; записи ImageBlob создаются при первой ссылке.
+
+         Недостающие записи создаются одним запросом (созданные параллельно
+         пропускаются), затем счётчики увеличиваются одним запросом на каждое число ссылок.
+     """
+    groups = by_count(names)
+    if not groups:
+        return
+    ImageBlob.objects.bulk_create(
+        [
+            ImageBlob(name=name, sha256=blob_sha256(name), size=image_storage.size(name), ref_count=0)
+            for group in groups.values() for name in group
+        ],
+        ignore_conflicts=True
+    )
+    for count, group in groups.items():
+        ImageBlob.objects.filter(name__in=group).update(ref_count=F('ref_count') + count)
+
+
+def touch(name):
+    """
+         Отмечает повторное сохранение файла, чтобы gc_blobs не удалил его до attach().
+
+         gc_blobs удаляет файл под блокировкой строки ImageBlob, поэтому UPDATE
+         дожидается конца удаления; после него файла может уже не быть.
+     """
+    ImageBlob.objects.filter(name=name).update(touched_at=timezone.now())
+
+
+def detach(names):
+    """
+         Уменьшает счётчики ссылок одним запросом на каждое число ссылок;
+         сами файлы удаляет manage.py gc_blobs.
+     """
+    for count, group in by_count(names).items():
+        ImageBlob.objects.filter(name__in=group).update(ref_count=F('ref_count') - count)
@@ -0,0 +1,132 @@
+"""
+Кэш готовых JSON-ответов GET /submitData/<id>/ и тайлов карты GET /tiles/<z>/<x>/<y>.geojson.
+
+В кэше хранится тело ответа и его ETag. Записи удаляются сигналами
+из signals.py при любом изменении перевала, его координат, пользователя и изображений;
+тайлы — только те, в которые попадает изменённый перевал (см. tiles.py).
+При сбросе ответа перевала меняется и его версия: ответ, прочитанный из БД до
+изменения, но записанный после сброса, не остаётся в кэше (см. set_detail).
+Ответ, прочитанный с отстающей реплики (routers.py), мог не застать последнее
+изменение, поэтому он кэшируется, только если перевал не менялся последние
+PEREVAL_DB_REPLICA_LAG секунд; ответы с основной БД кэшируются всегда.
+"""
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .routers import replica_alias
+
+DETAIL_KEY = 'pereval:detail:{}'
+DETAIL_VERSION_KEY = 'pereval:detail-version:{}'
+TILE_KEY = 'pereval:tile:{}:{}:{}'
+
+
+def detail_key(pk):
+    return DETAIL_KEY.format(pk)
+
+
+def detail_version_key(pk):
+    return DETAIL_VERSION_KEY.format(pk)
+
+
+def make_etag(body):
+    """Сильный ETag по содержимому ответа."""
+    return '"{}"'.format(hashlib.sha256(body).hexdigest()[:32])
+
+
+def get_detail(pk):
+    """
+         Закэшированный ответ перевала: ((тело, ETag) или None, версия).
+
+         Версию, полученную до чтения перевала из БД, нужно передать в set_detail.
+     """
+    values = cache.get_many([detail_key(pk), detail_version_key(pk)])
+    return values.get(detail_key(pk)), values.get(detail_version_key(pk))
+
+
+def replica_caught_up(version):
+    """Получила ли реплика последнее изменение перевала, если ответ прочитан с неё."""
+    if not replica_alias() or version is None:
+        return True
+    changed_at, _ = version
+    return time.time() - changed_at >= settings.PEREVAL_DB_REPLICA_LAG
+
+
+def set_detail(pk, body, version):
+    """
+         Кэширует ответ и возвращает его ETag.
+
+         Если после чтения перевал успели изменить (версия уже другая), ответ
+         удаляется из кэша: сброс мог пройти раньше этой записи.
+     """
+    etag = make_etag(body)
+    if not replica_caught_up(version):
+        return etag
+    cache.set(detail_key(pk), (body, etag), settings.PEREVAL_DETAIL_CACHE_TIMEOUT)
+    if cache.get(detail_version_key(pk)) != version:
+        cache.delete(detail_key(pk))
+    return etag
+
+
+async def aget_detail(pk):
+    values = await cache.aget_many([detail_key(pk), detail_version_key(pk)])
+    return values.get(detail_key(pk)), values.get(detail_version_key(pk))
+
+
+async def aset_detail(pk, body, version):
+    etag = make_etag(body)
+    if not replica_caught_up(version):
+        return etag
+    await cache.aset(detail_key(pk), (body, etag), settings.PEREVAL_DETAIL_CACHE_TIMEOUT)
+    if await cache.aget(detail_version_key(pk)) != version:
+        await cache.adelete(detail_key(pk))
+    return etag
+
+
+def invalidate_details(ids):
+    """
+         Удаляет закэшированные ответы перевалов и меняет их версии.
+
+         Сброс повторяется после фиксации транзакции: иначе параллельный запрос
+         мог бы успеть закэшировать ещё не изменённые данные.
+     """
+    ids = list(ids)
+    if not ids:
+        return
+
+    def invalidate():
+        # Сначала версия, потом удаление: так set_detail увидит сброс, прошедший после его записи
+        version = (time.time(), uuid.uuid4().hex)
+        cache.set_many({detail_version_key(pk): version for pk in ids}, settings.PEREVAL_DETAIL_CACHE_TIMEOUT)
+        cache.delete_many([detail_key(pk) for pk in ids])
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+def tile_key(z, x, y):
+    return TILE_KEY.format(z, x, y)
+
+
+def get_tile(z, x, y):
+    """Закэшированный тайл: (тело, ETag) или None."""
+    return cache.get(tile_key(z, x, y))
+
+
+def set_tile(z, x, y, body):
+    etag = make_etag(body)
+    cache.set(tile_key(z, x, y), (body, etag), settings.PEREVAL_TILE_CACHE_TIMEOUT)
+    return etag
+
+
+def invalidate_tiles(tiles):
+    """Удаляет закэшированные тайлы [(z, x, y)], в том числе после фиксации транзакции."""
+    keys = [tile_key(*tile) for tile in tiles]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,84 @@
+import csv
+import json
+
+from django.conf import settings
+
+from .models import PerevalAdded
+
+PEREVAL_FIELDS = [
+    'id', 'status', 'datetime', 'beauty_title', 'title', 'other_titles', 'connect',
+    'level_spring', 'level_summer', 'level_autumn', 'level_winter',
+]
+USER_FIELDS = ['email', 'last_name', 'first_name', 'middle_name', 'phone']
+COORDS_FIELDS = ['latitude', 'longitude', 'height']
+
+CSV_HEADER = (
+    PEREVAL_FIELDS
+    + [f'user_{field}' for field in USER_FIELDS]
+    + COORDS_FIELDS
+    + ['images']
+)
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: возвращает записанную строку вместо буферизации."""
+    def write(self, value):
+        return value
+
+
+def iter_perevals(chunk_size=None):
+    """
+         Перебирает все перевалы с пользователями, координатами и изображениями.
+
+         Записи читаются серверным курсором пачками по chunk_size,
+         изображения подгружаются отдельным запросом на каждую пачку.
+     """
+    chunk_size = chunk_size or settings.PEREVAL_EXPORT_CHUNK_SIZE
+    return PerevalAdded.objects.with_related().order_by('id').iterator(chunk_size=chunk_size)
+
+
+def pereval_to_dict(pereval):
+    data = {field: getattr(pereval, field) for field in PEREVAL_FIELDS}
+    data['datetime'] = pereval.datetime.isoformat()
+    data['user'] = {field: getattr(pereval.user, field) for field in USER_FIELDS}
+    data['coords'] = {field: getattr(pereval.coords, field) for field in COORDS_FIELDS}
+    data['images'] = [
+        {
+            'data': image.data.name,
+            'title': image.title,
+            'variants': {f'{variant.name}.{variant.format}': variant.file.name for variant in image.variants.all()},
+        }
+        for image in pereval.attached_images.all()
+    ]
+    return data
+
+
+def iter_ndjson(perevals):
+    for pereval in perevals:
+        yield json.dumps(pereval_to_dict(pereval), ensure_ascii=False) + '\n'
+
+
+def iter_csv(perevals):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for pereval in perevals:
+        data = pereval_to_dict(pereval)
+        yield writer.writerow(
+            [data[field] for field in PEREVAL_FIELDS]
+            + [data['user'][field] for field in USER_FIELDS]
+            + [data['coords'][field] for field in COORDS_FIELDS]
+            + [json.dumps(data['images'], ensure_ascii=False)]
+        )
+
+
+def iter_export(export_format, chunk_size=None):
+    """Возвращает генератор строк выгрузки в формате ndjson или csv."""
+    perevals = iter_perevals(chunk_size)
+    if export_format == 'csv':
+        return iter_csv(perevals)
+    return iter_ndjson(perevals)
@@ -0,0 +1,213 @@
+"""
+Быстрое чтение перевалов для больших ответов (список, поиск).
+
+Строит тот же JSON, что PerevalAddedSerializer, но из строк .values() без
+создания моделей и вложенных сериализаторов: перевалы с пользователями и
+координатами читаются одним запросом, изображения и их копии — ещё двумя.
+Соответствие полей (ключ ответа, столбец, преобразование) вычисляется один
+раз из полей сериализаторов, поэтому новое поле модели появится и здесь.
+Для записи по-прежнему используется PerevalAddedSerializer.
+
+Ответ кодируется orjson и побайтно совпадает с JSONRenderer, в том числе
+ETag: разделители строк U+2028/U+2029 экранируются так же, а ответ с числами,
+которые orjson записывает иначе (0.00001 и 1e16 против 1e-05 и 1e+16),
+кодируется JSONRenderer — в координатах такие числа почти не встречаются.
+"""
+import re
+from collections import defaultdict
+
+import orjson
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from .models import PerevalImage, PerevalImageVariant
+from .serializers import PerevalAddedSerializer
+from .storage import blob_sha256, image_storage
+
+# Поля, значения которых из БД попадают в ответ без преобразования;
+# для внешнего ключа .values() уже возвращает id
+PLAIN_FIELDS = (
+    serializers.CharField, serializers.IntegerField, serializers.FloatField,
+    serializers.BooleanField, serializers.ChoiceField, serializers.ReadOnlyField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+variant_storage = PerevalImageVariant._meta.get_field('file').storage
+
+# Числа, которые orjson пишет не так, как json; совпадение внутри строки
+# только отправляет ответ в более медленный JSONRenderer
+FLOAT_MISMATCH_RE = re.compile(rb'\d[eE]|\.0000')
+
+
+class DateTimeRepresentation:
+    """
+         DateTimeField.to_representation в ISO 8601 с часовым поясом, найденным один раз на ответ.
+
+         DRF ищет текущий часовой пояс для каждого значения, и на больших
+         выборках это заметная часть времени ответа.
+     """
+    def __init__(self, field):
+        self.field = field
+
+    @classmethod
+    def for_field(cls, field):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if output_format is None or output_format.lower() != ISO_8601 or not settings.USE_TZ:
+            return field.to_representation
+        if hasattr(field, 'timezone'):
+            return field.to_representation
+        return cls(field)
+
+    def bind(self, current_timezone):
+        def convert(value):
+            if timezone.is_naive(value):
+                return self.field.to_representation(value)
+            value = value.astimezone(current_timezone).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
+
+
+def field_mapping(serializer, prefix=''):
+    """Список (ключ ответа, столбец .values(), преобразование или None) для полей сериализатора."""
+    mapping = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.BaseSerializer):
+            mapping.append((name, None, field))
+        elif isinstance(field, PLAIN_FIELDS):
+            mapping.append((name, prefix + field.source, None))
+        elif isinstance(field, serializers.DateTimeField):
+            mapping.append((name, prefix + field.source, DateTimeRepresentation.for_field(field)))
+        else:
+            mapping.append((name, prefix + field.source, field.to_representation))
+    return mapping
+
+
+def bind_mapping(mapping, current_timezone):
+    """Соответствие полей с преобразованиями дат для текущего часового пояса."""
+    bound = []
+    for name, column, convert in mapping:
+        if isinstance(convert, DateTimeRepresentation):
+            convert = convert.bind(current_timezone)
+        elif isinstance(convert, list):
+            convert = bind_mapping(convert, current_timezone)
+        bound.append((name, column, convert))
+    return bound
+
+
+def nested_mapping(field):
+    return field_mapping(field, prefix=f'{field.source}__')
+
+
+def pereval_mapping():
+    """Соответствие полей PerevalAddedSerializer и столбцы, которые нужно выбрать."""
+    mapping = []
+    for name, column, field in field_mapping(PerevalAddedSerializer()):
+        if column is not None:
+            mapping.append((name, column, field))
+        elif field.source == 'attached_images':
+            # Изображения читаются отдельным запросом, см. build_perevals
+            mapping.append((name, None, None))
+        else:
+            mapping.append((name, None, nested_mapping(field)))
+
+    columns = ['id', 'datetime']
+    for _, column, nested in mapping:
+        if column is not None:
+            columns.append(column)
+        elif nested is not None:
+            columns.extend(nested_column for _, nested_column, _ in nested)
+    return mapping, list(dict.fromkeys(columns))
+
+
+PEREVAL_MAPPING, COLUMNS = pereval_mapping()
+
+
+def convert_row(row, mapping):
+    data = {}
+    for name, column, convert in mapping:
+        value = row[column]
+        data[name] = convert(value) if convert is not None and value is not None else value
+    return data
+
+
+def image_rows(pereval_ids):
+    return PerevalImage.objects.filter(pereval_id__in=pereval_ids).order_by('id').values(
+        'id', 'pereval_id', 'data', 'title'
+    )
+
+
+def variant_rows(image_ids):
+    return PerevalImageVariant.objects.filter(image_id__in=image_ids).order_by('id').values(
+        'image_id', 'name', 'format', 'file'
+    )
+
+
+def assemble(rows, images, variants):
+    """Данные перевалов в формате PerevalAddedSerializer из строк перевалов, изображений и копий."""
+    image_variants = defaultdict(dict)
+    for variant in variants:
+        image_variants[variant['image_id']].setdefault(variant['name'], {})[variant['format']] = (
+            variant_storage.url(variant['file'])
+        )
+
+    pereval_images = defaultdict(list)
+    for image in images:
+        name = image['data']
+        pereval_images[image['pereval_id']].append({
+            'data': image_storage.url(name) if name else None,
+            'sha256': blob_sha256(name),
+            'title': image['title'],
+            'variants': image_variants.get(image['id'], {}),
+        })
+
+    mapping = bind_mapping(PEREVAL_MAPPING, timezone.get_current_timezone())
+    result = []
+    for row in rows:
+        data = {}
+        for name, column, convert in mapping:
+            if column is None:
+                data[name] = pereval_images.get(row['id'], []) if convert is None else convert_row(row, convert)
+                continue
+            value = row[column]
+            data[name] = convert(value) if convert is not None and value is not None else value
+        result.append(data)
+    return result
+
+
+def pereval_rows(queryset):
+    """Строки перевалов с пользователями и координатами; порядок и срез задаёт queryset."""
+    return list(queryset.values(*COLUMNS))
+
+
+def rows_in_order(rows, ids):
+    rows = {row['id']: row for row in rows}
+    return [rows[pk] for pk in ids if pk in rows]
+
+
+def build_perevals(rows):
+    images = list(image_rows([row['id'] for row in rows])) if rows else []
+    variants = list(variant_rows([image['id'] for image in images])) if images else []
+    return assemble(rows, images, variants)
+
+
+async def apereval_rows(queryset):
+    return [row async for row in queryset.values(*COLUMNS)]
+
+
+async def abuild_perevals(rows):
+    images = [image async for image in image_rows([row['id'] for row in rows])] if rows else []
+    variants = [variant async for variant in variant_rows([image['id'] for image in images])] if images else []
+    return assemble(rows, images, variants)
+
+
+def render(data):
+    body = orjson.dumps(data)
+    if FLOAT_MISMATCH_RE.search(body):
+        return JSONRenderer().render(data)
+    # JSONRenderer экранирует разделители строк, недопустимые в JavaScript
+    return body.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
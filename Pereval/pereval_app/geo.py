@@ -0,0 +1,83 @@
+"""
+Географические вычисления для поиска перевалов по координатам.
+
+Поверхность делится на сетку ячеек размером GRID_CELL_DEGREES градусов.
+Номер ячейки хранится в Coords.grid_cell под B-tree индексом: ячейки одной
+строки сетки идут подряд, поэтому прямоугольная область превращается
+в несколько диапазонов номеров, а точная проверка делается уже по координатам.
+"""
+import math
+
+GRID_CELL_DEGREES = 0.1
+GRID_ROWS = round(180 / GRID_CELL_DEGREES)
+GRID_COLUMNS = round(360 / GRID_CELL_DEGREES)
+
+# Больше диапазонов не перечисляем — берём одну полосу строк целиком
+MAX_CELL_RANGES = 64
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def grid_row(latitude):
+    return min(max(int((latitude + 90) / GRID_CELL_DEGREES), 0), GRID_ROWS - 1)
+
+
+def grid_column(longitude):
+    return int(((longitude + 180) % 360) / GRID_CELL_DEGREES) % GRID_COLUMNS
+
+
+def grid_cell(latitude, longitude):
+    """Номер ячейки сетки, в которую попадает точка."""
+    return grid_row(latitude) * GRID_COLUMNS + grid_column(longitude)
+
+
+def longitude_intervals(lon_min, lon_max):
+    """Интервалы долгот области; область через 180-й меридиан делится на два."""
+    if lon_min <= lon_max:
+        return [(lon_min, lon_max)]
+    return [(lon_min, 180.0), (-180.0, lon_max)]
+
+
+def cell_ranges(lat_min, lat_max, lon_min, lon_max):
+    """Диапазоны номеров ячеек (включительно), покрывающие прямоугольную область."""
+    first_row, last_row = grid_row(lat_min), grid_row(lat_max)
+    columns = [
+        (grid_column(west), grid_column(east) if east < 180 else GRID_COLUMNS - 1)
+        for west, east in longitude_intervals(lon_min, lon_max)
+    ]
+
+    if (last_row - first_row + 1) * len(columns) > MAX_CELL_RANGES:
+        return [(first_row * GRID_COLUMNS, last_row * GRID_COLUMNS + GRID_COLUMNS - 1)]
+
+    return [
+        (row * GRID_COLUMNS + first_column, row * GRID_COLUMNS + last_column)
+        for row in range(first_row, last_row + 1)
+        for first_column, last_column in columns
+    ]
+
+
+def bbox_around(latitude, longitude, radius_km):
+    """Прямоугольник (lat_min, lat_max, lon_min, lon_max), содержащий круг радиуса radius_km."""
+    delta_lat = radius_km / KM_PER_DEGREE
+    lat_min, lat_max = latitude - delta_lat, latitude + delta_lat
+    if lat_min <= -90 or lat_max >= 90:
+        # Круг накрывает полюс — подходят все долготы
+        return max(lat_min, -90.0), min(lat_max, 90.0), -180.0, 180.0
+
+    delta_lon = delta_lat / math.cos(math.radians(latitude))
+    if delta_lon >= 180:
+        return lat_min, lat_max, -180.0, 180.0
+
+    lon_min = (longitude - delta_lon + 180) % 360 - 180
+    lon_max = (longitude + delta_lon + 180) % 360 - 180
+    return lat_min, lat_max, lon_min, lon_max
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Расстояние по поверхности Земли между двумя точками в километрах."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
@@ -0,0 +1,116 @@
+"""
+Повторы отправки перевалов с заголовком Idempotency-Key.
+
+Первый запрос с ключом выполняется как обычно, а его ответ сохраняется в
+IdempotencyKey в той же транзакции, что и сам перевал. Повтор с тем же ключом
+получает сохранённый ответ без валидации и записи в БД. Параллельные запросы
+с одним ключом разводит уникальный индекс: второй ждёт фиксации первого,
+получает IntegrityError и отдаёт его ответ. Ответы с кодом 5xx не сохраняются,
+транзакция откатывается, и запрос можно повторить с тем же ключом.
+"""
+import functools
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+class HashingStream:
+    """Поток тела запроса, добавляющий прочитанные байты в хеш."""
+
+    def __init__(self, stream, digest):
+        self.stream = stream
+        self.digest = digest
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.digest.update(data)
+        return data
+
+
+def request_hash(request):
+    """
+         Хеш пути и тела запроса: повтор с тем же ключом должен совпадать с первым запросом.
+
+         Тело хешируется по мере того, как его читает парсер запроса (JSON,
+         multipart, форма), и целиком в памяти не держится, в отличие от request.body.
+     """
+    digest = hashlib.sha256(request.path.encode())
+    digest.update(b'\0')
+    if request.stream is not None:
+        # Request.data читает тело из request._stream
+        request._stream = HashingStream(request.stream, digest)
+        request.data
+        # Парсер мог не дочитать тело до конца
+        while request._stream.read(settings.PEREVAL_UPLOAD_BLOCK_SIZE):
+            pass
+    return digest.hexdigest()
+
+
+def stored_response(key, fingerprint):
+    """Сохранённый ответ для ключа или None, если ключа нет или он устарел."""
+    record = IdempotencyKey.objects.filter(key=key).first()
+    if record is None:
+        return None
+    if record.created_at < timezone.now() - timedelta(seconds=settings.PEREVAL_IDEMPOTENCY_TTL):
+        IdempotencyKey.objects.filter(id=record.id).delete()
+        return None
+    if record.request_hash != fingerprint:
+        return Response(
+            {"status": 422, "message": f"Ключ {HEADER} уже использован для другого запроса"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    return Response(record.response, status=record.status_code, headers={REPLAYED_HEADER: 'true'})
+
+
+def idempotent(post):
+    """Декоратор метода post представления: сохраняет и повторяет ответ по заголовку Idempotency-Key."""
+    @functools.wraps(post)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return post(self, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"status": 400, "message": f"{HEADER} должен содержать от 1 до {MAX_KEY_LENGTH} символов"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            fingerprint = request_hash(request)
+        except ParseError as e:
+            return Response({"status": 400, "message": str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
+        response = stored_response(key, fingerprint)
+        if response is not None:
+            return response
+
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(key=key, request_hash=fingerprint)
+                response = post(self, request, *args, **kwargs)
+                if response.status_code >= 500:
+                    transaction.set_rollback(True)
+                    return response
+                record.status_code = response.status_code
+                record.response = response.data
+                record.save(update_fields=['status_code', 'response'])
+                return response
+        except IntegrityError:
+            # Запрос с тем же ключом зафиксирован раньше нас
+            response = stored_response(key, fingerprint)
+            if response is None:
+                raise
+            return response
+
+    return wrapper
@@ -0,0 +1,106 @@
+"""
+Фоновая обработка изображений перевалов.
+
+Для каждого нового PerevalImage создаётся задание ImageJob. Обработчик
+(manage.py process_images) забирает задания из таблицы и в пуле процессов
+строит уменьшенные копии в форматах WebP и JPEG без метаданных EXIF.
+"""
+import io
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import ImageJob, PerevalAdded, PerevalImage, PerevalImageVariant
+from .signals import related_changed
+
+# Формат Pillow и параметры сохранения для каждого формата копии
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def render_variant(source, max_size, variant_format):
+    """Уменьшенная копия изображения в заданном формате и её размер; EXIF в копию не попадает."""
+    pillow_format, options = VARIANT_FORMATS[variant_format]
+    image = source.copy()
+    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    buffer = io.BytesIO()
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue(), image.size
+
+
+def process_image(image_id):
+    """Строит все копии изображения из settings.PEREVAL_IMAGE_VARIANTS и сохраняет их."""
+    image = PerevalImage.objects.get(id=image_id)
+    with image.data.open('rb') as file:
+        source = Image.open(file)
+        # Поворот из EXIF применяется к пикселям, сами метаданные отбрасываются
+        source = ImageOps.exif_transpose(source)
+
+    existing = {(variant.name, variant.format): variant for variant in image.variants.all()}
+    for name, max_size in settings.PEREVAL_IMAGE_VARIANTS.items():
+        for variant_format in settings.PEREVAL_IMAGE_FORMATS:
+            variant = existing.get((name, variant_format))
+            if variant is None:
+                variant = PerevalImageVariant(image=image, name=name, format=variant_format)
+            elif variant.file:
+                variant.file.delete(save=False)
+            content, (variant.width, variant.height) = render_variant(source, max_size, variant_format)
+            variant.file.save(f'{image.id}_{name}.{variant_format}', ContentFile(content), save=True)
+
+    # Новые ссылки на копии: перевал отмечается изменённым для ленты /sync/ и ETag списка.
+    # Кэш ответа сбрасывается из процесса обработчика, поэтому кэш должен быть общим (см. CACHES в settings.py)
+    related_changed(PerevalAdded.objects.filter(id=image.pereval_id))
+
+
+def claim_jobs(limit):
+    """
+         Забирает до limit заданий в обработку и возвращает пары (id задания, id изображения).
+
+         Кроме новых заданий забираются зависшие: взятые в обработку раньше
+         PEREVAL_IMAGE_JOB_TIMEOUT секунд назад. Строки, заблокированные другим
+         обработчиком, пропускаются (SKIP LOCKED там, где БД это поддерживает).
+     """
+    now = timezone.now()
+    expired = now - timedelta(seconds=settings.PEREVAL_IMAGE_JOB_TIMEOUT)
+    with transaction.atomic():
+        jobs = list(
+            ImageJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=ImageJob.NEW) | Q(status=ImageJob.PROCESSING, claimed_at__lt=expired))
+            .order_by('id')
+            .values_list('id', 'image_id')[:limit]
+        )
+        ImageJob.objects.filter(id__in=[job_id for job_id, _ in jobs]).update(
+            status=ImageJob.PROCESSING, claimed_at=now, attempts=F('attempts') + 1
+        )
+    return jobs
+
+
+def run_job(job):
+    """Обрабатывает одно задание; выполняется в процессе пула, возвращает (id задания, ошибка)."""
+    job_id, image_id = job
+    try:
+        process_image(image_id)
+    except Exception as e:
+        return job_id, f'{type(e).__name__}: {e}'
+    return job_id, None
+
+
+def finish_job(job_id, error):
+    """Сохраняет результат задания; неудачное задание возвращается в очередь, пока есть попытки."""
+    if error is None:
+        ImageJob.objects.filter(id=job_id).update(status=ImageJob.DONE, error='')
+        return
+    job = ImageJob.objects.get(id=job_id)
+    job.status = ImageJob.FAILED if job.attempts >= settings.PEREVAL_IMAGE_JOB_MAX_ATTEMPTS else ImageJob.NEW
+    job.error = error
+    job.save(update_fields=['status', 'error'])
@@ -0,0 +1,280 @@
+"""
+Импорт архивов перевалов (manage.py import_perevals).
+
+Архив — NDJSON или CSV в формате выгрузки export.py. Записи читаются потоком
+и делятся на пачки; каждая пачка проверяется правилами PerevalAddedSerializer
+и записывается в своей транзакции:
+- пользователи находятся по email, недостающие создаются одним запросом;
+- координаты, перевалы и изображения в PostgreSQL загружаются командой COPY
+  (id заранее берутся из последовательностей), в остальных БД — bulk_create;
+- счётчики статистики, тайлы карты и ссылки на файлы изображений обновляются
+  так же, как при пакетной отправке.
+
+В той же транзакции сохраняется ImportBatch с номерами записей пачки, поэтому
+прерванный импорт продолжается с того же места: записи сохранённых пачек при
+повторном запуске пропускаются. Неправильные записи не импортируются и
+возвращаются вместе с ошибками.
+"""
+import csv
+import io
+import json
+
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import blobs, stats, tiles
+from .export import COORDS_FIELDS, PEREVAL_FIELDS, USER_FIELDS
+from .models import Coords, ImageJob, ImportBatch, PerevalAdded, PerevalImage, User
+from .serializers import PerevalAddedSerializer, PerevalImageSerializer
+from .storage import image_storage
+
+IMPORT_FORMATS = ('ndjson', 'csv')
+
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+class ImportImageSerializer(PerevalImageSerializer):
+    """Изображение архива: имя уже сохранённого файла (data) или хеш загруженного (sha256)."""
+    data = serializers.CharField(required=False, max_length=100)
+
+    def validate_data(self, value):
+        if not image_storage.exists(value):
+            raise serializers.ValidationError(f'Файл {value} не найден в хранилище изображений')
+        return value
+
+
+class ImportPerevalSerializer(PerevalAddedSerializer):
+    """Перевал архива: дата отправки сохраняется, изображения ссылаются на файлы в хранилище."""
+    datetime = serializers.DateTimeField(required=False)
+    images = ImportImageSerializer(many=True, source='attached_images', required=False)
+
+
+def csv_record(row):
+    """Запись из строки CSV выгрузки: поля пользователя и координат собираются во вложенные словари."""
+    record = {field: row.get(field) for field in PEREVAL_FIELDS}
+    record['user'] = {field: row.get(f'user_{field}') for field in USER_FIELDS}
+    record['coords'] = {field: row.get(field) for field in COORDS_FIELDS}
+    record['images'] = json.loads(row.get('images') or '[]')
+    return record
+
+
+def read_records(file, input_format):
+    """
+         Перебирает записи архива: (номер записи с 1, запись, ошибка разбора).
+
+         Файл читается построчно и целиком в памяти не держится.
+     """
+    if input_format == 'csv':
+        for number, row in enumerate(csv.DictReader(file), 1):
+            try:
+                yield number, csv_record(row), None
+            except ValueError as e:
+                yield number, None, f'Неверный JSON в поле images: {e}'
+        return
+
+    number = 0
+    for line in file:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            yield number, json.loads(line), None
+        except ValueError as e:
+            yield number, None, f'Неверный JSON: {e}'
+
+
+def iter_batches(records, batch_size, done=()):
+    """
+         Делит записи на пачки [(номер, запись, ошибка)] по batch_size.
+
+         done — отсортированные диапазоны (первая, последняя) уже импортированных
+         записей: они пропускаются, и пачка не включает записи по обе стороны
+         такого диапазона.
+     """
+    done = list(done)
+    batch = []
+    for item in records:
+        number = item[0]
+        while done and done[0][1] < number:
+            done.pop(0)
+        if done and done[0][0] <= number:
+            if batch:
+                yield batch
+                batch = []
+            continue
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def completed_ranges(source):
+    """Диапазоны записей архива, импортированные прошлыми запусками."""
+    return list(
+        ImportBatch.objects.filter(source=source).order_by('first_record').values_list('first_record', 'last_record')
+    )
+
+
+def validate(batch):
+    """Проверяет записи пачки; возвращает проверенные данные и [(номер, ошибки)] отклонённых."""
+    serializer = ImportPerevalSerializer()
+    valid, rejected = [], []
+    for number, record, error in batch:
+        if error is not None:
+            rejected.append((number, error))
+            continue
+        try:
+            valid.append(serializer.run_validation(record))
+        except serializers.ValidationError as e:
+            rejected.append((number, e.detail))
+    return valid, rejected
+
+
+def resolve_users(items):
+    """{email: id} пользователей пачки; новые создаются по данным первой записи с этим email."""
+    new_users = {}
+    for item in items:
+        new_users.setdefault(item['user']['email'], item['user'])
+    # Параллельный обработчик мог создать того же пользователя: конфликты пропускаются
+    User.objects.bulk_create([User(**data) for data in new_users.values()], ignore_conflicts=True)
+    return dict(User.objects.filter(email__in=new_users).values_list('email', 'id'))
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    return str(value).translate(COPY_ESCAPES)
+
+
+def copy_insert(objects):
+    """Вставляет объекты одной модели командой COPY; id берутся из последовательности таблицы."""
+    if not objects:
+        return
+    meta = objects[0]._meta
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+            [meta.db_table, meta.pk.column, len(objects)]
+        )
+        for obj, (pk,) in zip(objects, cursor.fetchall()):
+            obj.pk = pk
+            obj._state.adding = False
+
+        fields = meta.concrete_fields
+        buffer = io.StringIO()
+        for obj in objects:
+            buffer.write('\t'.join(
+                copy_value(field.get_db_prep_save(getattr(obj, field.attname), connection)) for field in fields
+            ))
+            buffer.write('\n')
+
+        sql = 'COPY {} ({}) FROM STDIN'.format(
+            connection.ops.quote_name(meta.db_table),
+            ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        )
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            buffer.seek(0)
+            raw.copy_expert(sql, buffer)
+        else:
+            # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def write_copy(items, users, now):
+    coords = [Coords(updated_at=now, **item['coords']) for item in items]
+    for item_coords in coords:
+        item_coords.update_grid_cell()
+    copy_insert(coords)
+
+    perevals = [build_pereval(item, users, item_coords, now) for item, item_coords in zip(items, coords)]
+    copy_insert(perevals)
+
+    images = [
+        PerevalImage(pereval=pereval, updated_at=now, **image_data)
+        for item, pereval in zip(items, perevals)
+        for image_data in item.get('attached_images', [])
+    ]
+    copy_insert(images)
+    return coords, perevals, images
+
+
+def write_bulk(items, users, now):
+    coords = [Coords(**item['coords']) for item in items]
+    for item_coords in coords:
+        item_coords.update_grid_cell()
+    Coords.objects.bulk_create(coords)
+
+    perevals = [build_pereval(item, users, item_coords, now) for item, item_coords in zip(items, coords)]
+    datetimes = [pereval.datetime for pereval in perevals]
+    PerevalAdded.objects.bulk_create(perevals)
+    # bulk_create ставит текущее время в поле с auto_now_add, дата из архива записывается отдельно
+    for pereval, value in zip(perevals, datetimes):
+        pereval.datetime = value
+    restore_datetimes([pereval for pereval in perevals if pereval.datetime != now])
+
+    images = PerevalImage.objects.bulk_create([
+        PerevalImage(pereval=pereval, **image_data)
+        for item, pereval in zip(items, perevals)
+        for image_data in item.get('attached_images', [])
+    ])
+    return coords, perevals, images
+
+
+def restore_datetimes(perevals):
+    """Записывает даты перевалов одним executemany: bulk_update строит CASE на каждую строку и заметно медленнее."""
+    if not perevals:
+        return
+    field = PerevalAdded._meta.get_field('datetime')
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            'UPDATE {} SET {} = %s WHERE {} = %s'.format(
+                quote_name(PerevalAdded._meta.db_table), quote_name(field.column),
+                quote_name(PerevalAdded._meta.pk.column)
+            ),
+            [(field.get_db_prep_save(pereval.datetime, connection), pereval.pk) for pereval in perevals]
+        )
+
+
+def build_pereval(item, users, item_coords, now):
+    fields = {key: value for key, value in item.items() if key not in ('user', 'coords', 'attached_images')}
+    fields.setdefault('datetime', now)
+    return PerevalAdded(
+        user_id=users[item['user']['email']], coords=item_coords, updated_at=now, **fields
+    )
+
+
+def save_batch(source, batch, use_copy=None):
+    """
+         Проверяет и записывает пачку одной транзакцией.
+
+         Возвращает (первая запись, последняя запись, импортировано, [(номер, ошибки)]).
+         use_copy — загружать ли COPY, по умолчанию да для PostgreSQL.
+     """
+    if use_copy is None:
+        use_copy = connection.vendor == 'postgresql'
+    first, last = batch[0][0], batch[-1][0]
+    items, rejected = validate(batch)
+    now = timezone.now()
+
+    with transaction.atomic():
+        if items:
+            users = resolve_users(items)
+            write = write_copy if use_copy else write_bulk
+            coords, perevals, images = write(items, users, now)
+
+            blobs.attach([image.data.name for image in images])
+            ImageJob.objects.bulk_create([ImageJob(image=image) for image in images])
+            stats.record_created(perevals)
+            tiles.invalidate_points([(item.latitude, item.longitude) for item in coords])
+
+        ImportBatch.objects.create(
+            source=source, first_record=first, last_record=last, imported=len(items), rejected=len(rejected)
+        )
+    return first, last, len(items), rejected
+
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from pereval_app.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Удаляет устаревшие ключи идемпотентности вместе с сохранёнными ответами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=int, default=settings.PEREVAL_IDEMPOTENCY_TTL,
+                            help='Удалять ключи старше указанного количества секунд')
+
+    def handle(self, *args, seconds, **options):
+        expired = IdempotencyKey.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=seconds))
+        count, _ = expired.delete()
+        self.stdout.write(f'Удалено ключей: {count}')
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from pereval_app.models import UploadSession
+from pereval_app.uploads import delete_session
+
+
+class Command(BaseCommand):
+    help = 'Удаляет брошенные сессии загрузки изображений вместе с недокачанными файлами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.PEREVAL_UPLOAD_SESSION_TTL_HOURS,
+                            help='Удалять сессии старше указанного количества часов')
+
+    def handle(self, *args, hours, **options):
+        expired = UploadSession.objects.filter(created_at__lt=timezone.now() - timedelta(hours=hours))
+        count = 0
+        for session in expired.iterator():
+            delete_session(session)
+            count += 1
+        self.stdout.write(f'Удалено сессий: {count}')
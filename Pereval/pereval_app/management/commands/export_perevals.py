@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from pereval_app.export import EXPORT_FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Выгружает все перевалы с пользователями, координатами и изображениями в NDJSON или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson', dest='export_format')
+        parser.add_argument('--output', help='Файл выгрузки, по умолчанию stdout')
+        parser.add_argument('--chunk-size', type=int, help='Количество записей, читаемых из БД за раз')
+
+    def handle(self, *args, export_format, output, chunk_size, **options):
+        rows = iter_export(export_format, chunk_size)
+        if output:
+            with open(output, 'w', encoding='utf-8', newline='') as file:
+                file.writelines(rows)
+        else:
+            for row in rows:
+                self.stdout.write(row, ending='')
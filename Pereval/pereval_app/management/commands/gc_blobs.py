@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from pereval_app.models import ImageBlob, PerevalImage
+from pereval_app.storage import image_storage
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы изображений, на которые не ссылается ни один PerevalImage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age-minutes', type=int, default=60,
+                            help='Не трогать файлы моложе указанного возраста')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет удалено')
+
+    def handle(self, *args, min_age_minutes, dry_run, **options):
+        saved_before = timezone.now() - timedelta(minutes=min_age_minutes)
+        candidates = ImageBlob.objects.filter(ref_count__lte=0, touched_at__lt=saved_before)
+
+        deleted = 0
+        for blob_id in candidates.values_list('id', flat=True).iterator():
+            # Запись блокируется и проверяется заново: за это время на файл могли сослаться
+            # или сохранить то же содержимое (blobs.touch ждёт этой блокировки)
+            with transaction.atomic():
+                blob = candidates.select_for_update().filter(id=blob_id).first()
+                if blob is None:
+                    continue
+                references = PerevalImage.objects.filter(data=blob.name).count()
+                if references:
+                    # Счётчик разошёлся с данными — исправляем вместо удаления
+                    ImageBlob.objects.filter(id=blob.id).update(ref_count=references)
+                    continue
+                if dry_run:
+                    self.stdout.write(blob.name)
+                    deleted += 1
+                    continue
+                image_storage.delete(blob.name)
+                blob.delete()
+                deleted += 1
+
+        self.stdout.write(f'{"Будет удалено" if dry_run else "Удалено"} файлов: {deleted}')
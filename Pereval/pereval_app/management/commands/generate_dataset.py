@@ -0,0 +1,136 @@
+import io
+import random
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from PIL import Image
+
+from pereval_app import areas, blobs, stats, tiles
+from pereval_app.models import Coords, PerevalAdded, PerevalArea, PerevalImage, SprActivitiesType, User
+from pereval_app.storage import image_storage
+
+# Горные районы: (название, широта, долгота, разброс в градусах)
+REGIONS = [
+    ('Кавказ', 43.2, 42.5, 1.5),
+    ('Алтай', 49.8, 86.6, 1.5),
+    ('Памир', 38.5, 73.0, 1.5),
+    ('Тянь-Шань', 42.2, 78.5, 2.0),
+    ('Хибины', 67.7, 33.7, 0.3),
+    ('Саяны', 52.5, 96.0, 1.5),
+]
+NAMES = [
+    'Эльбрус', 'Казбек', 'Домбай', 'Белуха', 'Актру', 'Чегет', 'Безенги', 'Цей', 'Архыз', 'Ушба',
+    'Шхельда', 'Адыл-Су', 'Джантуган', 'Куэльпорт', 'Юмъечорр', 'Кийнг', 'Туюк', 'Каракол', 'Музтау', 'Топографов',
+]
+BEAUTY_TITLES = ['пер.', 'седл.', 'пер. южный', 'пер. северный']
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Кузнецов', 'Смирнов', 'Попов', 'Волков', 'Соколов']
+FIRST_NAMES = ['Иван', 'Пётр', 'Алексей', 'Сергей', 'Андрей', 'Михаил', 'Дмитрий', 'Николай']
+MIDDLE_NAMES = ['Иванович', 'Петрович', 'Алексеевич', 'Сергеевич', 'Андреевич', 'Михайлович']
+LEVELS = ['', '1А', '1Б', '2А', '2Б', '3А', '3Б']
+ACTIVITIES = ['пеший', 'лыжи', 'катамаран', 'байдарка', 'плот', 'сплав', 'велосипед', 'автомобиль', 'мотоцикл', 'парус']
+# Перевалы без модерации, принятые и отклонённые: статус PE выдаёт только очередь модерации
+STATUSES = [PerevalAdded.NEW] * 6 + [PerevalAdded.ACCEPTED] * 3 + [PerevalAdded.REJECTED]
+
+
+class Command(BaseCommand):
+    help = 'Заполняет БД синтетическими пользователями, перевалами, изображениями и районами для нагрузочных тестов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Количество пользователей')
+        parser.add_argument('--passes', type=int, default=1000, help='Количество перевалов')
+        parser.add_argument('--max-images', type=int, default=3, help='Максимум изображений у перевала')
+        parser.add_argument('--distinct-images', type=int, default=20,
+                            help='Количество разных файлов изображений; перевалы ссылаются на них повторно')
+        parser.add_argument('--areas', type=int, default=5, help='Количество хребтов в каждом горном районе')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора случайных чисел')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, users, passes, max_images, distinct_images, areas, seed, batch_size, **options):
+        rng = random.Random(seed)
+        with transaction.atomic():
+            ranges = self.create_areas(areas)
+            SprActivitiesType.objects.bulk_create([SprActivitiesType(title=title) for title in ACTIVITIES])
+            user_list = self.create_users(rng, users)
+            images = [self.create_image_file(rng, i) for i in range(distinct_images)] if max_images else []
+
+            for start in range(0, passes, batch_size):
+                self.create_passes(rng, start, min(batch_size, passes - start), user_list, images, max_images, ranges)
+
+        self.stdout.write(f'Создано пользователей: {users}, перевалов: {passes}')
+
+    def create_areas(self, count):
+        """Корень дерева, горные районы и хребты в каждом районе; возвращает {район: районы для перевалов}."""
+        root = PerevalArea.objects.create(id_parent=0, title='Планета Земля')
+        regions = PerevalArea.objects.bulk_create([
+            PerevalArea(id_parent=root.id, title=title) for title, *_ in REGIONS
+        ])
+        areas.record_created(regions)
+        ranges = PerevalArea.objects.bulk_create([
+            PerevalArea(id_parent=region.id, title=f'{region.title}, хребет {i + 1}')
+            for region in regions for i in range(count)
+        ])
+        areas.record_created(ranges)
+        return {
+            region.title: [area for area in ranges if area.id_parent == region.id] or [region]
+            for region in regions
+        }
+
+    def create_users(self, rng, count):
+        return User.objects.bulk_create([
+            User(
+                email=f'user{i}@example.com',
+                last_name=rng.choice(LAST_NAMES),
+                first_name=rng.choice(FIRST_NAMES),
+                middle_name=rng.choice(MIDDLE_NAMES),
+                phone=f'7{rng.randrange(10 ** 10):010d}',
+            )
+            for i in range(count)
+        ])
+
+    def create_image_file(self, rng, number):
+        """Небольшой JPEG, сохранённый в хранилище изображений; возвращает имя файла."""
+        image = Image.new('RGB', (640, 480), tuple(rng.randrange(256) for _ in range(3)))
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=80)
+        return image_storage.save(f'images/generated_{number}.jpg', ContentFile(buffer.getvalue()))
+
+    def create_passes(self, rng, start, count, users, images, max_images, ranges):
+        coords, pass_areas = [], []
+        for _ in range(count):
+            region, latitude, longitude, spread = rng.choice(REGIONS)
+            pass_areas.append(rng.choice(ranges[region]))
+            item = Coords(
+                latitude=round(latitude + rng.uniform(-spread, spread), 6),
+                longitude=round(longitude + rng.uniform(-spread, spread), 6),
+                height=rng.randint(1500, 6500),
+            )
+            item.update_grid_cell()
+            coords.append(item)
+        Coords.objects.bulk_create(coords)
+
+        perevals = PerevalAdded.objects.bulk_create([
+            PerevalAdded(
+                user=rng.choice(users),
+                coords=item,
+                area=area,
+                status=rng.choice(STATUSES),
+                beauty_title=rng.choice(BEAUTY_TITLES),
+                title=f'{rng.choice(NAMES)} {start + i + 1}',
+                other_titles=rng.choice(NAMES),
+                connect='',
+                level_spring=rng.choice(LEVELS),
+                level_summer=rng.choice(LEVELS),
+                level_autumn=rng.choice(LEVELS),
+                level_winter=rng.choice(LEVELS),
+            )
+            for i, (item, area) in enumerate(zip(coords, pass_areas))
+        ])
+        stats.record_created(perevals)
+        tiles.invalidate_points([(item.latitude, item.longitude) for item in coords])
+
+        attached = PerevalImage.objects.bulk_create([
+            PerevalImage(pereval=pereval, data=rng.choice(images), title=f'Фото {number + 1}')
+            for pereval in perevals for number in range(rng.randint(0, max_images))
+        ])
+        blobs.attach([image.data.name for image in attached])
@@ -0,0 +1,81 @@
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from functools import partial
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from pereval_app import importer
+
+
+class Command(BaseCommand):
+    help = ('Импортирует перевалы из архива NDJSON или CSV (формат выгрузки export_perevals) пачками; '
+            'повторный запуск продолжает прерванный импорт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл архива')
+        parser.add_argument('--format', choices=importer.IMPORT_FORMATS, dest='input_format',
+                            help='Формат архива, по умолчанию по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Количество записей в одной транзакции')
+        parser.add_argument('--workers', type=int, default=1, help='Количество параллельных процессов')
+        parser.add_argument('--checkpoint', help='Имя, под которым запоминаются импортированные пачки; '
+                                                 'по умолчанию имя файла')
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Писать через bulk_create и в PostgreSQL, без COPY')
+
+    def handle(self, *args, path, input_format, batch_size, workers, checkpoint, no_copy, **options):
+        input_format = input_format or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        if workers > 1 and connection.vendor == 'sqlite':
+            raise CommandError('SQLite допускает только одну пишущую транзакцию, используйте --workers 1')
+        source = checkpoint or os.path.basename(path)
+
+        done = importer.completed_ranges(source)
+        if done:
+            skipped = sum(last - first + 1 for first, last in done)
+            self.stdout.write(f'Продолжение импорта {source}: пропускается записей из прошлых запусков: {skipped}')
+
+        save = partial(importer.save_batch, source, use_copy=False if no_copy else None)
+        imported = rejected = 0
+        started = time.perf_counter()
+        with open(path, encoding='utf-8', newline='') as file:
+            batches = importer.iter_batches(importer.read_records(file, input_format), batch_size, done)
+            for first, last, count, errors in self.run(save, batches, workers):
+                imported += count
+                rejected += len(errors)
+                for number, detail in errors:
+                    self.stderr.write(f'Запись {number}: {json.dumps(detail, ensure_ascii=False)}')
+                if options['verbosity'] > 1:
+                    self.stdout.write(
+                        f'Записи {first}-{last}: импортировано {count}, '
+                        f'{self.rate(imported + rejected, started):.0f} записей/с'
+                    )
+
+        self.stdout.write(
+            f'Импортировано перевалов: {imported}, отклонено: {rejected}, '
+            f'{time.perf_counter() - started:.1f} с, {self.rate(imported + rejected, started):.0f} записей/с'
+        )
+
+    def run(self, save, batches, workers):
+        """Результаты пачек в порядке файла; в процессы одновременно отдаётся не больше двух пачек на каждый."""
+        if workers == 1:
+            for batch in batches:
+                yield save(batch)
+            return
+
+        # Дочерние процессы открывают свои соединения с БД
+        connections.close_all()
+        with multiprocessing.Pool(workers, initializer=django.setup) as pool:
+            pending = deque()
+            for batch in batches:
+                pending.append(pool.apply_async(save, (batch,)))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+
+    def rate(self, count, started):
+        return count / max(time.perf_counter() - started, 1e-9)
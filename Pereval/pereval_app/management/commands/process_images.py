@@ -0,0 +1,45 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+
+from pereval_app.images import claim_jobs, finish_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь изображений: строит уменьшенные копии WebP/JPEG без EXIF.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Количество процессов обработки; 0 — обрабатывать в текущем процессе')
+        parser.add_argument('--batch-size', type=int, default=20, help='Сколько заданий забирать за раз')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Пауза при пустой очереди, секунды')
+        parser.add_argument('--once', action='store_true', help='Завершиться, когда очередь опустеет')
+
+    def handle(self, *args, workers, batch_size, poll_interval, once, **options):
+        if workers:
+            # Процессы запускаются заново (spawn), а не копией текущего: пул создаёт их
+            # по мере надобности, и при fork они унаследовали бы открытое соединение с БД
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+            ) as pool:
+                self.loop(pool.map, batch_size, poll_interval, once)
+        else:
+            self.loop(map, batch_size, poll_interval, once)
+
+    def loop(self, map_jobs, batch_size, poll_interval, once):
+        while True:
+            jobs = claim_jobs(batch_size)
+            if not jobs:
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+
+            for job_id, error in map_jobs(run_job, jobs):
+                finish_job(job_id, error)
+                if error:
+                    self.stderr.write(f'Задание {job_id}: {error}')
+            self.stdout.write(f'Обработано заданий: {len(jobs)}')
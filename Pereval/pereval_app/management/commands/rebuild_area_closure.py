@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pereval_app.areas import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Строит заново таблицу замыкания районов (PerevalAreaClosure) по id_parent.'
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(f'Строк замыкания: {count}')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pereval_app.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики статистики перевалов (GET /api/stats/) по таблице перевалов.'
+
+    def handle(self, *args, **options):
+        counts = rebuild()
+        self.stdout.write(f'Пересчитано счётчиков: {len(counts)}')
@@ -0,0 +1,201 @@
+"""
+Отдача медиафайлов (изображения перевалов и их копии): GET /media/<путь>.
+
+Отдаются только файлы каталога images/: недокачанные части uploads/ и
+прочее содержимое MEDIA_ROOT недоступны. Content-Type берётся только для
+форматов изображений из IMAGE_CONTENT_TYPES; любой другой файл отдаётся как
+application/octet-stream на скачивание, чтобы файл с подобранным расширением
+(например, .html) не открывался браузером со страницы API.
+
+Файлы, сохранённые по хешу содержимого (storage.py), никогда не меняются:
+их ETag — сам хеш, а Cache-Control разрешает кэшировать их год без проверки.
+Остальные файлы (копии изображений пересоздаются под тем же именем)
+кэшируются на PEREVAL_MEDIA_MAX_AGE секунд с ETag по времени изменения и
+размеру. Повторный запрос с If-None-Match или If-Modified-Since получает 304.
+
+За прокси файл отдаёт сам прокси: при PEREVAL_MEDIA_OFFLOAD=x-accel-redirect
+(nginx) или x-sendfile (Apache, lighttpd) ответ содержит только заголовки, а
+диапазоны прокси обрабатывает сам. Без прокси файл отдаёт FileResponse:
+WSGI-сервер с wsgi.file_wrapper (gunicorn) передаёт его через sendfile без
+копирования в Python, в том числе часть файла по заголовку Range.
+"""
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+from rest_framework import status
+
+from .storage import blob_sha256
+
+SERVED_PREFIX = 'images/'
+IMAGE_CONTENT_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+}
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+class FileRange:
+    """
+         Часть открытого файла для FileResponse.
+
+         read() не выходит за конец диапазона, а fileno() позволяет серверу
+         отправить часть через sendfile: файл уже стоит на начале диапазона,
+         длину сервер берёт из Content-Length.
+     """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+         (начало, длина) из заголовка Range с одним диапазоном байт.
+
+         None — заголовок не поддерживается (несколько диапазонов, другие единицы)
+         и файл отдаётся целиком; RangeNotSatisfiable — диапазон вне файла.
+     """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # bytes=-N: последние N байт
+        length = min(int(last), size)
+        if not length:
+            raise RangeNotSatisfiable
+        return size - length, length
+    start = int(first)
+    if start >= size:
+        raise RangeNotSatisfiable
+    end = min(int(last), size - 1) if last else size - 1
+    if end < start:
+        return None
+    return start, end - start + 1
+
+
+def file_etag(name, file_stat):
+    sha256 = blob_sha256(name)
+    if sha256 is not None:
+        return f'"{sha256}"'
+    return f'"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}"'
+
+
+def not_modified(request, etag, mtime):
+    """Проверка If-None-Match, а без него — If-Modified-Since."""
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return etag in etags or etags == ['*']
+    return not was_modified_since(request.headers.get('If-Modified-Since'), mtime)
+
+
+def requested_range(request, etag, last_modified, size):
+    header = request.headers.get('Range')
+    if not header:
+        return None
+    # If-Range: диапазон только для той же версии файла, иначе файл целиком
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range not in (etag, last_modified):
+        return None
+    return parse_range(header, size)
+
+
+@require_safe
+def media_view(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Файл не найден')
+    try:
+        file_stat = os.stat(full_path)
+    except OSError:
+        raise Http404('Файл не найден')
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404('Файл не найден')
+
+    name = os.path.relpath(full_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+    if not name.startswith(SERVED_PREFIX):
+        raise Http404('Файл не найден')
+    etag = file_etag(name, file_stat)
+    last_modified = http_date(file_stat.st_mtime)
+    content_type = IMAGE_CONTENT_TYPES.get(os.path.splitext(name)[1].lower())
+    headers = {
+        'ETag': etag,
+        'Last-Modified': last_modified,
+        'Cache-Control': (
+            IMMUTABLE_CACHE_CONTROL if blob_sha256(name)
+            else f'public, max-age={settings.PEREVAL_MEDIA_MAX_AGE}'
+        ),
+        'Accept-Ranges': 'bytes',
+        'X-Content-Type-Options': 'nosniff',
+    }
+    if content_type is None:
+        content_type = 'application/octet-stream'
+        headers['Content-Disposition'] = 'attachment'
+
+    if not_modified(request, etag, file_stat.st_mtime):
+        return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    offload = settings.PEREVAL_MEDIA_OFFLOAD
+    if offload == 'x-accel-redirect':
+        headers['X-Accel-Redirect'] = settings.PEREVAL_MEDIA_ACCEL_PREFIX + quote(name)
+        return HttpResponse(content_type=content_type, headers=headers)
+    if offload == 'x-sendfile':
+        headers['X-Sendfile'] = full_path
+        return HttpResponse(content_type=content_type, headers=headers)
+
+    size = file_stat.st_size
+    try:
+        byte_range = requested_range(request, etag, last_modified, size)
+    except RangeNotSatisfiable:
+        headers['Content-Range'] = f'bytes */{size}'
+        return HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers=headers)
+    start, length = byte_range or (0, size)
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type, headers=headers)
+    elif byte_range:
+        response = FileResponse(FileRange(open(full_path, 'rb'), start, length), content_type=content_type)
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    for header, value in headers.items():
+        response[header] = value
+    response['Content-Length'] = length
+    if byte_range:
+        response.status_code = status.HTTP_206_PARTIAL_CONTENT
+        response['Content-Range'] = f'bytes {start}-{start + length - 1}/{size}'
+    return response
@@ -0,0 +1,188 @@
+"""
+Метрики запросов по эндпоинтам в текстовом формате Prometheus.
+
+MetricsMiddleware (middleware.py) для каждого запроса записывает время ответа,
+число и суммарное время SQL-запросов и размер ответа с метками — именем URL,
+методом и классом статуса (см. request_labels).
+SQL-запросы считает обёртка query_recorder, которая ставится на каждое
+соединение с БД (signals.py); текущий запрос она находит через contextvar,
+поэтому запросы асинхронного ORM из других потоков тоже учитываются.
+
+Метрики хранятся в памяти процесса: при нескольких рабочих процессах каждый
+отдаёт свои, и Prometheus должен опрашивать их по отдельности.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.http import HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024)
+
+# Эндпоинт без имени URL (например, 404): одна метка на все такие запросы
+UNMATCHED = 'unmatched'
+# Метод не из списка (его присылает клиент) попадает в общую метку
+METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+OTHER_METHOD = 'other'
+
+
+def request_labels(match, method, status_code):
+    """
+         Метки запроса: имя URL, метод и класс статуса (2xx, 4xx...).
+
+         Значения меток берутся только из конечных наборов, иначе запросы с
+         произвольными путями или методами раздували бы реестр без предела.
+     """
+    endpoint = match.view_name if match else UNMATCHED
+    method = method if method in METHODS else OTHER_METHOD
+    return endpoint, method, f'{status_code // 100}xx'
+
+
+class RequestStats:
+    """SQL-запросы одного HTTP-запроса."""
+    __slots__ = ('queries', 'query_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+current_request = ContextVar('pereval_request_stats', default=None)
+
+
+def query_recorder(execute, sql, params, many, context):
+    """Обёртка connection.execute_wrapper: считает запросы текущего HTTP-запроса."""
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - started
+
+
+def install_query_recorder(db_connection):
+    if query_recorder not in db_connection.execute_wrappers:
+        db_connection.execute_wrappers.append(query_recorder)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class EndpointMetrics:
+    __slots__ = ('latency', 'size', 'statuses', 'queries', 'query_seconds')
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.statuses = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, endpoint, method, status, seconds, stats):
+        with self.lock:
+            metrics = self.endpoints.get((endpoint, method))
+            if metrics is None:
+                metrics = self.endpoints[(endpoint, method)] = EndpointMetrics()
+            metrics.latency.observe(seconds)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.queries += stats.queries
+            metrics.query_seconds += stats.query_seconds
+
+    def record_size(self, endpoint, method, size):
+        with self.lock:
+            metrics = self.endpoints.get((endpoint, method))
+            if metrics is not None:
+                metrics.size.observe(size)
+
+    def clear(self):
+        with self.lock:
+            self.endpoints.clear()
+
+    def render(self):
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            lines = [
+                '# HELP pereval_http_requests_total Количество запросов.',
+                '# TYPE pereval_http_requests_total counter',
+            ]
+            for (endpoint, method), metrics in endpoints:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(
+                        f'pereval_http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}'
+                    )
+
+            lines += [
+                '# HELP pereval_http_request_duration_seconds Время ответа.',
+                '# TYPE pereval_http_request_duration_seconds histogram',
+            ]
+            for (endpoint, method), metrics in endpoints:
+                lines.extend(metrics.latency.samples(
+                    'pereval_http_request_duration_seconds', f'endpoint="{endpoint}",method="{method}"'
+                ))
+
+            lines += [
+                '# HELP pereval_http_response_size_bytes Размер тела ответа.',
+                '# TYPE pereval_http_response_size_bytes histogram',
+            ]
+            for (endpoint, method), metrics in endpoints:
+                lines.extend(metrics.size.samples(
+                    'pereval_http_response_size_bytes', f'endpoint="{endpoint}",method="{method}"'
+                ))
+
+            lines += [
+                '# HELP pereval_db_queries_total Количество SQL-запросов.',
+                '# TYPE pereval_db_queries_total counter',
+            ]
+            lines.extend(
+                f'pereval_db_queries_total{{endpoint="{endpoint}",method="{method}"}} {metrics.queries}'
+                for (endpoint, method), metrics in endpoints
+            )
+
+            lines += [
+                '# HELP pereval_db_query_seconds_total Суммарное время SQL-запросов.',
+                '# TYPE pereval_db_query_seconds_total counter',
+            ]
+            lines.extend(
+                f'pereval_db_query_seconds_total{{endpoint="{endpoint}",method="{method}"}} {metrics.query_seconds}'
+                for (endpoint, method), metrics in endpoints
+            )
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def metrics_view(request):
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
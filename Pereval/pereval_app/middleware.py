@@ -0,0 +1,151 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import RequestStats, current_request, registry, request_labels
+from .routers import PRIMARY_COOKIE, READ_VIEWS, RoutingState, current_state
+
+
+def streams_file(response):
+    """
+         FileResponse с файлом: сервер может отдать его через sendfile.
+
+         Замена streaming_content превратила бы его в обычный генератор,
+         поэтому такие ответы не оборачиваются (БД при отдаче файла не читается).
+     """
+    return getattr(response, 'file_to_stream', None) is not None
+
+
+class MetricsMiddleware:
+    """
+         Записывает метрики запроса в metrics.registry.
+
+         Для потоковых ответов метрики записываются после отдачи последней
+         части: выгрузка читает БД во время передачи ответа.
+     """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, stats, started)
+
+    def finish(self, request, response, stats, started):
+        labels = request_labels(request.resolver_match, request.method, response.status_code)
+        if response.streaming and not response.is_async and not streams_file(response):
+            response.streaming_content = self.stream(response.streaming_content, labels, stats, started)
+            return response
+
+        registry.record(*labels, time.perf_counter() - started, stats)
+        if not response.streaming:
+            registry.record_size(labels[0], labels[1], len(response.content))
+        elif streams_file(response):
+            registry.record_size(labels[0], labels[1], int(response.get('Content-Length', 0)))
+        return response
+
+    def stream(self, content, labels, stats, started):
+        size = 0
+        iterator = iter(content)
+        try:
+            while True:
+                # Запросы к БД при чтении следующей части относятся к этому HTTP-запросу
+                token = current_request.set(stats)
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    current_request.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            registry.record(*labels, time.perf_counter() - started, stats)
+            registry.record_size(labels[0], labels[1], size)
+
+
+class ReplicaMiddleware:
+    """
+         Состояние маршрутизации БД для запроса (routers.py).
+
+         Отмечает представления только для чтения, а после записи ставит cookie,
+         с которой следующие запросы клиента читают основную БД. Потоковые
+         ответы читают БД во время передачи, поэтому состояние действует и на
+         время отдачи их частей.
+     """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState(pinned=PRIMARY_COOKIE in request.COOKIES)
+        token = current_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_state.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        state = RoutingState(pinned=PRIMARY_COOKIE in request.COOKIES)
+        token = current_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_state.reset(token)
+        return self.finish(response, state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Представление может выполняться в другом контексте (sync_to_async),
+        # поэтому меняется сам объект состояния, а не переменная контекста
+        current_state.get().read_only = request.resolver_match.url_name in READ_VIEWS
+
+    def finish(self, response, state):
+        if state.wrote and settings.PEREVAL_DB_REPLICA:
+            response.set_cookie(
+                PRIMARY_COOKIE, '1', max_age=settings.PEREVAL_DB_REPLICA_LAG, httponly=True, samesite='Lax'
+            )
+        if response.streaming and not response.is_async and not streams_file(response):
+            response.streaming_content = self.stream(response.streaming_content, state)
+        return response
+
+    def stream(self, content, state):
+        iterator = iter(content)
+        while True:
+            token = current_state.set(state)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                current_state.reset(token)
+            yield chunk
@@ -0,0 +1,138 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pereval_app', '0001_initial'),
+    ]
+
+    operations = [
+        # User
+        migrations.RenameField(model_name='user', old_name='fam', new_name='last_name'),
+        migrations.RenameField(model_name='user', old_name='name', new_name='first_name'),
+        migrations.RenameField(model_name='user', old_name='otc', new_name='middle_name'),
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.EmailField(max_length=254, unique=True, verbose_name='Электронная почта'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='last_name',
+            field=models.CharField(max_length=256, verbose_name='Фамилия'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='first_name',
+            field=models.CharField(max_length=256, verbose_name='Имя'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='middle_name',
+            field=models.CharField(max_length=256, verbose_name='Отчество'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='phone',
+            field=models.CharField(max_length=11, verbose_name='Номер телефона'),
+        ),
+
+        # Coords
+        migrations.AlterField(
+            model_name='coords',
+            name='latitude',
+            field=models.FloatField(verbose_name='Широта'),
+        ),
+        migrations.AlterField(
+            model_name='coords',
+            name='longitude',
+            field=models.FloatField(verbose_name='Долгота'),
+        ),
+        migrations.AlterField(
+            model_name='coords',
+            name='height',
+            field=models.IntegerField(verbose_name='Высота над уровнем моря'),
+        ),
+
+        # PerevalAdded
+        migrations.RemoveField(model_name='perevaladded', name='level'),
+        migrations.RemoveField(model_name='perevaladded', name='add_time'),
+        migrations.DeleteModel(name='Level'),
+        migrations.RenameField(model_name='perevaladded', old_name='date_added', new_name='datetime'),
+        migrations.AlterField(
+            model_name='perevaladded',
+            name='status',
+            field=models.CharField(
+                choices=[('NE', 'new'), ('PE', 'pending'), ('AC', 'accepted'), ('RE', 'rejected')],
+                default='NE', max_length=2, verbose_name='Статус',
+            ),
+        ),
+        migrations.AlterField(
+            model_name='perevaladded',
+            name='coords',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='pereval_app.coords'),
+        ),
+        migrations.AlterField(
+            model_name='perevaladded',
+            name='beauty_title',
+            field=models.CharField(max_length=256, verbose_name='Тип местности'),
+        ),
+        migrations.AlterField(
+            model_name='perevaladded',
+            name='title',
+            field=models.CharField(max_length=256, verbose_name='Название'),
+        ),
+        migrations.AlterField(
+            model_name='perevaladded',
+            name='other_titles',
+            field=models.CharField(max_length=256, verbose_name='Другие названия'),
+        ),
+        migrations.AlterField(
+            model_name='perevaladded',
+            name='connect',
+            field=models.TextField(blank=True, verbose_name='Сопроводительный текст'),
+        ),
+        migrations.AddField(
+            model_name='perevaladded',
+            name='level_spring',
+            field=models.CharField(blank=True, max_length=5, verbose_name='Уровень сложности весной'),
+        ),
+        migrations.AddField(
+            model_name='perevaladded',
+            name='level_summer',
+            field=models.CharField(blank=True, max_length=5, verbose_name='Уровень сложности летом'),
+        ),
+        migrations.AddField(
+            model_name='perevaladded',
+            name='level_autumn',
+            field=models.CharField(blank=True, max_length=5, verbose_name='Уровень сложности осенью'),
+        ),
+        migrations.AddField(
+            model_name='perevaladded',
+            name='level_winter',
+            field=models.CharField(blank=True, max_length=5, verbose_name='Уровень сложности зимой'),
+        ),
+
+        # PerevalImage
+        migrations.AlterField(
+            model_name='perevalimage',
+            name='pereval',
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='attached_images',
+                to='pereval_app.perevaladded',
+            ),
+        ),
+        migrations.AlterField(
+            model_name='perevalimage',
+            name='data',
+            field=models.ImageField(upload_to='images/'),
+        ),
+        migrations.AlterField(
+            model_name='perevalimage',
+            name='title',
+            field=models.CharField(max_length=255, verbose_name='Примечание'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pereval_app', '0002_sync_models'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='perevaladded',
+            index=models.Index(fields=['user', '-datetime', '-id'], name='pereval_user_datetime_idx'),
+        ),
+    ]
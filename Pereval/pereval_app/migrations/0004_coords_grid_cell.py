@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-18 12:41
+
+from django.db import migrations, models
+
+# Формула ячейки из geo.grid_cell на момент миграции: миграция не должна зависеть от кода приложения
+GRID_CELL_DEGREES = 0.1
+GRID_ROWS = round(180 / GRID_CELL_DEGREES)
+GRID_COLUMNS = round(360 / GRID_CELL_DEGREES)
+BATCH_SIZE = 2000
+
+
+def grid_cell(latitude, longitude):
+    row = min(max(int((latitude + 90) / GRID_CELL_DEGREES), 0), GRID_ROWS - 1)
+    column = int(((longitude + 180) % 360) / GRID_CELL_DEGREES) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+def fill_grid_cell(apps, schema_editor):
+    Coords = apps.get_model('pereval_app', 'Coords')
+    batch = []
+    for item in Coords.objects.only('latitude', 'longitude').iterator(chunk_size=BATCH_SIZE):
+        item.grid_cell = grid_cell(item.latitude, item.longitude)
+        batch.append(item)
+        if len(batch) == BATCH_SIZE:
+            Coords.objects.bulk_update(batch, ['grid_cell'])
+            batch = []
+    if batch:
+        Coords.objects.bulk_update(batch, ['grid_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pereval_app', '0003_pereval_user_datetime_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coords',
+            name='grid_cell',
+            field=models.IntegerField(db_index=True, default=0, editable=False, verbose_name='Ячейка сетки'),
+        ),
+        migrations.RunPython(fill_grid_cell, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+from django.db import migrations
+
+# PostgreSQL: вычисляемый столбец tsvector с русской морфологией и GIN индекс.
+# Столбец пересчитывается самой БД при каждой вставке и изменении записи.
+POSTGRESQL_FORWARD = [
+    """
+    ALTER TABLE pereval_app_perevaladded ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(other_titles, '')), 'B')
+        || setweight(to_tsvector('russian', coalesce(beauty_title, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX pereval_search_vector_idx ON pereval_app_perevaladded USING GIN (search_vector)",
+]
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS pereval_search_vector_idx",
+    "ALTER TABLE pereval_app_perevaladded DROP COLUMN IF EXISTS search_vector",
+]
+
+# SQLite: теневая таблица FTS5 над pereval_app_perevaladded, синхронизируется триггерами.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE pereval_app_perevaladded_fts USING fts5(
+        title, other_titles, beauty_title,
+        content='pereval_app_perevaladded', content_rowid='id', tokenize='unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER pereval_app_perevaladded_fts_insert AFTER INSERT ON pereval_app_perevaladded BEGIN
+        INSERT INTO pereval_app_perevaladded_fts (rowid, title, other_titles, beauty_title)
+        VALUES (new.id, new.title, new.other_titles, new.beauty_title);
+    END
+    """,
+    """
+    CREATE TRIGGER pereval_app_perevaladded_fts_delete AFTER DELETE ON pereval_app_perevaladded BEGIN
+        INSERT INTO pereval_app_perevaladded_fts (pereval_app_perevaladded_fts, rowid, title, other_titles, beauty_title)
+        VALUES ('delete', old.id, old.title, old.other_titles, old.beauty_title);
+    END
+    """,
+    """
+    CREATE TRIGGER pereval_app_perevaladded_fts_update AFTER UPDATE ON pereval_app_perevaladded BEGIN
+        INSERT INTO pereval_app_perevaladded_fts (pereval_app_perevaladded_fts, rowid, title, other_titles, beauty_title)
+        VALUES ('delete', old.id, old.title, old.other_titles, old.beauty_title);
+        INSERT INTO pereval_app_perevaladded_fts (rowid, title, other_titles, beauty_title)
+        VALUES (new.id, new.title, new.other_titles, new.beauty_title);
+    END
+    """,
+    "INSERT INTO pereval_app_perevaladded_fts (pereval_app_perevaladded_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS pereval_app_perevaladded_fts_update",
+    "DROP TRIGGER IF EXISTS pereval_app_perevaladded_fts_delete",
+    "DROP TRIGGER IF EXISTS pereval_app_perevaladded_fts_insert",
+    "DROP TABLE IF EXISTS pereval_app_perevaladded_fts",
+]
+
+STATEMENTS = {
+    'postgresql': (POSTGRESQL_FORWARD, POSTGRESQL_BACKWARD),
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def run_statements(schema_editor, forward):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        return
+    for sql in statements[0 if forward else 1]:
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    run_statements(schema_editor, forward=True)
+
+
+def drop_search_index(apps, schema_editor):
+    run_statements(schema_editor, forward=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pereval_app', '0004_coords_grid_cell'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
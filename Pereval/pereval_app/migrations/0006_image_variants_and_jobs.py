@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-18 12:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pereval_app', '0005_pereval_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('NE', 'new'), ('PR', 'processing'), ('DO', 'done'), ('FA', 'failed')], default='NE', max_length=2, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Количество попыток')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='Взято в обработку')),
+                ('image', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='job', to='pereval_app.perevalimage')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='image_job_status_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PerevalImageVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, verbose_name='Размер')),
+                ('format', models.CharField(max_length=8, verbose_name='Формат')),
+                ('file', models.ImageField(upload_to='images/variants/')),
+                ('width', models.PositiveIntegerField(default=0, verbose_name='Ширина')),
+                ('height', models.PositiveIntegerField(default=0, verbose_name='Высота')),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='pereval_app.perevalimage')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('image', 'name', 'format'), name='unique_image_variant')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 12:51
+
+import pereval_app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pereval_app', '0007_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Имя файла')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256 содержимого')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Размер')),
+                ('ref_count', models.IntegerField(default=0, verbose_name='Количество ссылок')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='perevalimage',
+            name='data',
+            field=models.ImageField(storage=pereval_app.storage.get_image_storage, upload_to='images/'),
+        ),
+    ]
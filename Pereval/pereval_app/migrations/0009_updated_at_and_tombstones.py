@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pereval_app', '0008_image_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerevalTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pereval_id', models.BigIntegerField(verbose_name='ID перевала')),
+                ('user_id', models.BigIntegerField(verbose_name='ID пользователя')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='Удалён')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='coords',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменены'),
+        ),
+        migrations.AddField(
+            model_name='perevaladded',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменён'),
+        ),
+        migrations.AddField(
+            model_name='perevalimage',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменено'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменён'),
+        ),
+        migrations.AddIndex(
+            model_name='perevaladded',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='pereval_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='perevaltombstone',
+            index=models.Index(fields=['user_id', 'deleted_at', 'id'], name='tombstone_user_deleted_idx'),
+        ),
+    ]
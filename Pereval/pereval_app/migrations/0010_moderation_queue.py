@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pereval_app', '0009_updated_at_and_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perevaladded',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Взят на модерацию'),
+        ),
+        migrations.AddField(
+            model_name='perevaladded',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=256, verbose_name='Модератор'),
+        ),
+        migrations.AddIndex(
+            model_name='perevaladded',
+            index=models.Index(condition=models.Q(('status__in', ['NE', 'PE'])), fields=['status', 'id'], name='pereval_moderation_idx'),
+        ),
+    ]
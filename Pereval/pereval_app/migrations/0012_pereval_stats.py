@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-18 13:15
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+# Измерения из pereval_app.stats на момент миграции: миграция не должна зависеть от кода приложения
+FIELDS = ('status', 'level_spring', 'level_summer', 'level_autumn', 'level_winter', 'beauty_title')
+MONTH = 'month'
+
+
+def month(value):
+    return timezone.localtime(value).strftime('%Y-%m')
+
+
+def fill_stats(apps, schema_editor):
+    PerevalAdded = apps.get_model('pereval_app', 'PerevalAdded')
+    PerevalStat = apps.get_model('pereval_app', 'PerevalStat')
+    perevals = PerevalAdded.objects.order_by()
+    stats = [
+        PerevalStat(dimension=field, value=value, count=count)
+        for field in FIELDS
+        for value, count in perevals.values_list(field).annotate(count=Count('id'))
+    ]
+    months = {}
+    for value, count in perevals.annotate(month=TruncMonth('datetime')).values_list('month').annotate(count=Count('id')):
+        months[month(value)] = months.get(month(value), 0) + count
+    stats += [PerevalStat(dimension=MONTH, value=value, count=count) for value, count in months.items()]
+    PerevalStat.objects.bulk_create(stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pereval_app', '0011_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerevalStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=32, verbose_name='Поле')),
+                ('value', models.CharField(blank=True, max_length=256, verbose_name='Значение')),
+                ('count', models.BigIntegerField(default=0, verbose_name='Количество')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'value'), name='pereval_stat_unique')],
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
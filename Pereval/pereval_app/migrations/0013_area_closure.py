@@ -0,0 +1,62 @@
+# Generated by Django 5.2 on 2026-10-18 13:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_area_closure(apps, schema_editor):
+    # Копия areas.closure_rows: миграция не должна зависеть от кода приложения
+    PerevalArea = apps.get_model('pereval_app', 'PerevalArea')
+    PerevalAreaClosure = apps.get_model('pereval_app', 'PerevalAreaClosure')
+    parents = dict(PerevalArea.objects.values_list('id', 'id_parent'))
+    links = []
+    for area_id in parents:
+        links.append(PerevalAreaClosure(ancestor_id=area_id, descendant_id=area_id, depth=0))
+        seen = {area_id}
+        parent, depth = parents[area_id], 1
+        while parent in parents and parent not in seen:
+            links.append(PerevalAreaClosure(ancestor_id=parent, descendant_id=area_id, depth=depth))
+            seen.add(parent)
+            parent, depth = parents[parent], depth + 1
+    PerevalAreaClosure.objects.bulk_create(links, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pereval_app', '0012_pereval_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerevalAreaClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(verbose_name='Глубина')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='perevaladded',
+            name='area',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='perevals', to='pereval_app.perevalarea', verbose_name='Район'),
+        ),
+        migrations.AddIndex(
+            model_name='perevaladded',
+            index=models.Index(fields=['area', '-datetime', '-id'], name='pereval_area_datetime_idx'),
+        ),
+        migrations.AddField(
+            model_name='perevalareaclosure',
+            name='ancestor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='pereval_app.perevalarea'),
+        ),
+        migrations.AddField(
+            model_name='perevalareaclosure',
+            name='descendant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='pereval_app.perevalarea'),
+        ),
+        migrations.AddConstraint(
+            model_name='perevalareaclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='pereval_area_closure_unique'),
+        ),
+        migrations.RunPython(fill_area_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pereval_app', '0013_area_closure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, verbose_name='Архив')),
+                ('first_record', models.PositiveIntegerField(verbose_name='Первая запись')),
+                ('last_record', models.PositiveIntegerField(verbose_name='Последняя запись')),
+                ('imported', models.PositiveIntegerField(verbose_name='Импортировано')),
+                ('rejected', models.PositiveIntegerField(verbose_name='Отклонено')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source', 'first_record'), name='import_batch_unique')],
+            },
+        ),
+    ]
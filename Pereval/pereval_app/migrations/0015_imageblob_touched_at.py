@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 13:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pereval_app', '0014_import_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageblob',
+            name='touched_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Последнее сохранение'),
+        ),
+    ]
@@ -1,4 +1,11 @@
+import uuid
+
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from . import geo
+from .storage import blob_sha256, get_image_storage
 
 
 class User(models.Model):
@@ -7,6 +14,7 @@ class User(models.Model):
     first_name = models.CharField(verbose_name='Имя', max_length=256)
     middle_name = models.CharField(verbose_name='Отчество', max_length=256)
     phone = models.CharField(verbose_name='Номер телефона', max_length=11)
+    updated_at = models.DateTimeField(verbose_name='Изменён', auto_now=True)
 
     def __str__(self):
         return f'{self.pk} {self.last_name} {self.first_name} {self.middle_name}'
@@ -16,10 +24,46 @@ class Coords(models.Model):
     latitude = models.FloatField(verbose_name='Широта')
     longitude = models.FloatField(verbose_name='Долгота')
     height = models.IntegerField(verbose_name='Высота над уровнем моря')
+    grid_cell = models.IntegerField(verbose_name='Ячейка сетки', db_index=True, editable=False, default=0)
+    updated_at = models.DateTimeField(verbose_name='Изменены', auto_now=True)
 
     def __str__(self):
         return f'latitude:{self.latitude} longitude:{self.longitude} height:{self.height}'
 
+    def update_grid_cell(self):
+        """Пересчитывает ячейку сетки; вызывается при save() и перед bulk_create."""
+        self.grid_cell = geo.grid_cell(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        self.update_grid_cell()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'grid_cell'}
+        super().save(*args, **kwargs)
+
+
+class PerevalAddedQuerySet(models.QuerySet):
+    def with_related(self):
+        """Подгружает пользователя, координаты и изображения без отдельного запроса на каждую запись."""
+        return self.select_related('user', 'coords').prefetch_related('attached_images__variants')
+
+    def in_bbox(self, lat_min, lat_max, lon_min, lon_max):
+        """Перевалы внутри прямоугольника: отбор по индексу ячеек сетки, затем точно по координатам."""
+        cells = Q()
+        for first, last in geo.cell_ranges(lat_min, lat_max, lon_min, lon_max):
+            cells |= Q(coords__grid_cell__range=(first, last))
+
+        longitudes = Q()
+        for west, east in geo.longitude_intervals(lon_min, lon_max):
+            longitudes |= Q(coords__longitude__range=(west, east))
+
+        return self.filter(cells, longitudes, coords__latitude__range=(lat_min, lat_max))
+
+    def in_area(self, area_id):
+        """Перевалы района и всех вложенных районов: один подзапрос к таблице замыкания по индексу."""
+        descendants = PerevalAreaClosure.objects.filter(ancestor_id=area_id).values('descendant_id')
+        return self.filter(area_id__in=descendants)
+
 
 class PerevalAdded(models.Model):
     NEW, PENDING, ACCEPTED, REJECTED = 'NE', 'PE', 'AC', 'RE'
@@ -37,10 +81,37 @@ class PerevalAdded(models.Model):
     other_titles = models.CharField(verbose_name='Другие названия', max_length=256)
     connect = models.TextField(verbose_name='Сопроводительный текст', blank=True)
     datetime = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(verbose_name='Изменён', auto_now=True)
+    # Модератор, взявший перевал на проверку, и время взятия (см. moderation.py)
+    claimed_by = models.CharField(verbose_name='Модератор', max_length=256, blank=True)
+    claimed_at = models.DateTimeField(verbose_name='Взят на модерацию', null=True, blank=True)
     level_spring = models.CharField(verbose_name='Уровень сложности весной', max_length=5, blank=True)
     level_summer = models.CharField(verbose_name='Уровень сложности летом', max_length=5, blank=True)
     level_autumn = models.CharField(verbose_name='Уровень сложности осенью', max_length=5, blank=True)
     level_winter = models.CharField(verbose_name='Уровень сложности зимой', max_length=5, blank=True)
+    # Индекс по району — составной pereval_area_datetime_idx ниже
+    area = models.ForeignKey(
+        'PerevalArea', verbose_name='Район', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='perevals', db_index=False
+    )
+
+    objects = PerevalAddedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset-пагинация списка перевалов пользователя по (datetime, id)
+            models.Index(fields=['user', '-datetime', '-id'], name='pereval_user_datetime_idx'),
+            # Лента изменений для синхронизации по (updated_at, id)
+            models.Index(fields=['user', 'updated_at', 'id'], name='pereval_user_updated_idx'),
+            # Перевалы районов от новых к старым (areas.py)
+            models.Index(fields=['area', '-datetime', '-id'], name='pereval_area_datetime_idx'),
+            # Очередь модерации: только перевалы, ожидающие проверки
+            models.Index(
+                fields=['status', 'id'],
+                condition=models.Q(status__in=['NE', 'PE']),
+                name='pereval_moderation_idx'
+            ),
+        ]
 
 
 class PerevalImage(models.Model):
@@ -49,12 +120,148 @@ class PerevalImage(models.Model):
         on_delete=models.CASCADE,
         related_name='attached_images'  # Уникальное имя для обратной связи
     )
-    data = models.ImageField(upload_to='images/')
+    data = models.ImageField(upload_to='images/', storage=get_image_storage)
     title = models.CharField(verbose_name='Примечание',max_length=255)
+    updated_at = models.DateTimeField(verbose_name='Изменено', auto_now=True)
 
     def __str__(self):
         return self.title
 
+    @property
+    def sha256(self):
+        """Хеш содержимого файла, если он сохранён по хешу."""
+        return blob_sha256(self.data.name)
+
+
+class ImageBlob(models.Model):
+    name = models.CharField(verbose_name='Имя файла', max_length=255, unique=True)
+    sha256 = models.CharField(verbose_name='SHA-256 содержимого', max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField(verbose_name='Размер')
+    ref_count = models.IntegerField(verbose_name='Количество ссылок', default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Последнее сохранение того же содержимого; gc_blobs не трогает недавно сохранённые файлы
+    touched_at = models.DateTimeField(verbose_name='Последнее сохранение', default=timezone.now)
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count})'
+
+
+class PerevalTombstone(models.Model):
+    """Отметка об удалённом перевале для ленты синхронизации."""
+    pereval_id = models.BigIntegerField(verbose_name='ID перевала')
+    user_id = models.BigIntegerField(verbose_name='ID пользователя')
+    deleted_at = models.DateTimeField(verbose_name='Удалён', auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'deleted_at', 'id'], name='tombstone_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.pereval_id} {self.deleted_at}'
+
+
+class PerevalImageVariant(models.Model):
+    image = models.ForeignKey(PerevalImage, on_delete=models.CASCADE, related_name='variants')
+    name = models.CharField(verbose_name='Размер', max_length=32)
+    format = models.CharField(verbose_name='Формат', max_length=8)
+    file = models.ImageField(upload_to='images/variants/')
+    width = models.PositiveIntegerField(verbose_name='Ширина', default=0)
+    height = models.PositiveIntegerField(verbose_name='Высота', default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['image', 'name', 'format'], name='unique_image_variant'),
+        ]
+
+    def __str__(self):
+        return f'{self.image_id} {self.name}.{self.format}'
+
+
+class ImageJob(models.Model):
+    NEW, PROCESSING, DONE, FAILED = 'NE', 'PR', 'DO', 'FA'
+    STATUS_CHOICES = [
+        (NEW, 'new'),
+        (PROCESSING, 'processing'),
+        (DONE, 'done'),
+        (FAILED, 'failed')
+    ]
+    image = models.OneToOneField(PerevalImage, on_delete=models.CASCADE, related_name='job')
+    status = models.CharField(verbose_name='Статус', max_length=2, choices=STATUS_CHOICES, default=NEW)
+    attempts = models.PositiveSmallIntegerField(verbose_name='Количество попыток', default=0)
+    error = models.TextField(verbose_name='Ошибка', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(verbose_name='Взято в обработку', null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Выборка очереди обработчиком: задания в статусе new по порядку
+            models.Index(fields=['status', 'id'], name='image_job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.image_id} {self.get_status_display()}'
+
+
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(verbose_name='Имя файла', max_length=255)
+    size = models.PositiveBigIntegerField(verbose_name='Размер файла')
+    received = models.PositiveBigIntegerField(verbose_name='Получено байт', default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def part_name(self):
+        """Имя недокачанного файла в хранилище медиафайлов."""
+        return f'uploads/{self.id}.part'
+
+    def __str__(self):
+        return f'{self.filename} {self.received}/{self.size}'
+
+
+class PerevalStat(models.Model):
+    """Количество перевалов с данным значением поля (см. stats.py)."""
+    dimension = models.CharField(verbose_name='Поле', max_length=32)
+    value = models.CharField(verbose_name='Значение', max_length=256, blank=True)
+    count = models.BigIntegerField(verbose_name='Количество', default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'value'], name='pereval_stat_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.dimension}={self.value}: {self.count}'
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField(verbose_name='Ключ', max_length=255, unique=True)
+    request_hash = models.CharField(verbose_name='SHA-256 тела запроса', max_length=64)
+    status_code = models.PositiveSmallIntegerField(verbose_name='Код ответа', null=True)
+    response = models.JSONField(verbose_name='Ответ', null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.key} {self.status_code}'
+
+
+class ImportBatch(models.Model):
+    """Пачка записей архива, импортированная manage.py import_perevals (см. importer.py)."""
+    source = models.CharField(verbose_name='Архив', max_length=255)
+    first_record = models.PositiveIntegerField(verbose_name='Первая запись')
+    last_record = models.PositiveIntegerField(verbose_name='Последняя запись')
+    imported = models.PositiveIntegerField(verbose_name='Импортировано')
+    rejected = models.PositiveIntegerField(verbose_name='Отклонено')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'first_record'], name='import_batch_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.source} {self.first_record}-{self.last_record}'
+
 
 class PerevalArea(models.Model):
     id_parent = models.BigIntegerField()
@@ -64,6 +271,22 @@ class PerevalArea(models.Model):
         return self.title
 
 
+class PerevalAreaClosure(models.Model):
+    """Пары (район, вложенный в него район) на любой глубине, включая сам район (см. areas.py)."""
+    ancestor = models.ForeignKey(PerevalArea, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(PerevalArea, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField(verbose_name='Глубина')
+
+    class Meta:
+        constraints = [
+            # Индекс (ancestor, descendant) отвечает на вопрос «все районы внутри района»
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='pereval_area_closure_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.ancestor_id} > {self.descendant_id} ({self.depth})'
+
+
 class SprActivitiesType(models.Model):
     title = models.TextField()
 
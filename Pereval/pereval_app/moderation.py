@@ -0,0 +1,75 @@
+"""
+Очередь модерации перевалов.
+
+Модератор забирает пачку новых перевалов (статус NE), они переходят в статус
+PE и закрепляются за ним. Строки выбираются с SELECT ... FOR UPDATE SKIP LOCKED,
+поэтому параллельные модераторы не ждут друг друга и не получают одни и те же
+перевалы. Если перевал не проверен за PEREVAL_MODERATION_CLAIM_TIMEOUT секунд,
+он снова попадает в очередь.
+
+Статусы меняются через update(), минуя сигналы, поэтому updated_at,
+кэш ответов и счётчики статистики обновляются здесь явно.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import stats
+from .caching import invalidate_details
+from .models import PerevalAdded
+
+
+def claimable():
+    """Условие на перевалы, которые можно взять на модерацию: новые и с истёкшим закреплением."""
+    expired = timezone.now() - timedelta(seconds=settings.PEREVAL_MODERATION_CLAIM_TIMEOUT)
+    return Q(status=PerevalAdded.NEW) | Q(status=PerevalAdded.PENDING, claimed_at__lt=expired)
+
+
+def claim(moderator, limit):
+    """Закрепляет за модератором до limit перевалов из очереди и возвращает их, старые первыми."""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            PerevalAdded.objects.select_for_update(skip_locked=True)
+            .filter(claimable())
+            .order_by('id')
+            .values_list('id', flat=True)[:limit]
+        )
+        # Повторная проверка условия защищает от гонки там, где SKIP LOCKED не поддерживается
+        claimed = PerevalAdded.objects.filter(claimable(), id__in=ids)
+        changes = {'status': PerevalAdded.PENDING, 'claimed_by': moderator, 'claimed_at': now, 'updated_at': now}
+        # Сначала перевалы с истёкшим закреплением: после обновления они уже не подходят под claimable()
+        claimed.filter(status=PerevalAdded.PENDING).update(**changes)
+        new_count = claimed.filter(status=PerevalAdded.NEW).update(**changes)
+        stats.record_status_change(new_count, PerevalAdded.NEW, PerevalAdded.PENDING)
+        invalidate_details(ids)
+    return list(
+        PerevalAdded.objects.with_related()
+        .filter(id__in=ids, claimed_by=moderator, claimed_at=now)
+        .order_by('id')
+    )
+
+
+def resolve(moderator, ids, new_status):
+    """
+         Переводит закреплённые за модератором перевалы в статус new_status.
+
+         Возвращает id перевалов, статус которых изменён; перевалы, закреплённые
+         за другим модератором или уже проверенные, пропускаются.
+     """
+    with transaction.atomic():
+        resolved = list(
+            PerevalAdded.objects.select_for_update()
+            .filter(id__in=ids, status=PerevalAdded.PENDING, claimed_by=moderator)
+            .values_list('id', flat=True)
+        )
+        PerevalAdded.objects.filter(id__in=resolved).update(
+            status=new_status, claimed_by='', claimed_at=None, updated_at=timezone.now()
+        )
+        stats.record_status_change(len(resolved), PerevalAdded.PENDING, new_status)
+        invalidate_details(resolved)
+    return sorted(resolved)
+
@@ -0,0 +1,97 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class PerevalCursorPagination(BasePagination):
+    """
+         Keyset-пагинация перевалов по паре (datetime, id), от новых к старым.
+
+         Курсор — непрозрачная строка с datetime и id последней записи страницы.
+         Следующая страница выбирается условием по индексу, а не OFFSET,
+         поэтому дальние страницы стоят столько же, сколько первая.
+     """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('-datetime', '-id')
+
+    def get_page_size(self, request):
+        page_size = settings.PEREVAL_LIST_PAGE_SIZE
+        if self.page_size_query_param in request.query_params:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+            except ValueError:
+                raise ValidationError({self.page_size_query_param: 'Ожидается целое число'})
+            if page_size < 1:
+                raise ValidationError({self.page_size_query_param: 'Ожидается положительное число'})
+        return min(page_size, settings.PEREVAL_LIST_MAX_PAGE_SIZE)
+
+    def encode_cursor(self, pereval):
+        # Страница состоит из моделей или из строк .values() (fast_read.py)
+        if isinstance(pereval, dict):
+            value, pk = pereval['datetime'], pereval['id']
+        else:
+            value, pk = pereval.datetime, pereval.id
+        raw = f'{value.isoformat()}|{pk}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+            value, pk = raw.split('|')
+            return datetime.fromisoformat(value), int(pk)
+        except (ValueError, UnicodeError):
+            raise ValidationError({self.cursor_query_param: 'Некорректный курсор'})
+
+    def page_queryset(self, queryset, request):
+        """Запрос страницы по курсору: на одну запись больше размера страницы."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            value, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(datetime__lt=value) | Q(datetime=value, id__lt=pk))
+        # Лишняя запись показывает, есть ли следующая страница
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, page):
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        """То же, что paginate_queryset, через асинхронный ORM."""
+        return self.set_page([pereval async for pereval in self.page_queryset(queryset, request)])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,320 @@
+"""
+Потоковый разбор JSON перевала с изображениями в base64 (POST /submitData/).
+
+Клиенты ФСТР передают фото строкой base64 в images[].data, поэтому тело
+запроса в основном состоит из изображений. StreamingJSONParser читает тело
+блоками по PEREVAL_UPLOAD_BLOCK_SIZE байт: строки images[].data сразу
+декодируются во временные файлы (TemporaryUploadedFile), а в памяти
+собирается только остальной JSON, где вместо изображения стоит его номер.
+После разбора номера заменяются файлами, и PerevalImageSerializer получает
+их так же, как файлы из multipart. Пиковая память не зависит от размера
+изображений; остальной JSON ограничен DATA_UPLOAD_MAX_MEMORY_SIZE, а число
+изображений, как и файлов в multipart, — DATA_UPLOAD_MAX_NUMBER_FILES.
+
+Строка изображения может начинаться с префикса data:<тип>;base64, и
+содержать переводы строк и экранированные символы JSON (например \\/).
+"""
+import base64
+import binascii
+import json
+import re
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import JSONRenderer
+
+STRUCTURE_RE = re.compile(rb'["{}\[\]:,]')
+STRING_SPECIAL_RE = re.compile(rb'["\\]')
+
+JSON_ESCAPES = {
+    ord('"'): b'"', ord('\\'): b'\\', ord('/'): b'/',
+    ord('b'): b'\b', ord('f'): b'\f', ord('n'): b'\n', ord('r'): b'\r', ord('t'): b'\t',
+}
+# Вариант base64 для URL приводится к обычному, пробельные символы пропускаются
+URLSAFE_TO_STANDARD = bytes.maketrans(b'-_', b'+/')
+WHITESPACE = b' \t\r\n'
+# Максимальная длина префикса data:<тип>;base64,
+MAX_DATA_URI_PREFIX = 256
+
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'jpg', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png', 'image/png'),
+    (b'GIF8', 'gif', 'image/gif'),
+]
+
+
+def image_type(header, content_type=None):
+    """Расширение и MIME-тип изображения по первым байтам; если формат неизвестен — по префиксу data:."""
+    for signature, extension, mime_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension, mime_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp', 'image/webp'
+    return 'bin', content_type or 'application/octet-stream'
+
+
+class Base64File:
+    """Строка base64, декодируемая по частям во временный файл."""
+
+    def __init__(self, index):
+        self.index = index
+        self.head = bytearray()
+        self.text = bytearray()
+        self.content_type = None
+        self.file = None
+        self.header = b''
+        self.size = 0
+        self.padded = False
+
+    def write(self, text):
+        if self.head is not None:
+            self.head += text
+            if not self.strip_prefix():
+                return
+            text, self.head = bytes(self.head), None
+        self.text += text.translate(URLSAFE_TO_STANDARD, WHITESPACE)
+        usable = len(self.text) // 4 * 4
+        if usable:
+            self.decode(bytes(self.text[:usable]))
+            del self.text[:usable]
+
+    def strip_prefix(self, final=False):
+        """Отрезает префикс data:<тип>;base64,; False — для решения нужно больше данных."""
+        if not self.head.startswith(b'data:'):
+            return final or len(self.head) >= 5 or not b'data:'.startswith(self.head)
+        comma = self.head.find(b',')
+        if comma < 0:
+            if final or len(self.head) > MAX_DATA_URI_PREFIX:
+                raise ValueError(f'images[{self.index}].data: неверный префикс data:')
+            return False
+        self.content_type = bytes(self.head[5:comma]).split(b';')[0].decode('ascii', 'replace') or None
+        del self.head[:comma + 1]
+        return True
+
+    def decode(self, text):
+        if self.padded:
+            raise ValueError(f'images[{self.index}].data: данные после окончания base64')
+        try:
+            data = base64.b64decode(text, validate=True)
+        except binascii.Error:
+            raise ValueError(f'images[{self.index}].data: строка не в формате base64')
+        self.padded = text.endswith(b'=')
+        self.size += len(data)
+        if self.size > settings.PEREVAL_UPLOAD_MAX_SIZE:
+            raise ValueError(f'images[{self.index}].data: изображение больше {settings.PEREVAL_UPLOAD_MAX_SIZE} байт')
+        if self.file is None:
+            self.file = TemporaryUploadedFile('image', None, 0, None)
+        if len(self.header) < 12:
+            self.header += data[:12 - len(self.header)]
+        self.file.write(data)
+
+    def finish(self):
+        """Дописывает остаток; возвращает файл или None для пустой строки."""
+        if self.head is not None:
+            self.strip_prefix(final=True)
+            text, self.head = bytes(self.head), None
+            self.text += text.translate(URLSAFE_TO_STANDARD, WHITESPACE)
+        if len(self.text) % 4 == 1:
+            raise ValueError(f'images[{self.index}].data: строка не в формате base64')
+        if self.text:
+            # Допускается base64 без выравнивания знаками =
+            self.decode(bytes(self.text) + b'=' * (-len(self.text) % 4))
+        if self.file is None:
+            return None
+        extension, self.file.content_type = image_type(self.header, self.content_type)
+        self.file.name = f'image.{extension}'
+        self.file.size = self.size
+        self.file.flush()
+        self.file.seek(0)
+        return self.file
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class Frame:
+    """Открытый объект или массив JSON; у объекта — последний ключ и ожидается ли следующий ключ."""
+    __slots__ = ('is_object', 'key', 'expect_key')
+
+    def __init__(self, is_object):
+        self.is_object = is_object
+        self.key = None
+        self.expect_key = is_object
+
+
+class ImageScanner:
+    """
+         Разбирает JSON по частям, выделяя строки images[].data.
+
+         Сканер отслеживает только вложенность, ключи и границы строк; весь
+         JSON, кроме изображений, копируется как есть и после чтения
+         разбирается json.loads, который и проверяет синтаксис.
+     """
+    OUTSIDE, STRING, IMAGE = range(3)
+
+    def __init__(self, max_size=None, max_images=None):
+        self.max_size = max_size
+        self.max_images = max_images
+        self.skeleton = bytearray()
+        self.stack = []
+        self.mode = self.OUTSIDE
+        self.is_key = False
+        self.key = bytearray()
+        self.carry = b''
+        self.escape = False
+        self.image = None
+        self.images = []
+
+    def emit(self, data):
+        self.skeleton += data
+        if self.max_size is not None and len(self.skeleton) > self.max_size:
+            raise ValueError(f'JSON без изображений больше {self.max_size} байт')
+
+    def feed(self, chunk):
+        data, self.carry = self.carry + chunk, b''
+        pos, end = 0, len(data)
+        while pos < end:
+            if self.mode == self.OUTSIDE:
+                match = STRUCTURE_RE.search(data, pos)
+                if match is None:
+                    self.emit(data[pos:])
+                    return
+                self.emit(data[pos:match.start()])
+                self.structure(data[match.start()])
+                pos = match.end()
+                continue
+
+            if self.escape:
+                # Экранированный символ обычной строки в начале блока
+                self.string_part(data[pos:pos + 1])
+                self.escape = False
+                pos += 1
+                continue
+
+            match = STRING_SPECIAL_RE.search(data, pos)
+            if match is None:
+                self.string_part(data[pos:])
+                return
+            self.string_part(data[pos:match.start()])
+            pos = match.start()
+            if data[pos] == ord('"'):
+                self.end_string()
+                pos += 1
+            elif self.mode == self.STRING:
+                self.string_part(data[pos:pos + 2])
+                self.escape = pos + 1 == end
+                pos += 2
+            else:
+                length = 6 if data[pos + 1:pos + 2] == b'u' else 2
+                if pos + length > end:
+                    self.carry = data[pos:]
+                    return
+                self.image.write(unescape(data[pos:pos + length]))
+                pos += length
+
+    def structure(self, char):
+        top = self.stack[-1] if self.stack else None
+        if char == ord('"'):
+            if top is not None and top.is_object and top.expect_key:
+                self.mode, self.is_key = self.STRING, True
+                self.key.clear()
+            elif self.at_image():
+                if self.max_images is not None and len(self.images) >= self.max_images:
+                    raise ValueError(f'Изображений больше {self.max_images}')
+                self.mode = self.IMAGE
+                self.image = Base64File(len(self.images))
+                self.images.append(self.image)
+                return
+            else:
+                self.mode, self.is_key = self.STRING, False
+        elif char in b'{[':
+            self.stack.append(Frame(char == ord('{')))
+        elif char in b'}]':
+            if not self.stack:
+                raise ValueError('Неверный JSON')
+            self.stack.pop()
+        elif top is not None and top.is_object:
+            # ':' — дальше значение, ',' — следующий ключ
+            top.expect_key = char == ord(',')
+        self.emit(bytes([char]))
+
+    def at_image(self):
+        """Начинается ли значение images[].data корневого объекта."""
+        stack = self.stack
+        return (
+            len(stack) == 3
+            and stack[0].is_object and stack[0].key == 'images'
+            and not stack[1].is_object
+            and stack[2].is_object and stack[2].key == 'data'
+        )
+
+    def string_part(self, data):
+        if self.mode == self.IMAGE:
+            self.image.write(data)
+            return
+        self.emit(data)
+        if self.is_key:
+            self.key += data
+
+    def end_string(self):
+        if self.mode == self.IMAGE:
+            # Вместо изображения — его номер, файл подставляется после разбора
+            self.emit(b'"%d"' % self.image.index)
+            self.image = None
+        else:
+            self.emit(b'"')
+            if self.is_key:
+                self.stack[-1].key = json.loads(b'"' + self.key + b'"')
+        self.mode = self.OUTSIDE
+
+    def finish(self):
+        """Разобранный JSON с файлами вместо строк images[].data."""
+        if self.mode != self.OUTSIDE or self.carry:
+            raise ValueError('Неожиданный конец JSON')
+        data = json.loads(self.skeleton)
+        files = [image.finish() for image in self.images]
+        images = data.get('images') if isinstance(data, dict) else None
+        for image in images if isinstance(images, list) else []:
+            if isinstance(image, dict) and isinstance(image.get('data'), str):
+                image['data'] = files[int(image['data'])] or ''
+        return data
+
+    def close(self):
+        for image in self.images:
+            image.close()
+
+
+def unescape(sequence):
+    """Символ экранирования JSON (\\n, \\/, \\uXXXX) внутри строки base64."""
+    if sequence[1] == ord('u'):
+        return chr(int(sequence[2:], 16)).encode()
+    try:
+        return JSON_ESCAPES[sequence[1]]
+    except KeyError:
+        raise ValueError('Неверное экранирование в строке JSON')
+
+
+class StreamingJSONParser(BaseParser):
+    """Парсер JSON, декодирующий изображения images[].data во временные файлы по ходу чтения."""
+    media_type = 'application/json'
+    renderer_class = JSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = (parser_context or {}).get('request')
+        scanner = ImageScanner(settings.DATA_UPLOAD_MAX_MEMORY_SIZE, settings.DATA_UPLOAD_MAX_NUMBER_FILES)
+        try:
+            while chunk := stream.read(settings.PEREVAL_UPLOAD_BLOCK_SIZE):
+                scanner.feed(chunk)
+            data = scanner.finish()
+        except ValueError as e:
+            scanner.close()
+            raise ParseError(f'Ошибка разбора JSON: {e}')
+
+        if request is not None:
+            # Как у multipart: Django закроет и удалит временные файлы после ответа
+            request._request._files = MultiValueDict({'images': [image.file for image in scanner.images if image.file]})
+        return data
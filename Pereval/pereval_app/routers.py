@@ -0,0 +1,55 @@
+"""
+Чтение перевалов с реплики БД.
+
+Если задана настройка PEREVAL_DB_REPLICA (псевдоним из DATABASES), ReplicaRouter
+отправляет на реплику чтение в представлениях только для чтения из READ_VIEWS:
+перевал, список, поиск и выгрузка. Всё остальное, включая любые записи, идёт
+в основную БД default. Вне HTTP-запросов (команды manage.py, тесты) реплика
+не используется.
+
+Реплика отстаёт от основной БД, поэтому после первой записи чтение до конца
+запроса идёт с основной БД, а ReplicaMiddleware ставит клиенту cookie, с
+которой его запросы ещё PEREVAL_DB_REPLICA_LAG секунд читают основную БД:
+только что отправленный перевал сразу доступен по GET.
+"""
+from contextvars import ContextVar
+
+from django.conf import settings
+
+READ_VIEWS = frozenset({'submit_data_detail', 'submit_data_list', 'submit_data_search', 'submit_data_export'})
+PRIMARY_COOKIE = 'pereval_primary'
+
+
+class RoutingState:
+    """Куда направлять чтение в текущем HTTP-запросе."""
+
+    def __init__(self, pinned=False):
+        self.read_only = False
+        self.pinned = pinned
+        self.wrote = False
+
+
+current_state = ContextVar('pereval_routing_state', default=None)
+
+
+def replica_alias():
+    """Псевдоним реплики, с которой читает текущий запрос, или None, если чтение идёт с основной БД."""
+    state = current_state.get()
+    if settings.PEREVAL_DB_REPLICA and state is not None and state.read_only and not state.pinned:
+        return settings.PEREVAL_DB_REPLICA
+    return None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        state = current_state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На реплике те же записи, что и в основной БД
+        return True
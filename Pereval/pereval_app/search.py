@@ -0,0 +1,97 @@
+"""
+Полнотекстовый поиск перевалов по title, other_titles и beauty_title.
+
+PostgreSQL: столбец search_vector (tsvector с русской морфологией) под GIN индексом.
+SQLite: теневая таблица FTS5 pereval_app_perevaladded_fts, морфологии нет,
+поэтому каждое слово запроса ищется как префикс.
+Оба варианта создаются миграцией 0005_pereval_search и обновляются самой БД при сохранении.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q
+
+from .models import PerevalAdded
+
+POSTGRESQL_SQL = """
+    SELECT id, ts_rank(search_vector, query) AS rank
+    FROM pereval_app_perevaladded, websearch_to_tsquery('russian', %s) AS query
+    WHERE search_vector @@ query
+    ORDER BY rank DESC, id
+    LIMIT %s OFFSET %s
+"""
+
+SQLITE_SQL = """
+    SELECT rowid, bm25(pereval_app_perevaladded_fts, 10.0, 5.0, 1.0) AS rank
+    FROM pereval_app_perevaladded_fts
+    WHERE pereval_app_perevaladded_fts MATCH %s
+    ORDER BY rank, rowid
+    LIMIT %s OFFSET %s
+"""
+
+WORD_RE = re.compile(r'\w+')
+
+# Триггеры синхронизации FTS5 (те же, что в миграции 0005_pereval_search).
+# SQLite удаляет триггеры при пересоздании таблицы в миграциях, поэтому после
+# каждого migrate они восстанавливаются в ensure_sqlite_triggers().
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS pereval_app_perevaladded_fts_insert AFTER INSERT ON pereval_app_perevaladded BEGIN
+        INSERT INTO pereval_app_perevaladded_fts (rowid, title, other_titles, beauty_title)
+        VALUES (new.id, new.title, new.other_titles, new.beauty_title);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pereval_app_perevaladded_fts_delete AFTER DELETE ON pereval_app_perevaladded BEGIN
+        INSERT INTO pereval_app_perevaladded_fts (pereval_app_perevaladded_fts, rowid, title, other_titles, beauty_title)
+        VALUES ('delete', old.id, old.title, old.other_titles, old.beauty_title);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pereval_app_perevaladded_fts_update AFTER UPDATE ON pereval_app_perevaladded BEGIN
+        INSERT INTO pereval_app_perevaladded_fts (pereval_app_perevaladded_fts, rowid, title, other_titles, beauty_title)
+        VALUES ('delete', old.id, old.title, old.other_titles, old.beauty_title);
+        INSERT INTO pereval_app_perevaladded_fts (rowid, title, other_titles, beauty_title)
+        VALUES (new.id, new.title, new.other_titles, new.beauty_title);
+    END
+    """,
+]
+
+
+def ensure_sqlite_triggers(db_connection):
+    """Восстанавливает триггеры FTS5, если таблица поиска уже создана миграцией."""
+    if db_connection.vendor != 'sqlite':
+        return
+    if 'pereval_app_perevaladded_fts' not in db_connection.introspection.table_names():
+        return
+    with db_connection.cursor() as cursor:
+        for sql in SQLITE_TRIGGERS:
+            cursor.execute(sql)
+
+
+def sqlite_match_query(query):
+    """Запрос FTS5 из произвольной строки: все слова как префиксы, без операторов FTS5."""
+    return ' '.join(f'"{word}"*' for word in WORD_RE.findall(query))
+
+
+def search_ids(query, limit, offset=0):
+    """Id перевалов, найденных по запросу, от наиболее к наименее релевантным."""
+    # Та же БД, с которой читаются сами перевалы (routers.py)
+    connection = connections[PerevalAdded.objects.db]
+    if connection.vendor == 'postgresql':
+        sql, params = POSTGRESQL_SQL, [query, limit, offset]
+    elif connection.vendor == 'sqlite':
+        match = sqlite_match_query(query)
+        if not match:
+            return []
+        sql, params = SQLITE_SQL, [match, limit, offset]
+    else:
+        perevals = PerevalAdded.objects.filter(
+            Q(title__icontains=query) | Q(other_titles__icontains=query) | Q(beauty_title__icontains=query)
+        ).order_by('id')
+        return list(perevals.values_list('id', flat=True)[offset:offset + limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
@@ -1,5 +1,13 @@
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import PerevalAdded, User, Coords, PerevalImage
+from . import blobs, stats, tiles
+from .signals import images_deleted_in_bulk
+from .storage import blob_sha256
+from .models import PerevalAdded, User, Coords, PerevalImage, ImageJob, UploadSession, ImageBlob
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -16,6 +24,9 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = '__all__'
+        # Повторная отправка от того же пользователя не должна падать на уникальности email,
+        # пользователь находится по email при сохранении
+        extra_kwargs = {'email': {'validators': []}}
 
 
 class CoordsSerializer(serializers.ModelSerializer):
@@ -31,7 +42,7 @@ class CoordsSerializer(serializers.ModelSerializer):
      """
     class Meta:
         model = Coords
-        fields = '__all__'
+        exclude = ['grid_cell']
 
 
 class PerevalImageSerializer(serializers.ModelSerializer):
@@ -40,13 +51,92 @@ class PerevalImageSerializer(serializers.ModelSerializer):
 
          Включает:
          - строку изображения (data),
-         - подпись к изображению (title).
+         - хеш SHA-256 содержимого (sha256) — вместо data можно передать хеш
+           уже загруженного изображения, тогда файл повторно не передаётся;
+         - подпись к изображению (title),
+         - ссылки на уменьшенные копии (variants) — появляются после фоновой обработки.
 
          Используется для добавления и отображения фото перевала.
      """
+    data = serializers.ImageField(required=False)
+    sha256 = serializers.CharField(required=False, min_length=64, max_length=64)
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = PerevalImage
-        fields = ['data', 'title']
+        fields = ['data', 'sha256', 'title', 'variants']
+
+    def validate(self, attrs):
+        sha256 = attrs.pop('sha256', None)
+        if 'data' in attrs:
+            return attrs
+        if sha256 is None:
+            raise serializers.ValidationError('Нужно передать изображение (data) или хеш загруженного (sha256)')
+
+        blob = ImageBlob.objects.filter(sha256=sha256.lower()).first()
+        if blob is None:
+            raise serializers.ValidationError({'sha256': 'Изображение с таким хешем не загружено'})
+        # Ссылка на уже сохранённый файл: ничего не пишется в хранилище
+        attrs['data'] = blob.name
+        return attrs
+
+    def get_variants(self, obj):
+        variants = {}
+        for variant in obj.variants.all():
+            variants.setdefault(variant.name, {})[variant.format] = variant.file.url
+        return variants
+
+
+class PerevalAddedListSerializer(serializers.ListSerializer):
+    """
+         Сериализатор пакета перевалов.
+
+         Сохраняет уже провалидированные перевалы пачкой в одной транзакции:
+         - пользователи ищутся по email одним запросом, недостающие создаются bulk_create
+           (email, созданный параллельным запросом, не приводит к ошибке);
+         - координаты, перевалы и изображения создаются через bulk_create.
+
+         Используется при пакетной отправке перевалов (POST /submitData/batch/).
+     """
+    def create(self, validated_data):
+        with transaction.atomic():
+            emails = {item['user']['email'] for item in validated_data}
+            users = {user.email: user for user in User.objects.filter(email__in=emails)}
+
+            new_users = {}
+            for item in validated_data:
+                email = item['user']['email']
+                if email not in users and email not in new_users:
+                    new_users[email] = User(**item['user'])
+            if new_users:
+                # Пользователя с тем же email мог параллельно создать другой запрос:
+                # конфликты пропускаются, и новые пользователи выбираются заново
+                User.objects.bulk_create(new_users.values(), ignore_conflicts=True)
+                users.update({user.email: user for user in User.objects.filter(email__in=new_users)})
+
+            coords = [Coords(**item['coords']) for item in validated_data]
+            for item_coords in coords:
+                item_coords.update_grid_cell()
+            Coords.objects.bulk_create(coords)
+
+            perevals = PerevalAdded.objects.bulk_create([
+                PerevalAdded(
+                    user=users[item['user']['email']],
+                    coords=item_coords,
+                    **{key: value for key, value in item.items() if key not in ('user', 'coords', 'attached_images')}
+                )
+                for item, item_coords in zip(validated_data, coords)
+            ])
+
+            create_images([
+                PerevalImage(pereval=pereval, **image_data)
+                for item, pereval in zip(validated_data, perevals)
+                for image_data in item.get('attached_images', [])
+            ])
+            stats.record_created(perevals)
+            tiles.invalidate_points([(item.latitude, item.longitude) for item in coords])
+
+        return perevals
 
 
 class PerevalAddedSerializer(serializers.ModelSerializer):
@@ -63,68 +153,267 @@ class PerevalAddedSerializer(serializers.ModelSerializer):
      """
     user = UserSerializer()
     coords = CoordsSerializer()
-    images = PerevalImageSerializer(many=True)  # Добавляем вложенные изображения
+    images = PerevalImageSerializer(many=True, source='attached_images')  # Добавляем вложенные изображения
 
     class Meta:
         model = PerevalAdded
         fields = '__all__'
+        read_only_fields = ['claimed_by', 'claimed_at']
+        list_serializer_class = PerevalAddedListSerializer
 
     def create(self, validated_data):
         user_data = validated_data.pop('user')
         coords_data = validated_data.pop('coords')
-        images_data = validated_data.pop('images', [])
+        images_data = validated_data.pop('attached_images', [])
 
-        # Создаем пользователя
-        user, _ = User.objects.get_or_create(**user_data)
+        # Перевал и счётчики статистики (сигнал post_save) сохраняются в одной транзакции
+        with transaction.atomic():
+            # Создаем пользователя
+            user, _ = User.objects.get_or_create(email=user_data.pop('email'), defaults=user_data)
 
-        # Создаем координаты
-        coords, _ = Coords.objects.get_or_create(**coords_data)
+            # Создаем координаты: у каждого перевала свои, даже если точка совпадает с другим перевалом
+            coords = Coords.objects.create(**coords_data)
 
-        # Создаем объект PerevalAdded
-        pereval = PerevalAdded.objects.create(user=user, coords=coords, **validated_data)
+            # Создаем объект PerevalAdded
+            pereval = PerevalAdded.objects.create(user=user, coords=coords, **validated_data)
 
-        # Добавляем изображения
-        for image_data in images_data:
-            PerevalImage.objects.create(pereval=pereval, **image_data)
+            # Добавляем изображения пачкой: перевал только что создан, отмечать его изменённым
+            # на каждое изображение (сигналы PerevalImage) не нужно
+            create_images([PerevalImage(pereval=pereval, **image_data) for image_data in images_data])
 
         return pereval
 
 
     def update(self, instance, validated_data):
-        # Обновляем данные Pereval
-        instance.status = validated_data.get('status', instance.status)
-        instance.beauty_title = validated_data.get('beauty_title', instance.beauty_title)
-        instance.title = validated_data.get('title', instance.title)
-        instance.other_titles = validated_data.get('other_titles', instance.other_titles)
-        instance.connect = validated_data.get('connect', instance.connect)
-        instance.level_spring = validated_data.get('level_spring', instance.level_spring)
-        instance.level_summer = validated_data.get('level_summer', instance.level_summer)
-        instance.level_autumn = validated_data.get('level_autumn', instance.level_autumn)
-        instance.level_winter = validated_data.get('level_winter', instance.level_winter)
-        instance.save()
-
-        # Обновляем данные Coords
-        coords_data = validated_data.get('coords', {})
-        coords = instance.coords
-        coords.latitude = coords_data.get('latitude', coords.latitude)
-        coords.longitude = coords_data.get('longitude', coords.longitude)
-        coords.height = coords_data.get('height', coords.height)
-        coords.save()
-
-        # Обновляем данные User
-        user_data = validated_data.get('user', {})
-        user = instance.user
-        user.email = user_data.get('email', user.email)
-        user.last_name = user_data.get('last_name', user.last_name)
-        user.first_name = user_data.get('first_name', user.first_name)
-        user.middle_name = user_data.get('middle_name', user.middle_name)
-        user.phone = user_data.get('phone', user.phone)
-        user.save()
-
-        # Обновляем изображения (если нужно)
-        images_data = validated_data.get('attached_images', [])
-        instance.attached_images.all().delete()  # Удаляем старые изображения
+        """
+             Записывает только изменившиеся поля перевала, координат и пользователя.
+
+             Изображения сравниваются по содержимому (sha256): совпавшие остаются
+             со своими строками, файлами и копиями, у них меняется только подпись,
+             недостающие создаются пачкой, лишние удаляются. Если изображения не
+             переданы, они не меняются.
+         """
+        coords_data = validated_data.pop('coords', None)
+        user_data = validated_data.pop('user', None)
+        images_data = validated_data.pop('attached_images', None)
+
+        with transaction.atomic():
+            if coords_data is not None:
+                save_changed(instance.coords, coords_data)
+            if user_data is not None:
+                save_changed(instance.user, user_data)
+
+            images_changed = images_data is not None and self.update_images(instance, images_data)
+            changed = set_changed(instance, validated_data)
+            if changed or images_changed:
+                instance.save(update_fields=[*changed, 'updated_at'])
+
+        return instance
+
+    def update_images(self, instance, images_data):
+        """Приводит изображения перевала к переданному списку; возвращает True, если что-то изменилось."""
+        existing = {}
+        for image in instance.attached_images.order_by('id'):
+            existing.setdefault(image_key(image.data), []).append(image)
+
+        retitled, created = [], []
         for image_data in images_data:
-            PerevalImage.objects.create(pereval=instance, **image_data)
+            same = existing.get(image_key(image_data['data']))
+            if same:
+                image = same.pop(0)
+                if image.title != image_data.get('title', image.title):
+                    image.title = image_data['title']
+                    image.updated_at = timezone.now()
+                    retitled.append(image)
+            else:
+                created.append(PerevalImage(pereval=instance, **image_data))
+
+        removed = [image for images in existing.values() for image in images]
+        if removed:
+            # Без сигналов на каждое изображение: ссылки на файлы снимаются одним
+            # запросом, а кэш и updated_at перевала обновляет instance.save в update()
+            with images_deleted_in_bulk():
+                PerevalImage.objects.filter(id__in=[image.id for image in removed]).delete()
+            blobs.detach([image.data.name for image in removed])
+        if retitled:
+            PerevalImage.objects.bulk_update(retitled, ['title', 'updated_at'])
+        if created:
+            create_images(created)
+        return bool(removed or retitled or created)
+
+
+def create_images(images):
+    """
+         Сохраняет изображения через bulk_create без сигналов на каждое: ссылки на
+         файлы (blobs.attach) и задания обработки копий создаются пачкой.
+     """
+    if not images:
+        return []
+    images = PerevalImage.objects.bulk_create(images)
+    blobs.attach([image.data.name for image in images])
+    ImageJob.objects.bulk_create([ImageJob(image=image) for image in images])
+    return images
+
+
+def set_changed(instance, data):
+    """Присваивает отличающиеся значения и возвращает имена изменённых полей."""
+    changed = []
+    for name, value in data.items():
+        if getattr(instance, name) != value:
+            setattr(instance, name, value)
+            changed.append(name)
+    return changed
+
+
+def save_changed(instance, data):
+    changed = set_changed(instance, data)
+    if changed:
+        instance.save(update_fields=[*changed, 'updated_at'])
+
+
+def image_key(data):
+    """Ключ для сравнения изображений: sha256 содержимого или имя файла, сохранённого не по хешу."""
+    if hasattr(data, 'chunks') and not getattr(data, '_committed', False):
+        digest = hashlib.sha256()
+        for chunk in data.chunks():
+            digest.update(chunk)
+        data.seek(0)
+        return digest.hexdigest()
+    name = getattr(data, 'name', data)
+    return blob_sha256(name) or name
+
+
+class NearbyQuerySerializer(serializers.Serializer):
+    """
+         Параметры поиска перевалов рядом с точкой.
+
+         Включает:
+         - широту и долготу точки (lat, lon),
+         - радиус поиска в километрах (radius_km),
+         - максимальное количество перевалов в ответе (limit).
+     """
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    radius_km = serializers.FloatField(min_value=0, max_value=1000, default=10)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=100)
+
+
+class BboxQuerySerializer(serializers.Serializer):
+    """
+         Параметры поиска перевалов в прямоугольной области.
+
+         Включает:
+         - границы области по широте (lat_min, lat_max) и долготе (lon_min, lon_max),
+           при lon_min > lon_max область проходит через 180-й меридиан;
+         - максимальное количество перевалов в ответе (limit).
+     """
+    lat_min = serializers.FloatField(min_value=-90, max_value=90)
+    lat_max = serializers.FloatField(min_value=-90, max_value=90)
+    lon_min = serializers.FloatField(min_value=-180, max_value=180)
+    lon_max = serializers.FloatField(min_value=-180, max_value=180)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=100)
+
+    def validate(self, attrs):
+        if attrs['lat_min'] > attrs['lat_max']:
+            raise serializers.ValidationError('lat_min не может быть больше lat_max')
+        return attrs
+
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    """
+         Параметры полнотекстового поиска перевалов.
+
+         Включает:
+         - строку запроса (q),
+         - номер страницы (page) и размер страницы (page_size).
+     """
+    q = serializers.CharField(max_length=256)
+    page = serializers.IntegerField(min_value=1, default=1)
+    page_size = serializers.IntegerField(min_value=1, required=False)
+
+
+class SyncQuerySerializer(serializers.Serializer):
+    """
+         Параметры ленты синхронизации.
+
+         Включает:
+         - email пользователя (user__email),
+         - токен из предыдущего ответа (since), без него лента начинается с начала,
+         - максимальное число записей в ответе (limit).
+     """
+    user__email = serializers.EmailField()
+    since = serializers.CharField(required=False, allow_blank=True)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+
+class ModerationClaimSerializer(serializers.Serializer):
+    """
+         Параметры взятия перевалов на модерацию.
+
+         Включает:
+         - имя модератора (moderator),
+         - сколько перевалов взять (limit).
+     """
+    moderator = serializers.CharField(max_length=256)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+
+class ModerationResolveSerializer(serializers.Serializer):
+    """
+         Решения модератора по взятым перевалам.
+
+         Включает:
+         - имя модератора (moderator),
+         - id принятых (accept) и отклонённых (reject) перевалов.
+     """
+    moderator = serializers.CharField(max_length=256)
+    accept = serializers.ListField(child=serializers.IntegerField(), default=list)
+    reject = serializers.ListField(child=serializers.IntegerField(), default=list)
+
+    def validate(self, data):
+        if not data['accept'] and not data['reject']:
+            raise serializers.ValidationError('Передайте id перевалов в accept или reject')
+        if set(data['accept']) & set(data['reject']):
+            raise serializers.ValidationError('Перевал не может быть одновременно принят и отклонён')
+        return data
+
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """
+         Сериализатор сессии загрузки изображения частями.
+
+         Включает:
+         - идентификатор сессии (id),
+         - имя и размер загружаемого файла (filename, size),
+         - количество уже полученных байт (received) — смещение следующей части.
+     """
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'size', 'received']
+        read_only_fields = ['id', 'received']
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.PEREVAL_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Размер файла должен быть от 1 до {settings.PEREVAL_UPLOAD_MAX_SIZE} байт'
+            )
+        return value
+
+
+class UploadFinalizeSerializer(serializers.Serializer):
+    """
+         Параметры завершения загрузки.
+
+         Включает:
+         - перевал, к которому прикрепляется изображение (pereval),
+         - подпись к изображению (title).
+     """
+    pereval = serializers.PrimaryKeyRelatedField(queryset=PerevalAdded.objects.all())
+    title = serializers.CharField(max_length=255)
 
-        return instance
\ No newline at end of file
+    def validate_pereval(self, value):
+        if value.status != PerevalAdded.NEW:
+            raise serializers.ValidationError("Изображения можно добавлять только к перевалу в статусе 'new'")
+        return value
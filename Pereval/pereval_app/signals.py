@@ -0,0 +1,160 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import areas, blobs, stats, tiles
+from .caching import invalidate_details
+from .metrics import install_query_recorder
+from .models import Coords, ImageJob, PerevalAdded, PerevalArea, PerevalImage, PerevalTombstone, User
+from .search import ensure_sqlite_triggers
+
+# Пока изображения удаляются пачкой (images_deleted_in_bulk), сигналы на каждое
+# изображение пропускаются: счётчики ссылок и перевал обновляет вызывающий код
+deleting_images_in_bulk = ContextVar('pereval_deleting_images_in_bulk', default=False)
+
+
+@contextmanager
+def images_deleted_in_bulk():
+    token = deleting_images_in_bulk.set(True)
+    try:
+        yield
+    finally:
+        deleting_images_in_bulk.reset(token)
+
+
+def related_changed(perevals):
+    """
+         Отмечает перевалы изменёнными после правки связанных данных:
+         сбрасывает кэш ответа и сдвигает updated_at для ленты синхронизации.
+     """
+    ids = list(perevals.values_list('id', flat=True))
+    if ids:
+        invalidate_details(ids)
+        PerevalAdded.objects.filter(id__in=ids).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=PerevalAdded)
+def pereval_changed(sender, instance, **kwargs):
+    invalidate_details([instance.pk])
+
+
+@receiver(post_delete, sender=PerevalAdded)
+def pereval_deleted(sender, instance, **kwargs):
+    PerevalTombstone.objects.create(pereval_id=instance.pk, user_id=instance.user_id)
+    stats.record_deleted([instance])
+
+
+@receiver(pre_save, sender=PerevalAdded)
+def remember_stat_values(sender, instance, update_fields=None, **kwargs):
+    # Прежние значения нужны, чтобы перенести перевал между счётчиками статистики
+    instance._stat_values = stats.saved_values(instance, update_fields)
+
+
+@receiver(post_save, sender=PerevalAdded)
+def update_stats(sender, instance, created, **kwargs):
+    if created:
+        stats.record_created([instance])
+    else:
+        stats.record_changed(instance, instance.__dict__.pop('_stat_values', {}))
+
+
+@receiver([post_save, post_delete], sender=PerevalImage)
+def image_changed(sender, instance, **kwargs):
+    if deleting_images_in_bulk.get():
+        return
+    related_changed(PerevalAdded.objects.filter(id=instance.pereval_id))
+
+
+@receiver(post_save, sender=PerevalImage)
+def image_created(sender, instance, created, **kwargs):
+    # Копии изображения строит фоновый обработчик (manage.py process_images)
+    if created:
+        blobs.attach([instance.data.name])
+        ImageJob.objects.create(image=instance)
+
+
+@receiver(post_delete, sender=PerevalImage)
+def image_deleted(sender, instance, **kwargs):
+    if deleting_images_in_bulk.get():
+        return
+    blobs.detach([instance.data.name])
+
+
+@receiver([post_save, post_delete], sender=Coords)
+def coords_changed(sender, instance, created=False, **kwargs):
+    # На только что созданные координаты ещё не ссылается ни один перевал
+    if not created:
+        related_changed(PerevalAdded.objects.filter(coords_id=instance.pk))
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        related_changed(PerevalAdded.objects.filter(user_id=instance.pk))
+
+
+@receiver([post_save, post_delete], sender=PerevalAdded)
+def pereval_tiles_changed(sender, instance, **kwargs):
+    try:
+        coords = instance.coords
+    except Coords.DoesNotExist:
+        # Координаты удаляются вместе с перевалом, их тайлы сбрасывает coords_tiles_changed
+        return
+    tiles.invalidate_points([(coords.latitude, coords.longitude)])
+
+
+@receiver(pre_save, sender=Coords)
+def remember_coords_position(sender, instance, update_fields=None, **kwargs):
+    instance._old_position = None
+    moved = update_fields is None or {'latitude', 'longitude'} & set(update_fields)
+    if not instance._state.adding and moved:
+        instance._old_position = (
+            Coords.objects.filter(pk=instance.pk).values_list('latitude', 'longitude').first()
+        )
+
+
+@receiver([post_save, post_delete], sender=Coords)
+def coords_tiles_changed(sender, instance, created=False, **kwargs):
+    # Новые координаты попадают на карту вместе с перевалом (pereval_tiles_changed)
+    if created:
+        return
+    points = [(instance.latitude, instance.longitude)]
+    old_position = instance.__dict__.pop('_old_position', None)
+    if old_position is not None:
+        points.append(old_position)
+    tiles.invalidate_points(points)
+
+
+@receiver(pre_save, sender=PerevalArea)
+def area_parent_changed(sender, instance, **kwargs):
+    instance._moved = False
+    if instance._state.adding:
+        return
+    old_parent = PerevalArea.objects.filter(pk=instance.pk).values_list('id_parent', flat=True).first()
+    if old_parent is not None and old_parent != instance.id_parent:
+        areas.check_parent(instance, instance.id_parent)
+        instance._moved = True
+
+
+@receiver(post_save, sender=PerevalArea)
+def update_area_closure(sender, instance, created, **kwargs):
+    if created:
+        areas.record_created([instance])
+    elif instance.__dict__.pop('_moved', False):
+        areas.move(instance)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == 'pereval_app':
+        ensure_sqlite_triggers(connections[using])
+
+
+@receiver(connection_created)
+def record_queries(sender, connection, **kwargs):
+    install_query_recorder(connection)
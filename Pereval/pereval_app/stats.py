@@ -0,0 +1,132 @@
+"""
+Сводная статистика перевалов: количество по статусу, уровням сложности по
+сезонам, типу местности (beauty_title) и месяцу отправки.
+
+Счётчики хранятся в PerevalStat и меняются на разницу в той же транзакции,
+что и перевалы: сигналами при save() и delete(), явно — при bulk_create и
+смене статуса через update() в moderation.py. GET /api/stats/ читает только
+эту таблицу, её размер зависит от числа разных значений, а не перевалов.
+Если счётчики разошлись с данными (например, после правки БД вручную), их
+пересчитывает manage.py rebuild_stats.
+"""
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, Count, F, Q, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import PerevalAdded, PerevalStat
+
+FIELDS = ('status', 'level_spring', 'level_summer', 'level_autumn', 'level_winter', 'beauty_title')
+MONTH = 'month'
+DIMENSIONS = (*FIELDS, MONTH)
+
+
+def month(value):
+    return timezone.localtime(value).strftime('%Y-%m')
+
+
+def dimension_values(pereval):
+    """Пары (поле, значение), по которым перевал входит в статистику."""
+    values = [(field, getattr(pereval, field)) for field in FIELDS]
+    values.append((MONTH, month(pereval.datetime)))
+    return values
+
+
+def apply(deltas):
+    """Прибавляет к счётчикам разницы {(поле, значение): разница} двумя запросами."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    PerevalStat.objects.bulk_create(
+        [PerevalStat(dimension=dimension, value=value) for dimension, value in deltas], ignore_conflicts=True
+    )
+    condition = Q()
+    whens = []
+    for (dimension, value), delta in deltas.items():
+        condition |= Q(dimension=dimension, value=value)
+        whens.append(When(dimension=dimension, value=value, then=Value(delta)))
+    PerevalStat.objects.filter(condition).update(
+        count=F('count') + Case(*whens, default=Value(0), output_field=BigIntegerField())
+    )
+
+
+def count_perevals(perevals, sign):
+    deltas = {}
+    for pereval in perevals:
+        for key in dimension_values(pereval):
+            deltas[key] = deltas.get(key, 0) + sign
+    apply(deltas)
+
+
+def record_created(perevals):
+    count_perevals(perevals, 1)
+
+
+def record_deleted(perevals):
+    count_perevals(perevals, -1)
+
+
+def saved_values(pereval, update_fields=None):
+    """Значения полей статистики в БД до сохранения перевала; {} для нового или если поля не сохраняются."""
+    if pereval._state.adding:
+        return {}
+    fields = [field for field in FIELDS if update_fields is None or field in update_fields]
+    if not fields:
+        return {}
+    return PerevalAdded.objects.filter(pk=pereval.pk).values(*fields).first() or {}
+
+
+def record_changed(pereval, old_values):
+    deltas = {}
+    for field, old in old_values.items():
+        new = getattr(pereval, field)
+        if new != old:
+            deltas[field, old] = deltas.get((field, old), 0) - 1
+            deltas[field, new] = deltas.get((field, new), 0) + 1
+    apply(deltas)
+
+
+def record_status_change(count, old_status, new_status):
+    """Перевод count перевалов из old_status в new_status через update()."""
+    if old_status != new_status:
+        apply({('status', old_status): -count, ('status', new_status): count})
+
+
+def summary():
+    """Статистика для GET /api/stats/: {поле: {значение: количество}} и общее количество."""
+    result = {dimension: {} for dimension in DIMENSIONS}
+    rows = PerevalStat.objects.filter(count__gt=0).order_by('dimension', 'value')
+    for dimension, value, count in rows.values_list('dimension', 'value', 'count'):
+        if dimension in result:
+            result[dimension][value] = count
+    return {'total': sum(result['status'].values()), **result}
+
+
+def rebuild():
+    """
+         Пересчитывает счётчики по таблице перевалов.
+
+         Строки счётчиков блокируются на время пересчёта: параллельные изменения
+         перевалов ждут его окончания и затем прибавляют свои разницы к уже
+         пересчитанным значениям.
+     """
+    with transaction.atomic():
+        list(PerevalStat.objects.select_for_update().values_list('id', flat=True))
+        counts = {}
+        for field in FIELDS:
+            for value, count in PerevalAdded.objects.order_by().values_list(field).annotate(count=Count('id')):
+                counts[field, value] = count
+        months = PerevalAdded.objects.order_by().annotate(month=TruncMonth('datetime')).values_list('month')
+        for value, count in months.annotate(count=Count('id')):
+            counts[MONTH, month(value)] = counts.get((MONTH, month(value)), 0) + count
+
+        PerevalStat.objects.bulk_create(
+            [PerevalStat(dimension=dimension, value=value, count=count) for (dimension, value), count in counts.items()],
+            update_conflicts=True, unique_fields=['dimension', 'value'], update_fields=['count']
+        )
+        stale = [
+            pk for pk, dimension, value in PerevalStat.objects.values_list('id', 'dimension', 'value')
+            if (dimension, value) not in counts
+        ]
+        PerevalStat.objects.filter(id__in=stale).update(count=0)
+    return counts
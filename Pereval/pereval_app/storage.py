@@ -0,0 +1,97 @@
+"""
+Хранение изображений по хешу содержимого.
+
+Файл сохраняется под именем <каталог>/<первые 2 символа sha256>/<sha256>.<расширение>,
+поэтому одинаковые изображения хранятся в одном файле. Количество ссылок на файл
+ведётся в ImageBlob (см. blobs.py), неиспользуемые файлы удаляет manage.py gc_blobs.
+"""
+import contextlib
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+BLOB_NAME_RE = re.compile(r'^(?P<directory>.+)/[0-9a-f]{2}/(?P<sha256>[0-9a-f]{64})(?P<extension>\.\w+)?$')
+
+
+def blob_name(sha256, name):
+    """Имя файла по хешу; каталог и расширение берутся из исходного имени."""
+    directory = os.path.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    return f'{directory}/{sha256[:2]}/{sha256}{extension}'
+
+
+def blob_sha256(name):
+    """Хеш из имени файла или None, если файл сохранён не по хешу."""
+    match = BLOB_NAME_RE.match(name or '')
+    return match['sha256'] if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        name = blob_name(digest.hexdigest(), name)
+        # Такое содержимое уже сохранено — повторно не пишем, но файл защищается от gc_blobs;
+        # если gc_blobs успел его удалить, файл записывается заново
+        if self.exists(name):
+            from .blobs import touch  # blobs импортирует этот модуль
+
+            touch(name)
+            if self.exists(name):
+                return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # Имя задаёт содержимое: параллельная запись того же изображения идёт под тем же именем,
+        # а не под <sha256>_<суффикс>, который выпал бы из подсчёта ссылок
+        return name
+
+    def _save(self, name, content):
+        """Пишет файл во временный в том же каталоге и переименовывает: файл под именем всегда целый."""
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        if hasattr(content, 'temporary_file_path'):
+            # Загрузка уже лежит во временном файле — переносим без копирования, если тот же диск
+            try:
+                os.replace(content.temporary_file_path(), full_path)
+            except OSError:
+                pass
+            else:
+                self.set_permissions(full_path)
+                return name
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            self.set_permissions(temp_path)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def set_permissions(self, path):
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+
+
+image_storage = ContentAddressedStorage()
+
+
+def get_image_storage():
+    return image_storage
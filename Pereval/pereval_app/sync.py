@@ -0,0 +1,92 @@
+"""
+Лента изменений перевалов пользователя для офлайн-клиентов.
+
+Клиент передаёт токен из предыдущего ответа и получает только перевалы,
+изменённые после него, и id удалённых перевалов. Токен — непрозрачная строка
+с позициями (updated_at, id) в перевалах и (deleted_at, id) в отметках об удалении.
+
+Отдаются только изменения старше PEREVAL_SYNC_SETTLE_SECONDS: транзакции,
+начатые раньше, к этому моменту уже зафиксированы, и запись с меньшим
+updated_at не появится после того, как клиент продвинул токен дальше неё.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import PerevalAdded, PerevalTombstone
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def encode_token(position):
+    """Токен из позиций ленты {'changed': (updated_at, id), 'deleted': (deleted_at, id)}."""
+    data = {
+        key: None if value is None else [value[0].isoformat(), value[1]]
+        for key, value in position.items()
+    }
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+def decode_token(token):
+    """Позиции ленты из токена; пустой токен — синхронизация с начала."""
+    if not token:
+        return {'changed': None, 'deleted': None}
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return {
+            key: None if position[key] is None else (datetime.fromisoformat(position[key][0]), int(position[key][1]))
+            for key in ('changed', 'deleted')
+        }
+    except (ValueError, KeyError, TypeError, IndexError):
+        raise InvalidToken('Некорректный токен синхронизации')
+
+
+def after(queryset, field, position):
+    """Записи строго после позиции (значение поля, id)."""
+    if position is None:
+        return queryset
+    value, pk = position
+    return queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk}))
+
+
+def build_feed(user, token, limit):
+    """
+         Изменения перевалов пользователя после токена.
+
+         Возвращает изменённые перевалы, id удалённых, новый токен
+         и признак has_more — есть ли ещё изменения сверх limit.
+     """
+    position = decode_token(token)
+    horizon = timezone.now() - timedelta(seconds=settings.PEREVAL_SYNC_SETTLE_SECONDS)
+
+    perevals = after(
+        PerevalAdded.objects.with_related().filter(user=user, updated_at__lte=horizon),
+        'updated_at', position['changed']
+    ).order_by('updated_at', 'id')
+    changed = list(perevals[:limit + 1])
+
+    tombstones = after(
+        PerevalTombstone.objects.filter(user_id=user.id, deleted_at__lte=horizon),
+        'deleted_at', position['deleted']
+    ).order_by('deleted_at', 'id')
+    deleted = list(tombstones[:limit + 1])
+
+    has_more = len(changed) > limit or len(deleted) > limit
+    changed, deleted = changed[:limit], deleted[:limit]
+
+    next_position = {
+        'changed': (changed[-1].updated_at, changed[-1].id) if changed else position['changed'],
+        'deleted': (deleted[-1].deleted_at, deleted[-1].id) if deleted else position['deleted'],
+    }
+    return {
+        'changed': changed,
+        'deleted': [tombstone.pereval_id for tombstone in deleted],
+        'token': encode_token(next_position),
+        'has_more': has_more,
+    }
@@ -1,8 +1,38 @@
-from django.test import TestCase
+import base64
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import User, Coords, PerevalAdded
+from rest_framework.renderers import JSONRenderer
+from .models import (
+    User, Coords, PerevalAdded, PerevalArea, PerevalImage, PerevalImageVariant, ImageJob, UploadSession, ImageBlob,
+    IdempotencyKey, ImportBatch, PerevalAreaClosure, SprActivitiesType
+)
+from . import areas, async_views, fast_read, geo, idempotency, importer, moderation, parsers, routers, stats, tiles, uploads
+from .caching import get_detail, get_tile, invalidate_details, set_detail
+from .metrics import registry
+from .serializers import PerevalAddedSerializer
+from .storage import blob_sha256, image_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 class ModelTests(TestCase):
@@ -141,4 +171,2173 @@ class ModelTests(TestCase):
         url = reverse('pereval-detail', args=[self.pereval.id])  # Убедитесь, что у вас есть URL для удаления перевала
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertEqual(PerevalAdded.objects.count(), 0)  # Проверяем, что перевал удален
\ No newline at end of file
+        self.assertEqual(PerevalAdded.objects.count(), 0)  # Проверяем, что перевал удален
+
+def pereval_payload(email='batch@example.com', title='Перевал', **extra):
+    """Данные перевала в формате POST /submitData/."""
+    data = {
+        'user': {
+            'email': email,
+            'last_name': 'Петров',
+            'first_name': 'Пётр',
+            'middle_name': 'Петрович',
+            'phone': '79990000000'
+        },
+        'coords': {'latitude': 43.35, 'longitude': 42.44, 'height': 3200},
+        'images': [],
+        'beauty_title': 'пер.',
+        'title': title,
+        'other_titles': 'Другое название',
+        'connect': '',
+        'level_spring': '1A',
+        'level_summer': '1A',
+        'level_autumn': '1A',
+        'level_winter': '2A'
+    }
+    data.update(extra)
+    return data
+
+
+class BatchSubmitTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('submit_data_batch')
+
+    def test_batch_create(self):
+        """Тест пакетного добавления перевалов."""
+        User.objects.create(
+            email='old@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        data = [
+            pereval_payload(email='old@example.com', title='Первый'),
+            pereval_payload(email='new@example.com', title='Второй'),
+            pereval_payload(email='new@example.com', title='Третий'),
+        ]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        ids = [result['id'] for result in response.data['results']]
+        titles = dict(PerevalAdded.objects.values_list('id', 'title'))
+        self.assertEqual([titles[pk] for pk in ids], ['Первый', 'Второй', 'Третий'])
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Coords.objects.count(), 3)
+
+    def test_batch_query_count(self):
+        """Количество запросов не зависит от размера пакета."""
+        data = [pereval_payload(email=f'user{i}@example.com', title=str(i)) for i in range(20)]
+        # Транзакция, SELECT пользователей до и после их INSERT, INSERT координат и перевалов,
+        # два запроса к счётчикам статистики
+        with self.assertNumQueries(9):
+            response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(PerevalAdded.objects.count(), 20)
+
+    def test_user_created_concurrently(self):
+        """Пользователь, созданный параллельным запросом после поиска по email, не ломает пакет."""
+        bulk_create = User.objects.bulk_create
+
+        def create_concurrently(objs, **kwargs):
+            User.objects.create(email='race@example.com', last_name='Первый', first_name='Иван', phone='1')
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(User.objects, 'bulk_create', create_concurrently):
+            response = self.client.post(self.url, [pereval_payload(email='race@example.com')], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = User.objects.get(email='race@example.com')
+        self.assertEqual(user.last_name, 'Первый')
+        self.assertEqual(PerevalAdded.objects.get().user, user)
+
+    def test_batch_partial_errors(self):
+        """Некорректные элементы возвращают ошибки, корректные сохраняются."""
+        invalid = pereval_payload(title='')
+        response = self.client.post(self.url, [pereval_payload(), invalid], format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+
+        valid_result, invalid_result = response.data['results']
+        self.assertIsNotNone(valid_result['id'])
+        self.assertIsNone(invalid_result['id'])
+        self.assertIn('title', invalid_result['errors'])
+        self.assertEqual(PerevalAdded.objects.count(), 1)
+
+    def test_submit_same_coords_twice(self):
+        """Перевалы с одинаковыми координатами получают отдельные записи Coords."""
+        for title in ['Первый', 'Второй']:
+            response = self.client.post(reverse('submit_data'), pereval_payload(title=title), format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Coords.objects.count(), 2)
+
+    def test_batch_requires_list(self):
+        """Тело запроса должно быть непустым списком."""
+        response = self.client.post(self.url, pereval_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReadQueryCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(
+            email='reader@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+
+    def create_perevals(self, count):
+        for i in range(count):
+            pereval = PerevalAdded.objects.create(
+                user=self.user,
+                coords=Coords.objects.create(latitude=43.0 + i, longitude=42.0, height=3000),
+                beauty_title='пер.',
+                title=f'Перевал {i}',
+                other_titles=''
+            )
+            PerevalImage.objects.create(pereval=pereval, data='images/test_image.jpg', title='Фото 1')
+            PerevalImage.objects.create(pereval=pereval, data='images/test_image.jpg', title='Фото 2')
+
+    def get_list(self):
+        return self.client.get(reverse('submit_data_list'), {'user__email': self.user.email})
+
+    def test_list_query_count_is_constant(self):
+        """Количество запросов списка не зависит от числа перевалов."""
+        self.create_perevals(1)
+        with self.assertNumQueries(3):
+            response = self.get_list()
+        self.assertEqual(len(response.json()['results']), 1)
+
+        self.create_perevals(10)
+        with self.assertNumQueries(3):
+            response = self.get_list()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['results']), 11)
+        self.assertEqual(len(response.json()['results'][0]['images']), 2)
+        self.assertEqual(response.json()['results'][0]['user']['email'], self.user.email)
+
+    def test_detail_query_count(self):
+        """Перевал с пользователем, координатами, изображениями и их копиями читается тремя запросами."""
+        self.create_perevals(1)
+        pereval = PerevalAdded.objects.get()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('submit_data_detail', args=[pereval.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['coords']['height'], 3000)
+        self.assertEqual([image['title'] for image in response.json()['images']], ['Фото 1', 'Фото 2'])
+
+
+class ListPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('submit_data_list')
+        user = User.objects.create(
+            email='pages@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        self.perevals = [
+            PerevalAdded.objects.create(
+                user=user,
+                coords=Coords.objects.create(latitude=43.0, longitude=42.0, height=3000),
+                beauty_title='пер.',
+                title=f'Перевал {i}',
+                other_titles=''
+            )
+            for i in range(5)
+        ]
+
+    def test_walk_all_pages(self):
+        """Обход страниц по ссылке next возвращает все перевалы от новых к старым без повторов."""
+        response = self.client.get(self.url, {'user__email': 'pages@example.com', 'page_size': 2})
+        ids = []
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.json()['results']), 2)
+            ids.extend(item['id'] for item in response.json()['results'])
+            if response.json()['next'] is None:
+                break
+            response = self.client.get(response.json()['next'])
+
+        expected = sorted(self.perevals, key=lambda pereval: (pereval.datetime, pereval.id), reverse=True)
+        self.assertEqual(ids, [pereval.id for pereval in expected])
+
+    def test_default_page_size(self):
+        """Без page_size используется размер страницы из настроек."""
+        with self.settings(PEREVAL_LIST_PAGE_SIZE=3):
+            response = self.client.get(self.url, {'user__email': 'pages@example.com'})
+        self.assertEqual(len(response.json()['results']), 3)
+        self.assertIsNotNone(response.json()['next'])
+
+    def test_invalid_cursor(self):
+        """Некорректный курсор возвращает ошибку запроса."""
+        response = self.client.get(self.url, {'user__email': 'pages@example.com', 'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('submit_data_export')
+        user = User.objects.create(
+            email='export@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        for i in range(5):
+            pereval = PerevalAdded.objects.create(
+                user=user,
+                coords=Coords.objects.create(latitude=43.0 + i, longitude=42.0, height=3000),
+                beauty_title='пер.',
+                title=f'Перевал {i}',
+                other_titles=''
+            )
+            PerevalImage.objects.create(pereval=pereval, data='images/test_image.jpg', title='Фото')
+
+    def test_export_ndjson(self):
+        """Выгрузка NDJSON: одна строка JSON на перевал."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['title'] for row in rows], [f'Перевал {i}' for i in range(5)])
+        self.assertEqual(rows[0]['user']['email'], 'export@example.com')
+        self.assertEqual(rows[1]['coords']['latitude'], 44.0)
+        self.assertEqual(rows[0]['images'], [{'data': 'images/test_image.jpg', 'title': 'Фото', 'variants': {}}])
+
+    def test_export_csv(self):
+        """Выгрузка CSV: заголовок и плоская строка на перевал."""
+        response = self.client.get(self.url, {'output': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['user_email'], 'export@example.com')
+        self.assertEqual(json.loads(rows[0]['images'])[0]['title'], 'Фото')
+
+    def test_export_unknown_format(self):
+        response = self.client.get(self.url, {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_reads_in_chunks(self):
+        """Перевалы читаются одним курсором, изображения и их копии подгружаются запросом на пачку."""
+        with self.assertNumQueries(1 + 3 * 2):
+            with self.settings(PEREVAL_EXPORT_CHUNK_SIZE=2):
+                response = self.client.get(self.url)
+                lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 5)
+
+    def test_export_command(self):
+        """Команда export_perevals пишет выгрузку в файл."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'perevals.csv')
+            call_command('export_perevals', '--format', 'csv', '--output', path, '--chunk-size', '2')
+            with open(path, encoding='utf-8') as file:
+                rows = list(csv.DictReader(file))
+        self.assertEqual([row['title'] for row in rows], [f'Перевал {i}' for i in range(5)])
+
+
+class GeoTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(
+            email='geo@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        # Эльбрус, Казбек, Домбай и точка у 180-го меридиана
+        self.elbrus = self.create_pereval('Эльбрус', 43.3499, 42.4453)
+        self.kazbek = self.create_pereval('Казбек', 42.6969, 44.5183)
+        self.dombay = self.create_pereval('Домбай', 43.2903, 41.6264)
+        self.chukotka = self.create_pereval('Чукотка', 65.0, 179.95)
+
+    def create_pereval(self, title, latitude, longitude):
+        return PerevalAdded.objects.create(
+            user=self.user,
+            coords=Coords.objects.create(latitude=latitude, longitude=longitude, height=3000),
+            beauty_title='пер.',
+            title=title,
+            other_titles=''
+        )
+
+    def test_haversine(self):
+        """Расстояние Москва — Санкт-Петербург около 634 км."""
+        self.assertAlmostEqual(geo.haversine_km(55.7558, 37.6173, 59.9343, 30.3351), 634, delta=2)
+
+    def test_grid_cell_saved(self):
+        """Ячейка сетки считается при сохранении координат и при пакетной отправке."""
+        self.assertEqual(self.elbrus.coords.grid_cell, geo.grid_cell(43.3499, 42.4453))
+
+        response = self.client.post(reverse('submit_data_batch'), [pereval_payload()], format='json')
+        coords = PerevalAdded.objects.get(id=response.data['results'][0]['id']).coords
+        self.assertEqual(coords.grid_cell, geo.grid_cell(43.35, 42.44))
+        self.assertNotIn('grid_cell', self.client.get(
+            reverse('submit_data_detail', args=[self.elbrus.id])
+        ).json()['coords'])
+
+    def test_nearby(self):
+        """Поиск рядом с точкой возвращает перевалы в радиусе, ближайшие первыми."""
+        # Координаты кандидатов, затем полные записи первых limit
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('submit_data_nearby'), {'lat': 43.35, 'lon': 42.3, 'radius_km': 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([item['title'] for item in results], ['Эльбрус', 'Домбай'])
+        self.assertLess(results[0]['distance_km'], results[1]['distance_km'])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('submit_data_nearby'), {'lat': 43.35, 'lon': 42.3, 'radius_km': 100, 'limit': 1}
+            )
+        self.assertEqual([item['title'] for item in response.data['results']], ['Эльбрус'])
+        self.assertIn(f'IN ({self.elbrus.id})', queries[1]['sql'])
+
+    def test_nearby_across_antimeridian(self):
+        """Радиус, пересекающий 180-й меридиан, находит точки с обеих сторон."""
+        response = self.client.get(reverse('submit_data_nearby'), {'lat': 65.0, 'lon': -179.95, 'radius_km': 20})
+        self.assertEqual([item['title'] for item in response.data['results']], ['Чукотка'])
+
+    def test_bbox(self):
+        """Поиск в прямоугольнике возвращает только точки внутри границ."""
+        response = self.client.get(reverse('submit_data_bbox'), {
+            'lat_min': 42, 'lat_max': 44, 'lon_min': 42, 'lon_max': 45
+        })
+        self.assertEqual([item['title'] for item in response.data['results']], ['Эльбрус', 'Казбек'])
+
+        response = self.client.get(reverse('submit_data_bbox'), {
+            'lat_min': 60, 'lat_max': 70, 'lon_min': 170, 'lon_max': -170
+        })
+        self.assertEqual([item['title'] for item in response.data['results']], ['Чукотка'])
+
+    def test_invalid_params(self):
+        response = self.client.get(reverse('submit_data_nearby'), {'lat': 100, 'lon': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('submit_data_bbox'), {
+            'lat_min': 44, 'lat_max': 42, 'lon_min': 42, 'lon_max': 45
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('submit_data_search')
+        self.user = User.objects.create(
+            email='search@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        self.create_pereval('Перевал Дятлова', 'Холат-Сяхыл', 'пер.')
+        self.create_pereval('Седло Эльбруса', 'Эльбрусское седло', 'седловина')
+        self.create_pereval('Кавказский', 'Перевал Эльбрус', 'пер.')
+
+    def create_pereval(self, title, other_titles, beauty_title):
+        return PerevalAdded.objects.create(
+            user=self.user,
+            coords=Coords.objects.create(latitude=43.0, longitude=42.0, height=3000),
+            beauty_title=beauty_title,
+            title=title,
+            other_titles=other_titles
+        )
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_ranked_results(self):
+        """Совпадение в названии ранжируется выше совпадения в других названиях."""
+        response = self.search(q='эльбрус')
+        self.assertEqual([item['title'] for item in response.json()['results']], ['Седло Эльбруса', 'Кавказский'])
+
+    def test_index_follows_edits(self):
+        """Индекс обновляется при изменении и удалении перевала."""
+        pereval = PerevalAdded.objects.get(title='Перевал Дятлова')
+        pereval.title = 'Перевал Северный'
+        pereval.save()
+        self.assertEqual(self.search(q='дятлова').json()['results'], [])
+        self.assertEqual(len(self.search(q='северный').json()['results']), 1)
+
+        pereval.delete()
+        self.assertEqual(self.search(q='северный').json()['results'], [])
+
+    def test_pagination(self):
+        """Результаты разбиваются на страницы, ссылка next ведёт на следующую."""
+        response = self.search(q='перевал', page_size=1)
+        self.assertEqual(len(response.json()['results']), 1)
+        titles = [response.json()['results'][0]['title']]
+
+        response = self.client.get(response.json()['next'])
+        titles.append(response.json()['results'][0]['title'])
+        self.assertIsNone(response.json()['next'])
+        self.assertEqual(sorted(titles), ['Кавказский', 'Перевал Дятлова'])
+
+    def test_fts_syntax_is_escaped(self):
+        """Операторы FTS в запросе не ломают поиск."""
+        self.assertEqual(self.search(q='"эльбрус* (-').json()['results'][0]['title'], 'Седло Эльбруса')
+        self.assertEqual(self.search(q='***').json()['results'], [])
+
+    def test_query_required(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DetailCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(
+            email='cache@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        self.pereval = PerevalAdded.objects.create(
+            user=self.user,
+            coords=Coords.objects.create(latitude=43.0, longitude=42.0, height=3000),
+            beauty_title='пер.',
+            title='Перевал',
+            other_titles=''
+        )
+        self.url = reverse('submit_data_detail', args=[self.pereval.id])
+
+    def test_cached_response(self):
+        """Повторный запрос отдаётся из кэша без обращения к БД."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+    def test_conditional_get(self):
+        """При совпадении If-None-Match возвращается 304 без тела."""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_invalidated_on_edit(self):
+        """Редактирование перевала сбрасывает кэш и меняет ETag."""
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse('submit_data_update', args=[self.pereval.id]), {'title': 'Новое название'}, format='json'
+            )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['title'], 'Новое название')
+
+    def test_stale_read_not_cached(self):
+        """Ответ, прочитанный до изменения, не остаётся в кэше, даже если записан после сброса."""
+        _, version = get_detail(self.pereval.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_details([self.pereval.id])
+        set_detail(self.pereval.id, b'{"title": "Old"}', version)
+        self.assertIsNone(get_detail(self.pereval.id)[0])
+
+    def assert_invalidated(self, change):
+        etag = self.client.get(self.url)['ETag']
+        change()
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+
+    def test_invalidated_on_status_change(self):
+        """Смена статуса сбрасывает кэш."""
+        def change():
+            self.pereval.status = PerevalAdded.ACCEPTED
+            self.pereval.save()
+        self.assert_invalidated(change)
+
+    def test_invalidated_on_related_changes(self):
+        """Изменение координат, пользователя или изображений сбрасывает кэш."""
+        def change_coords():
+            self.pereval.coords.height = 3100
+            self.pereval.coords.save()
+
+        def change_user():
+            self.user.phone = '2'
+            self.user.save()
+
+        def add_image():
+            PerevalImage.objects.create(pereval=self.pereval, data='images/test_image.jpg', title='Фото')
+
+        for change in [change_coords, change_user, add_image]:
+            self.assert_invalidated(change)
+
+
+def jpeg_with_exif(size=(2000, 1000)):
+    """JPEG с EXIF (поворот и модель камеры) для проверки обработки изображений."""
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: повернуть на 90°
+    exif[0x0110] = 'Camera'  # Model
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+def use_temp_media(test_case):
+    """Перенаправляет MEDIA_ROOT во временный каталог на время теста."""
+    media = tempfile.TemporaryDirectory()
+    test_case.addCleanup(media.cleanup)
+    media_settings = override_settings(MEDIA_ROOT=media.name)
+    media_settings.enable()
+    test_case.addCleanup(media_settings.disable)
+    return media.name
+
+
+class ImageProcessingTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        self.client = APIClient()
+        user = User.objects.create(
+            email='images@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        self.pereval = PerevalAdded.objects.create(
+            user=user,
+            coords=Coords.objects.create(latitude=43.0, longitude=42.0, height=3000),
+            beauty_title='пер.',
+            title='Перевал',
+            other_titles=''
+        )
+
+    def create_image(self):
+        return PerevalImage.objects.create(
+            pereval=self.pereval,
+            data=SimpleUploadedFile('photo.jpg', jpeg_with_exif(), content_type='image/jpeg'),
+            title='Фото'
+        )
+
+    def test_job_created_without_processing(self):
+        """Сохранение изображения только ставит задание в очередь."""
+        image = self.create_image()
+        self.assertEqual(image.job.status, ImageJob.NEW)
+        self.assertFalse(image.variants.exists())
+
+    def test_process_images(self):
+        """Обработчик строит копии WebP и JPEG без EXIF с учётом поворота."""
+        image = self.create_image()
+        updated_at = PerevalAdded.objects.get(id=self.pereval.id).updated_at
+        call_command('process_images', '--workers', '0', '--once', stdout=io.StringIO())
+
+        image.job.refresh_from_db()
+        self.assertEqual(image.job.status, ImageJob.DONE)
+        # Ссылки на копии попадают в ленту /sync/
+        self.assertGreater(PerevalAdded.objects.get(id=self.pereval.id).updated_at, updated_at)
+        variants = {(variant.name, variant.format): variant for variant in image.variants.all()}
+        self.assertEqual(set(variants), {(name, fmt) for name in ('thumb', 'medium') for fmt in ('webp', 'jpeg')})
+
+        thumb = variants['thumb', 'jpeg']
+        self.assertEqual((thumb.width, thumb.height), (160, 320))
+        with Image.open(thumb.file.path) as file:
+            self.assertEqual(len(file.getexif()), 0)
+        with Image.open(variants['medium', 'webp'].file.path) as file:
+            self.assertEqual(file.format, 'WEBP')
+            self.assertEqual(file.size, (640, 1280))
+
+        response = self.client.get(reverse('submit_data_detail', args=[self.pereval.id]))
+        self.assertEqual(
+            response.json()['images'][0]['variants']['thumb']['webp'], variants['thumb', 'webp'].file.url
+        )
+
+    def test_failed_job_is_retried(self):
+        """Задание с ошибкой возвращается в очередь, пока не исчерпаны попытки."""
+        image = self.create_image()
+        os.remove(image.data.path)
+
+        with self.settings(PEREVAL_IMAGE_JOB_MAX_ATTEMPTS=2):
+            call_command('process_images', '--workers', '0', '--once', stdout=io.StringIO(), stderr=io.StringIO())
+        image.job.refresh_from_db()
+        self.assertEqual(image.job.status, ImageJob.FAILED)
+        self.assertEqual(image.job.attempts, 2)
+        self.assertIn('FileNotFoundError', image.job.error)
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = use_temp_media(self)
+        self.client = APIClient()
+        user = User.objects.create(
+            email='upload@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        self.pereval = PerevalAdded.objects.create(
+            user=user,
+            coords=Coords.objects.create(latitude=43.0, longitude=42.0, height=3000),
+            beauty_title='пер.',
+            title='Перевал',
+            other_titles=''
+        )
+        self.content = jpeg_with_exif()
+
+    def create_session(self, size=None, filename='гора.jpg'):
+        response = self.client.post(
+            reverse('upload_create'), {'filename': filename, 'size': size or len(self.content)}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def put_chunk(self, session_id, start, end):
+        return self.client.generic(
+            'PUT', reverse('upload_session', args=[session_id]), self.content[start:end + 1],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.content)}'
+        )
+
+    def finalize(self, session_id):
+        return self.client.post(
+            reverse('upload_finalize', args=[session_id]), {'pereval': self.pereval.id, 'title': 'Фото'}, format='json'
+        )
+
+    def test_resumable_upload(self):
+        """Файл загружается частями с продолжением после обрыва и прикрепляется к перевалу."""
+        session_id = self.create_session()
+        middle = len(self.content) // 2
+
+        response = self.put_chunk(session_id, 0, middle - 1)
+        self.assertEqual(response.data['received'], middle)
+
+        # После обрыва клиент узнаёт смещение и продолжает с него
+        response = self.client.get(reverse('upload_session', args=[session_id]))
+        self.assertEqual(response.data['received'], middle)
+        response = self.put_chunk(session_id, middle, len(self.content) - 1)
+        self.assertEqual(response.data['received'], len(self.content))
+
+        response = self.finalize(session_id)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        image = PerevalImage.objects.get(id=response.data['id'])
+        self.assertEqual(image.pereval, self.pereval)
+        self.assertTrue(image.data.name.endswith('.jpg'))
+        with image.data.open('rb') as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertEqual(image.job.status, ImageJob.NEW)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads')), [])
+
+    def test_extension_from_content(self):
+        """Расширение сохранённого файла определяется форматом изображения, а не именем от клиента."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10), 'blue').save(buffer, 'PNG')
+        self.content = buffer.getvalue()
+        session_id = self.create_session(filename='page.html')
+        self.put_chunk(session_id, 0, len(self.content) - 1)
+
+        response = self.finalize(session_id)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(PerevalImage.objects.get(id=response.data['id']).data.name.endswith('.png'))
+
+    def test_wrong_offset(self):
+        """Часть не с текущего смещения отклоняется."""
+        session_id = self.create_session()
+        response = self.put_chunk(session_id, 10, 20)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['received'], 0)
+
+    def test_same_offset_written_once(self):
+        """Повтор части с уже занятым смещением отклоняется и не меняет файл."""
+        session_id = self.create_session()
+        stale = UploadSession.objects.get(id=session_id)
+        self.put_chunk(session_id, 0, 99)
+
+        with self.assertRaises(uploads.UploadError) as error:
+            uploads.write_chunk(stale, 0, 10, io.BytesIO(b'x' * 10))
+        self.assertEqual(error.exception.status, 409)
+        self.assertEqual(stale.received, 100)
+        with open(image_storage.path(stale.part_name), 'rb') as file:
+            self.assertEqual(file.read(), self.content[:100])
+
+    def test_body_read_outside_transaction(self):
+        """Тело части читается до транзакции с блокировкой сессии."""
+        session = UploadSession.objects.get(id=self.create_session())
+        depth = len(connection.atomic_blocks)
+        depths = []
+
+        class Stream(io.BytesIO):
+            def read(self, size=-1):
+                depths.append(len(connection.atomic_blocks))
+                return super().read(size)
+
+        uploads.write_chunk(session, 0, 100, Stream(self.content[:100]))
+        self.assertEqual(set(depths), {depth})
+        self.assertEqual(UploadSession.objects.get(id=session.id).received, 100)
+
+    def test_finalize_twice(self):
+        """Повторное завершение той же загрузки получает 404, а не ошибку сервера."""
+        session_id = self.create_session()
+        stale = UploadSession.objects.get(id=session_id)
+        self.put_chunk(session_id, 0, len(self.content) - 1)
+        stale.received = stale.size
+        self.assertEqual(self.finalize(session_id).status_code, status.HTTP_201_CREATED)
+
+        with self.assertRaises(uploads.UploadError) as error:
+            uploads.finalize_upload(stale, self.pereval, 'Фото')
+        self.assertEqual(error.exception.status, 404)
+        self.assertEqual(PerevalImage.objects.count(), 1)
+
+    def test_finalize_existing_blob_touched(self):
+        """Загрузка уже сохранённого изображения защищает его файл от gc_blobs."""
+        image = PerevalImage.objects.create(
+            pereval=self.pereval, data=SimpleUploadedFile('a.jpg', self.content), title='Фото'
+        )
+        name = image.data.name
+        image.delete()
+        ImageBlob.objects.filter(name=name).update(touched_at=timezone.now() - timedelta(hours=2))
+
+        session_id = self.create_session()
+        self.put_chunk(session_id, 0, len(self.content) - 1)
+        self.assertEqual(self.finalize(session_id).status_code, status.HTTP_201_CREATED)
+        blob = ImageBlob.objects.get(name=name)
+        self.assertGreater(blob.touched_at, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(image_storage.exists(name))
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads')), [])
+
+    def test_content_range_required(self):
+        session_id = self.create_session()
+        response = self.client.generic(
+            'PUT', reverse('upload_session', args=[session_id]), b'data', content_type='application/octet-stream'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_finalize_incomplete(self):
+        """Незавершённую загрузку нельзя прикрепить к перевалу."""
+        session_id = self.create_session()
+        self.put_chunk(session_id, 0, 99)
+        response = self.finalize(session_id)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_finalize_not_image(self):
+        """Файл, не являющийся изображением, отклоняется."""
+        self.content = b'not an image' * 10
+        session_id = self.create_session()
+        self.put_chunk(session_id, 0, len(self.content) - 1)
+        response = self.finalize(session_id)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(PerevalImage.objects.exists())
+
+    def test_size_limit(self):
+        with self.settings(PEREVAL_UPLOAD_MAX_SIZE=10):
+            response = self.client.post(reverse('upload_create'), {'filename': 'a.jpg', 'size': 11}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_clean_uploads(self):
+        """Команда clean_uploads удаляет брошенные сессии и их файлы."""
+        session_id = self.create_session()
+        self.put_chunk(session_id, 0, 99)
+        call_command('clean_uploads', '--hours', '0', stdout=io.StringIO())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads')), [])
+
+
+class ImageDeduplicationTests(TestCase):
+    def setUp(self):
+        self.media_root = use_temp_media(self)
+        self.client = APIClient()
+        self.user = User.objects.create(
+            email='blobs@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        self.pereval = self.create_pereval()
+        self.content = jpeg_with_exif()
+
+    def create_pereval(self):
+        return PerevalAdded.objects.create(
+            user=self.user,
+            coords=Coords.objects.create(latitude=43.0, longitude=42.0, height=3000),
+            beauty_title='пер.',
+            title='Перевал',
+            other_titles=''
+        )
+
+    def create_image(self, pereval, name='photo.jpg'):
+        return PerevalImage.objects.create(
+            pereval=pereval, data=SimpleUploadedFile(name, self.content, content_type='image/jpeg'), title='Фото'
+        )
+
+    def stored_files(self):
+        return [
+            os.path.join(root, name)
+            for root, _, names in os.walk(os.path.join(self.media_root, 'images')) for name in names
+        ]
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые изображения хранятся в одном файле, ссылки считаются."""
+        first = self.create_image(self.pereval)
+        second = self.create_image(self.create_pereval(), name='copy.JPG')
+        self.assertEqual(first.data.name, second.data.name)
+        self.assertEqual(first.sha256, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(len(self.stored_files()), 1)
+        self.assertEqual(ImageBlob.objects.get(name=first.data.name).ref_count, 2)
+
+        first.delete()
+        self.assertEqual(ImageBlob.objects.get(name=second.data.name).ref_count, 1)
+
+    def test_concurrent_save_same_name(self):
+        """Одновременная запись одного содержимого (оба не застали файл) даёт одно имя по хешу."""
+        content = jpeg_with_exif((20, 10))
+        with mock.patch.object(image_storage, 'exists', return_value=False):
+            names = {image_storage.save('images/photo.jpg', io.BytesIO(content)) for _ in range(2)}
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertEqual(blob_sha256(name), hashlib.sha256(content).hexdigest())
+        with image_storage.open(name) as file:
+            self.assertEqual(file.read(), content)
+        self.assertEqual(os.listdir(os.path.dirname(image_storage.path(name))), [os.path.basename(name)])
+
+    def test_attach_by_hash(self):
+        """Уже загруженное изображение прикрепляется по хешу без передачи файла."""
+        image = self.create_image(self.pereval)
+        payload = pereval_payload(images=[{'sha256': image.sha256, 'title': 'Повтор'}])
+
+        response = self.client.post(reverse('submit_data_batch'), [payload], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        copy = PerevalImage.objects.get(pereval_id=response.data['results'][0]['id'])
+        self.assertEqual(copy.data.name, image.data.name)
+        self.assertEqual(ImageBlob.objects.get(name=image.data.name).ref_count, 2)
+        self.assertEqual(len(self.stored_files()), 1)
+
+    def test_attach_unknown_hash(self):
+        payload = pereval_payload(images=[{'sha256': '0' * 64, 'title': 'Нет такого'}])
+        response = self.client.post(reverse('submit_data_batch'), [payload], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_gc_blobs(self):
+        """gc_blobs удаляет только файлы без ссылок."""
+        kept = self.create_image(self.pereval)
+        self.content = jpeg_with_exif(size=(100, 100))
+        removed = self.create_image(self.create_pereval())
+        removed_name = removed.data.name
+        removed.pereval.delete()
+
+        call_command('gc_blobs', '--min-age-minutes', '0', stdout=io.StringIO())
+        self.assertEqual(self.stored_files(), [os.path.join(self.media_root, kept.data.name)])
+        self.assertFalse(ImageBlob.objects.filter(name=removed_name).exists())
+        self.assertTrue(ImageBlob.objects.filter(name=kept.data.name).exists())
+
+
+    def test_resaved_orphan_kept(self):
+        """Повторное сохранение файла без ссылок защищает его от gc_blobs до прикрепления."""
+        removed = self.create_image(self.create_pereval())
+        name = removed.data.name
+        removed.pereval.delete()
+        ImageBlob.objects.filter(name=name).update(touched_at=timezone.now() - timedelta(hours=2))
+
+        self.assertEqual(image_storage.save('images/again.jpg', io.BytesIO(self.content)), name)
+        call_command('gc_blobs', '--min-age-minutes', '60', stdout=io.StringIO())
+        self.assertTrue(image_storage.exists(name))
+        self.assertTrue(ImageBlob.objects.filter(name=name).exists())
+
+    def test_resave_after_gc_rewrites_file(self):
+        """Если файл удалён, пока запись ImageBlob ещё была, сохранение записывает его заново."""
+        image = self.create_image(self.pereval)
+        os.remove(image_storage.path(image.data.name))
+        self.assertEqual(image_storage.save('images/again.jpg', io.BytesIO(self.content)), image.data.name)
+        with image_storage.open(image.data.name) as file:
+            self.assertEqual(file.read(), self.content)
+
+
+class PatchTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        self.client = APIClient()
+        user = User.objects.create(
+            email='patch@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        self.pereval = PerevalAdded.objects.create(
+            user=user,
+            coords=Coords.objects.create(latitude=43.0, longitude=42.0, height=3000),
+            beauty_title='пер.',
+            title='Перевал',
+            other_titles=''
+        )
+        self.first = self.create_image(self.pereval, 'red', 'Первое')
+        self.second = self.create_image(self.pereval, 'blue', 'Второе')
+        self.url = reverse('submit_data_update', args=[self.pereval.id])
+
+    def create_image(self, pereval, color, title):
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10), color).save(buffer, 'JPEG')
+        return PerevalImage.objects.create(
+            pereval=pereval, data=SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg'),
+            title=title
+        )
+
+    def patch(self, data):
+        response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.pereval.refresh_from_db()
+
+    def test_unchanged_fields_not_written(self):
+        """Без изменений ничего не записывается, updated_at не сдвигается."""
+        self.pereval.refresh_from_db()
+        updated_at = self.pereval.updated_at
+        with CaptureQueriesContext(connection) as queries:
+            self.patch({'title': 'Перевал', 'coords': {'height': 3000}})
+        self.assertFalse([query for query in queries if query['sql'].startswith(('UPDATE', 'INSERT', 'DELETE'))])
+        self.assertEqual(self.pereval.updated_at, updated_at)
+
+    def test_only_changed_columns(self):
+        """В UPDATE попадают только изменённые поля и updated_at."""
+        with CaptureQueriesContext(connection) as queries:
+            self.patch({'title': 'Новое', 'beauty_title': 'пер.'})
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"title"', updates[0])
+        self.assertNotIn('"beauty_title"', updates[0])
+        self.assertEqual(self.pereval.title, 'Новое')
+
+    def test_coords_change(self):
+        """Изменение координат сохраняется и сдвигает updated_at перевала."""
+        self.pereval.refresh_from_db()
+        updated_at = self.pereval.updated_at
+        self.patch({'coords': {'height': 3100}})
+        self.assertEqual(self.pereval.coords.height, 3100)
+        self.assertGreater(self.pereval.updated_at, updated_at)
+
+    def test_images_not_passed(self):
+        """Частичное обновление без изображений их не трогает."""
+        self.patch({'title': 'Новое'})
+        self.assertEqual(
+            list(self.pereval.attached_images.order_by('id').values_list('id', flat=True)),
+            [self.first.id, self.second.id]
+        )
+
+    def test_images_diff(self):
+        """Совпавшие изображения сохраняют строки, лишние удаляются, новые добавляются."""
+        other = self.create_image(self.create_pereval_for_image(), 'green', 'Чужое')
+        self.patch({'images': [
+            {'sha256': self.first.sha256, 'title': 'Первое, новая подпись'},
+            {'sha256': other.sha256, 'title': 'Третье'},
+        ]})
+
+        images = list(self.pereval.attached_images.order_by('id'))
+        self.assertEqual([image.title for image in images], ['Первое, новая подпись', 'Третье'])
+        self.assertEqual(images[0].id, self.first.id)
+        self.assertEqual(images[1].data.name, other.data.name)
+        self.assertTrue(ImageJob.objects.filter(image=images[1]).exists())
+        self.assertFalse(PerevalImage.objects.filter(id=self.second.id).exists())
+        self.assertEqual(ImageBlob.objects.get(name=self.second.data.name).ref_count, 0)
+        self.assertEqual(ImageBlob.objects.get(name=other.data.name).ref_count, 2)
+
+    def test_images_removed_in_constant_queries(self):
+        """Удаление нескольких изображений не делает запросов на каждое изображение."""
+        colors = ['green', 'yellow', 'black', 'white', 'gray', 'purple', 'orange']
+        removed = [self.second] + [self.create_image(self.pereval, color, color) for color in colors]
+        self.pereval.refresh_from_db()
+        updated_at = self.pereval.updated_at
+        # Перевал и хеш до сохранения, изображения перевала и удаляемые, удаление копий,
+        # заданий и изображений, один UPDATE счётчиков ссылок, UPDATE перевала, ответ
+        with self.assertNumQueries(12):
+            self.patch({'images': [{'sha256': self.first.sha256, 'title': 'Первое'}]})
+        self.assertEqual(list(self.pereval.attached_images.values_list('id', flat=True)), [self.first.id])
+        blobs = ImageBlob.objects.filter(name__in=[image.data.name for image in removed])
+        self.assertEqual(set(blobs.values_list('ref_count', flat=True)), {0})
+        self.assertGreater(self.pereval.updated_at, updated_at)
+
+    def create_pereval_for_image(self):
+        return PerevalAdded.objects.create(
+            user=self.pereval.user,
+            coords=Coords.objects.create(latitude=44.0, longitude=42.0, height=3000),
+            beauty_title='пер.',
+            title='Другой',
+            other_titles=''
+        )
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def submit(self, key, payload=None, url='submit_data'):
+        return self.client.post(
+            reverse(url), payload or pereval_payload(), format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_replay(self):
+        """Повтор с тем же ключом возвращает сохранённый ответ без новой записи."""
+        first = self.submit('key-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        with self.assertNumQueries(1):
+            replay = self.submit('key-1')
+        self.assertEqual(replay.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(PerevalAdded.objects.count(), 1)
+
+    def test_without_key(self):
+        self.client.post(reverse('submit_data'), pereval_payload(), format='json')
+        self.client.post(reverse('submit_data'), pereval_payload(), format='json')
+        self.assertEqual(PerevalAdded.objects.count(), 2)
+
+    def test_key_reused_for_other_request(self):
+        """Ключ нельзя использовать для другого тела запроса или другого эндпоинта."""
+        self.submit('key-1')
+        response = self.submit('key-1', pereval_payload(title='Другой'))
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        response = self.submit('key-1', [pereval_payload()], url='submit_data_batch')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(PerevalAdded.objects.count(), 1)
+
+    def test_invalid_key(self):
+        self.assertEqual(self.submit('').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.submit('k' * 256).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_validation_error_is_stored(self):
+        payload = pereval_payload()
+        del payload['coords']
+        self.assertEqual(self.submit('key-1', payload).status_code, status.HTTP_400_BAD_REQUEST)
+        replay = self.submit('key-1', payload)
+        self.assertEqual(replay.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+
+    def test_server_error_not_stored(self):
+        """После ошибки сервера ключ освобождается и запрос можно повторить."""
+        with mock.patch.object(PerevalAddedSerializer, 'save', side_effect=RuntimeError('БД недоступна')):
+            self.assertEqual(self.submit('key-1').status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        response = self.submit('key-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_expired_key(self):
+        self.submit('key-1')
+        with self.settings(PEREVAL_IDEMPOTENCY_TTL=0):
+            response = self.submit('key-1')
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(PerevalAdded.objects.count(), 2)
+
+    def test_concurrent_duplicate(self):
+        """Запрос, проигравший гонку на уникальном ключе, отдаёт ответ победителя."""
+        first = self.submit('key-1')
+        real = idempotency.stored_response
+        calls = []
+
+        def racing(key, fingerprint):
+            # Проверка до вставки не видит ключ, как у параллельного запроса
+            calls.append(key)
+            return None if len(calls) == 1 else real(key, fingerprint)
+
+        with mock.patch.object(idempotency, 'stored_response', side_effect=racing):
+            replay = self.submit('key-1')
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(PerevalAdded.objects.count(), 1)
+
+    def test_batch(self):
+        first = self.submit('batch-1', [pereval_payload(), pereval_payload()], url='submit_data_batch')
+        replay = self.submit('batch-1', [pereval_payload(), pereval_payload()], url='submit_data_batch')
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(PerevalAdded.objects.count(), 2)
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1000)
+    def test_multipart_hashed_while_parsing(self):
+        """Тело multipart хешируется по ходу разбора, без загрузки в память через request.body."""
+        body = encode_multipart(BOUNDARY, {
+            'title': 'Перевал', 'photo': SimpleUploadedFile('photo.jpg', b'x' * 5000, content_type='image/jpeg')
+        })
+        for _ in range(2):
+            response = self.client.generic(
+                'POST', reverse('submit_data'), body, content_type=MULTIPART_CONTENT, HTTP_IDEMPOTENCY_KEY='form-1'
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+
+        expected = hashlib.sha256(reverse('submit_data').encode() + b'\0' + body).hexdigest()
+        self.assertEqual(IdempotencyKey.objects.get(key='form-1').request_hash, expected)
+
+    def test_clean_idempotency_keys(self):
+        self.submit('key-1')
+        call_command('clean_idempotency_keys', '--seconds', '3600', stdout=io.StringIO())
+        self.assertTrue(IdempotencyKey.objects.exists())
+        call_command('clean_idempotency_keys', '--seconds', '0', stdout=io.StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class Base64ImageTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        self.client = APIClient()
+        self.content = jpeg_with_exif((40, 20))
+
+    def submit(self, body, **headers):
+        if not isinstance(body, (bytes, str)):
+            body = json.dumps(body)
+        return self.client.post(reverse('submit_data'), body, content_type='application/json', **headers)
+
+    def test_image_saved(self):
+        """Изображение base64 из JSON сохраняется так же, как загруженное файлом."""
+        payload = pereval_payload(images=[{'data': base64.b64encode(self.content).decode(), 'title': 'Седловина'}])
+        response = self.submit(payload)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.json())
+
+        image = PerevalImage.objects.get(pereval_id=response.json()['id'])
+        self.assertEqual(image.title, 'Седловина')
+        self.assertTrue(image.data.name.endswith('.jpg'))
+        with image.data.open('rb') as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertEqual(ImageBlob.objects.get(name=image.data.name).sha256, hashlib.sha256(self.content).hexdigest())
+
+    @override_settings(PEREVAL_UPLOAD_BLOCK_SIZE=7)
+    def test_small_chunks(self):
+        """Префикс data:, экранирование и переводы строк разбираются и на границах блоков."""
+        encoded = base64.encodebytes(self.content).decode().replace('/', '\\/').replace('\n', '\\n')
+        body = json.dumps(pereval_payload(title='Перевал "Ветреный"')).replace(
+            '"images": []', '"images": [{"title": "Фото", "d\\u0061ta": "data:image/jpeg;base64,%s"}]' % encoded
+        )
+        response = self.submit(body.encode())
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.json())
+
+        pereval = PerevalAdded.objects.get(id=response.json()['id'])
+        self.assertEqual(pereval.title, 'Перевал "Ветреный"')
+        with pereval.attached_images.get().data.open('rb') as file:
+            self.assertEqual(file.read(), self.content)
+
+    def test_other_data_fields_not_decoded(self):
+        """Как изображения декодируются только строки images[].data корневого объекта."""
+        scanner = parsers.ImageScanner()
+        scanner.feed(b'{"data": "x", "other": [{"images": [{"data": "y"}]}], "images": [{"data": "AAEC", "t": "a"}]}')
+        data = scanner.finish()
+        self.assertEqual(data['data'], 'x')
+        self.assertEqual(data['other'], [{'images': [{'data': 'y'}]}])
+        self.assertEqual(data['images'][0]['data'].read(), b'\x00\x01\x02')
+        scanner.close()
+
+    def test_invalid_base64(self):
+        response = self.submit(pereval_payload(images=[{'data': 'не base64', 'title': 'Фото'}]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('base64', response.json()['message'])
+        self.assertFalse(PerevalAdded.objects.exists())
+
+    def test_invalid_json(self):
+        response = self.submit(b'{"title": "\xd0\x9f", "images": [{"data": "AAAA"}')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(PerevalAdded.objects.exists())
+
+    def test_not_an_image(self):
+        response = self.submit(pereval_payload(images=[{'data': base64.b64encode(b'text').decode(), 'title': 'Фото'}]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('data', response.json()['errors']['images'][0])
+
+    def test_memory_limits(self):
+        """В памяти ограничен только JSON без изображений; размер изображения — PEREVAL_UPLOAD_MAX_SIZE."""
+        image = {'data': base64.b64encode(self.content).decode(), 'title': 'Фото'}
+        with self.settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1000):
+            self.assertEqual(self.submit(pereval_payload(images=[image])).status_code, status.HTTP_201_CREATED)
+            response = self.submit(pereval_payload(connect='x' * 1000))
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.settings(PEREVAL_UPLOAD_MAX_SIZE=len(self.content) - 1):
+            response = self.submit(pereval_payload(images=[image]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(len(self.content) - 1), response.json()['message'])
+
+        with self.settings(DATA_UPLOAD_MAX_NUMBER_FILES=2), mock.patch.object(parsers, 'TemporaryUploadedFile',
+                                                                            wraps=parsers.TemporaryUploadedFile) as files:
+            response = self.submit(pereval_payload(images=[image] * 3))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Изображений больше 2', response.json()['message'])
+        self.assertEqual(files.call_count, 2)
+
+    def test_query_count_independent_of_images(self):
+        """Изображения сохраняются пачкой: число запросов не зависит от их количества."""
+        def payload(count, offset):
+            return pereval_payload(images=[
+                {'data': base64.b64encode(jpeg_with_exif((40 + offset + i, 20))).decode(), 'title': str(i)}
+                for i in range(count)
+            ])
+
+        self.submit(payload(1, 0))
+        counts = []
+        for count, offset in [(1, 10), (10, 20)]:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.submit(payload(count, offset))
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        images = PerevalImage.objects.filter(pereval_id=response.json()['id'])
+        self.assertEqual(ImageJob.objects.filter(image__in=images).count(), 10)
+        blobs = ImageBlob.objects.filter(name__in=images.values('data'))
+        self.assertEqual(set(blobs.values_list('ref_count', flat=True)), {1})
+
+    def test_idempotency_hash_while_streaming(self):
+        """Хеш тела для Idempotency-Key считается при разборе и совпадает с хешем всего тела."""
+        payload = pereval_payload(images=[{'data': base64.b64encode(self.content).decode(), 'title': 'Фото'}])
+        first = self.submit(payload, HTTP_IDEMPOTENCY_KEY='key-1')
+        replay = self.submit(payload, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(PerevalAdded.objects.count(), 1)
+
+        body = json.dumps(payload).encode()
+        expected = hashlib.sha256(reverse('submit_data').encode() + b'\0' + body).hexdigest()
+        self.assertEqual(IdempotencyKey.objects.get(key='key-1').request_hash, expected)
+
+
+class TileTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create(
+            email='tiles@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        self.elbrus = [self.create_pereval(43.35 + i / 100, 42.44, f'Эльбрус {i}') for i in range(3)]
+        self.altai = self.create_pereval(49.8, 86.6, 'Белуха')
+
+    def create_pereval(self, latitude, longitude, title):
+        return PerevalAdded.objects.create(
+            user=self.user,
+            coords=Coords.objects.create(latitude=latitude, longitude=longitude, height=3000),
+            beauty_title='пер.',
+            title=title,
+            other_titles=''
+        )
+
+    def tile_url(self, z, latitude, longitude):
+        return reverse('tile', args=[z, *tiles.point_tile(latitude, longitude, z)])
+
+    def features(self, z, latitude, longitude):
+        response = self.client.get(self.tile_url(z, latitude, longitude))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/geo+json')
+        return json.loads(response.content)['features']
+
+    def test_clusters_at_low_zoom(self):
+        """На мелком масштабе близкие перевалы объединяются в кластер со средней точкой."""
+        features = self.features(3, 43.35, 42.44)
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]['properties'], {'cluster': True, 'count': 3})
+        longitude, latitude = features[0]['geometry']['coordinates']
+        self.assertAlmostEqual(latitude, 43.36)
+        self.assertAlmostEqual(longitude, 42.44)
+
+    def test_points_at_high_zoom(self):
+        features = self.features(14, 43.35, 42.44)
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]['properties'], {
+            'cluster': False, 'id': self.elbrus[0].id, 'title': 'Эльбрус 0', 'height': 3000
+        })
+        self.assertEqual(features[0]['geometry']['coordinates'], [42.44, 43.35])
+
+    def test_too_many_points(self):
+        """Если отдельных перевалов в тайле слишком много, отдаются кластеры."""
+        with self.settings(PEREVAL_TILE_MAX_POINTS=2):
+            features = self.features(11, 43.35, 42.44)
+        self.assertTrue(all(feature['properties']['cluster'] for feature in features))
+        self.assertEqual(sum(feature['properties']['count'] for feature in features), 3)
+
+    def test_cached(self):
+        url = self.tile_url(5, 43.35, 42.44)
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.content, response.content)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_invalidates_only_affected_tiles(self):
+        """Новый перевал сбрасывает тайлы со своей точкой, остальные остаются в кэше."""
+        self.features(5, 43.35, 42.44)
+        self.features(5, 49.8, 86.6)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('submit_data_batch'), [pereval_payload()], format='json'
+            )
+        self.assertIsNone(get_tile(5, *tiles.point_tile(43.35, 42.44, 5)))
+        self.assertIsNotNone(get_tile(5, *tiles.point_tile(49.8, 86.6, 5)))
+        self.assertEqual(self.features(5, 43.35, 42.44)[0]['properties']['count'], 4)
+
+    def test_moved_pass(self):
+        """Перенос перевала сбрасывает тайлы старой и новой точки."""
+        self.features(5, 43.35, 42.44)
+        self.features(5, 49.8, 86.6)
+        coords = self.elbrus[0].coords
+        coords.latitude, coords.longitude = 49.8, 86.6
+        coords.save()
+        self.assertEqual(self.features(5, 43.35, 42.44)[0]['properties']['count'], 2)
+        self.assertEqual(self.features(5, 49.8, 86.6)[0]['properties']['count'], 2)
+
+    def test_deleted_pass(self):
+        self.features(14, 49.8, 86.6)
+        self.altai.delete()
+        self.assertEqual(self.features(14, 49.8, 86.6), [])
+
+    def test_tiles_for_point(self):
+        """Для каждого масштаба находится тайл с точкой; точка на границе попадает в оба тайла."""
+        found = tiles.tiles_for_point(43.35, 42.44)
+        self.assertEqual([z for z, _, _ in found], list(range(settings.PEREVAL_TILE_MAX_ZOOM + 1)))
+        for tile in found:
+            self.assertTrue(tiles.contains(tiles.tile_bbox(*tile), 43.35, 42.44))
+        self.assertIn((1, 0, 0), tiles.tiles_for_point(10, 0))
+        self.assertIn((1, 1, 0), tiles.tiles_for_point(10, 0))
+
+    def test_invalid_tile(self):
+        self.assertEqual(self.client.get(reverse('tile', args=[25, 0, 0])).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('tile', args=[2, 4, 0])).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(PEREVAL_DB_REPLICA='replica')
+class ReplicaTests(TestCase):
+    """Вторая SQLite вместо реплики: запись в неё не копируется, поэтому видно, откуда идёт чтение."""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def create_pereval(self, using, title):
+        user = User(email=f'{using}@example.com', last_name='Иванов', first_name='Иван', middle_name='', phone='1')
+        user.save(using=using)
+        coords = Coords(latitude=43.35, longitude=42.44, height=3000)
+        coords.save(using=using)
+        pereval = PerevalAdded(user=user, coords=coords, beauty_title='пер.', title=title, other_titles='')
+        pereval.save(using=using)
+        return pereval
+
+    def test_read_views_use_replica(self):
+        pereval = self.create_pereval('replica', 'Реплика')
+        response = self.client.get(reverse('submit_data_detail', args=[pereval.id]))
+        self.assertEqual(response.json()['title'], 'Реплика')
+        response = self.client.get(reverse('submit_data_list'), {'user__email': 'replica@example.com'})
+        self.assertEqual([item['title'] for item in response.json()['results']], ['Реплика'])
+        response = self.client.get(reverse('submit_data_search'), {'q': 'реплика'})
+        self.assertEqual([item['title'] for item in response.json()['results']], ['Реплика'])
+        response = self.client.get(reverse('submit_data_export'))
+        self.assertIn('Реплика', b''.join(response.streaming_content).decode())
+        self.assertNotIn(routers.PRIMARY_COOKIE, response.cookies)
+
+    def test_other_views_use_primary(self):
+        self.create_pereval('default', 'Основная')
+        response = self.client.get(reverse('submit_data_bbox'), {
+            'lat_min': 43, 'lat_max': 44, 'lon_min': 42, 'lon_max': 43
+        })
+        self.assertEqual([item['title'] for item in response.json()['results']], ['Основная'])
+
+    def test_reads_pinned_to_primary_after_write(self):
+        """После записи клиент читает основную БД, остальные клиенты — реплику."""
+        response = self.client.post(reverse('submit_data'), pereval_payload(), format='json')
+        pereval_id = response.data['id']
+        self.assertFalse(PerevalAdded.objects.using('replica').filter(id=pereval_id).exists())
+        cookie = response.cookies[routers.PRIMARY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.PEREVAL_DB_REPLICA_LAG)
+
+        url = reverse('submit_data_detail', args=[pereval_id])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        cache.clear()
+        self.assertEqual(APIClient().get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_replica_response_cached(self):
+        """Ответ с реплики кэшируется на обычный срок, если реплика уже должна была получить изменение."""
+        pereval = self.create_pereval('replica', 'Реплика')
+        url = reverse('submit_data_detail', args=[pereval.id])
+        # Перевал создан давно: версии после его сохранения в кэше нет
+        cache.clear()
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.client.get(url)
+        self.assertEqual(cache_set.call_args.args[2], settings.PEREVAL_DETAIL_CACHE_TIMEOUT)
+
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_details([pereval.id])
+        self.client.get(url)
+        self.assertIsNone(get_detail(pereval.id)[0])
+        with mock.patch('time.time', return_value=time.time() + settings.PEREVAL_DB_REPLICA_LAG):
+            self.client.get(url)
+        self.assertIsNotNone(get_detail(pereval.id)[0])
+
+    def test_no_replica_outside_requests(self):
+        self.create_pereval('replica', 'Реплика')
+        self.assertIsNone(routers.replica_alias())
+        self.assertFalse(PerevalAdded.objects.exists())
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write_archive(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        return path
+
+    def record(self, title, email='import@example.com', **extra):
+        data = pereval_payload(email=email, title=title, datetime='2015-07-01T10:00:00+00:00', status='AC')
+        data.update(extra)
+        return json.dumps(data, ensure_ascii=False)
+
+    def import_archive(self, path, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_perevals', path, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import(self):
+        """Правильные записи импортируются с датой из архива, неправильные попадают в отчёт."""
+        User.objects.create(email='import@example.com', last_name='Старый', first_name='', middle_name='', phone='1')
+        path = self.write_archive('archive.ndjson', [
+            self.record('Первый'),
+            self.record('Второй', email='other@example.com'),
+            self.record('Без статуса', status='XX'),
+            '{"title":',
+            self.record('Третий'),
+        ])
+        stdout, stderr = self.import_archive(path, '--batch-size', '2')
+
+        self.assertIn('Импортировано перевалов: 3, отклонено: 2', stdout)
+        self.assertIn('Запись 3', stderr)
+        self.assertIn('Запись 4: "Неверный JSON', stderr)
+        perevals = PerevalAdded.objects.order_by('id')
+        self.assertEqual([pereval.title for pereval in perevals], ['Первый', 'Второй', 'Третий'])
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(User.objects.get(email='import@example.com').last_name, 'Старый')
+        self.assertTrue(all(pereval.datetime.year == 2015 for pereval in perevals))
+        self.assertTrue(all(pereval.coords.grid_cell for pereval in perevals))
+
+        summary = stats.summary()
+        self.assertEqual(summary['status'], {'AC': 3})
+        self.assertEqual(summary['month'], {'2015-07': 3})
+        self.assertEqual(list(ImportBatch.objects.values_list('first_record', 'last_record', 'imported')), [
+            (1, 2, 2), (3, 4, 0), (5, 5, 1)
+        ])
+
+    def test_images(self):
+        """Изображения ссылаются на уже сохранённые файлы и учитываются в счётчиках ссылок."""
+        name = image_storage.save('images/photo.jpg', io.BytesIO(jpeg_with_exif((20, 10))))
+        path = self.write_archive('images.ndjson', [
+            self.record('С фото', images=[{'data': name, 'title': 'Фото'}]),
+            self.record('С чужим фото', images=[{'data': 'images/missing.jpg', 'title': 'Фото'}]),
+        ])
+        _, stderr = self.import_archive(path)
+
+        image = PerevalImage.objects.get()
+        self.assertEqual((image.pereval.title, image.data.name), ('С фото', name))
+        self.assertEqual(ImageBlob.objects.get(name=name).ref_count, 1)
+        self.assertEqual(image.job.status, ImageJob.NEW)
+        self.assertIn('images/missing.jpg', stderr)
+
+    def test_resume(self):
+        """После сбоя повторный запуск импортирует только записи незафиксированных пачек."""
+        path = self.write_archive('resume.ndjson', [self.record(f'Перевал {i}') for i in range(5)])
+        save_batch = importer.save_batch
+
+        def fail_second(source, batch, **kwargs):
+            if batch[0][0] == 3:
+                raise RuntimeError('сбой')
+            return save_batch(source, batch, **kwargs)
+
+        with mock.patch.object(importer, 'save_batch', fail_second), self.assertRaises(RuntimeError):
+            self.import_archive(path, '--batch-size', '2')
+        self.assertEqual(PerevalAdded.objects.count(), 2)
+
+        stdout, _ = self.import_archive(path, '--batch-size', '2')
+        self.assertIn('пропускается записей из прошлых запусков: 2', stdout)
+        self.assertIn('Импортировано перевалов: 3', stdout)
+        self.assertEqual(
+            sorted(PerevalAdded.objects.values_list('title', flat=True)), [f'Перевал {i}' for i in range(5)]
+        )
+
+    def test_csv_export_round_trip(self):
+        pereval = PerevalAdded.objects.create(
+            user=User.objects.create(email='csv@example.com', last_name='Иванов', first_name='Иван',
+                                     middle_name='Иванович', phone='1'),
+            coords=Coords.objects.create(latitude=43.5, longitude=42.5, height=3100),
+            beauty_title='пер.',
+            title='Перевал\tс табуляцией',
+            other_titles='Другое',
+            connect='Строка 1\nСтрока 2'
+        )
+        path = os.path.join(self.directory, 'export.csv')
+        call_command('export_perevals', '--format', 'csv', '--output', path)
+        self.import_archive(path)
+
+        imported = PerevalAdded.objects.exclude(id=pereval.id).get()
+        for field in ('title', 'connect', 'status', 'datetime', 'user_id'):
+            self.assertEqual(getattr(imported, field), getattr(pereval, field))
+        self.assertEqual(imported.coords.latitude, 43.5)
+
+    def test_copy_value(self):
+        self.assertEqual(importer.copy_value(None), '\\N')
+        self.assertEqual(importer.copy_value('a\tb\nc\\d'), 'a\\tb\\nc\\\\d')
+
+    def test_iter_batches_skips_done(self):
+        records = [(number, {}, None) for number in range(1, 8)]
+        batches = importer.iter_batches(records, 3, [(2, 3), (6, 6)])
+        self.assertEqual([[item[0] for item in batch] for batch in batches], [[1], [4, 5], [7]])
+
+
+class MediaTests(SimpleTestCase):
+    def setUp(self):
+        self.media_root = use_temp_media(self)
+        self.content = jpeg_with_exif((40, 20))
+        self.name = image_storage.save('images/photo.jpg', io.BytesIO(self.content))
+        self.url = reverse('media', args=[self.name])
+
+    def get(self, url=None, **headers):
+        return self.client.get(url or self.url, headers=headers)
+
+    def test_file(self):
+        """Файл по хешу отдаётся FileResponse с ETag-хешем и неизменяемым кэшированием."""
+        response = self.get()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(self.content).hexdigest()}"')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_only_images_served(self):
+        """Недокачанные части и другие файлы вне images/ не отдаются."""
+        os.makedirs(os.path.join(self.media_root, 'uploads'))
+        with open(os.path.join(self.media_root, 'uploads', 'session.part'), 'wb') as file:
+            file.write(self.content)
+        self.assertEqual(self.get(reverse('media', args=['uploads/session.part'])).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unknown_type_downloaded(self):
+        """Файл не из списка форматов изображений отдаётся на скачивание, а не как text/html."""
+        name = image_storage.save('images/page.html', io.BytesIO(b'GIF89a<script>alert(1)</script>'))
+        response = self.get(reverse('media', args=[name]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertEqual(response['Content-Disposition'], 'attachment')
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+
+    def test_range(self):
+        size = len(self.content)
+        for header, start, end in [('bytes=2-5', 2, 5), ('bytes=-3', size - 3, size - 1), ('bytes=10-', 10, size - 1)]:
+            response = self.get(Range=header)
+            self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+            self.assertEqual(b''.join(response.streaming_content), self.content[start:end + 1])
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+            self.assertEqual(response['Content-Length'], str(end - start + 1))
+
+        response = self.get(Range=f'bytes={size}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+        # Несколько диапазонов и устаревший If-Range — файл целиком
+        self.assertEqual(self.get(Range='bytes=0-1,4-5').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get(Range='bytes=0-1', **{'If-Range': '"old"'}).status_code, status.HTTP_200_OK)
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(Range='bytes=0-1', **{'If-Range': etag}).status_code, status.HTTP_206_PARTIAL_CONTENT)
+
+    def serve_with_file_wrapper(self, **headers):
+        """Запрос через WSGIHandler с wsgi.file_wrapper, как у gunicorn; возвращает статус и файл, отданный серверу."""
+        environ = RequestFactory().get(self.url, headers=headers).environ
+        environ['wsgi.file_wrapper'] = lambda file, block_size: [file]
+        statuses = []
+        file = WSGIHandler()(environ, lambda status_line, response_headers: statuses.append(status_line))[0]
+        self.addCleanup(file.close)
+        return statuses[0], file
+
+    def test_sendfile(self):
+        """Middleware не подменяют файл генератором: сервер получает его и может отдать через sendfile."""
+        status_line, file = self.serve_with_file_wrapper()
+        self.assertEqual(status_line, '200 OK')
+        self.assertEqual((file.fileno() > 0, file.tell()), (True, 0))
+
+        status_line, file = self.serve_with_file_wrapper(Range='bytes=2-5')
+        self.assertEqual(status_line, '206 Partial Content')
+        # Файл стоит на начале диапазона, длину сервер берёт из Content-Length
+        self.assertEqual(os.lseek(file.fileno(), 0, os.SEEK_CUR), 2)
+        self.assertEqual(file.read(100), self.content[2:6])
+
+    def test_not_modified(self):
+        response = self.get()
+        for headers in [{'If-None-Match': response['ETag']}, {'If-Modified-Since': response['Last-Modified']}]:
+            not_modified = self.get(**headers)
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(not_modified['ETag'], response['ETag'])
+            self.assertEqual(not_modified['Cache-Control'], response['Cache-Control'])
+        self.assertEqual(self.get(**{'If-None-Match': '"other"'}).status_code, status.HTTP_200_OK)
+
+    def test_mutable_file(self):
+        """Копии изображений пересоздаются под тем же именем и кэшируются ограниченное время."""
+        os.makedirs(os.path.join(self.media_root, 'images', 'variants'))
+        with open(os.path.join(self.media_root, 'images', 'variants', '1_thumb.webp'), 'wb') as file:
+            file.write(b'webp')
+        with self.settings(PEREVAL_MEDIA_MAX_AGE=60):
+            response = self.get(reverse('media', args=['images/variants/1_thumb.webp']))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertNotIn(hashlib.sha256(b'webp').hexdigest(), response['ETag'])
+
+    def test_offload(self):
+        """За прокси Django отдаёт только заголовки, файл передаёт прокси."""
+        with self.settings(PEREVAL_MEDIA_OFFLOAD='x-accel-redirect'):
+            response = self.get()
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        with self.settings(PEREVAL_MEDIA_OFFLOAD='x-sendfile'):
+            response = self.get()
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, self.name))
+
+    def test_head(self):
+        response = self.client.head(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response.content, b'')
+
+    def test_not_found(self):
+        for path in ['images/missing.jpg', 'images', 'images/../../settings.py']:
+            self.assertEqual(self.get(f'/media/{path}').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.post(self.url).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class StatsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def stats(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def rebuilt(self):
+        """Статистика после пересчёта с нуля должна совпадать с инкрементальной."""
+        incremental = self.stats()
+        call_command('rebuild_stats', stdout=io.StringIO())
+        self.assertEqual(self.stats(), incremental)
+        return incremental
+
+    def test_create(self):
+        """Одиночная и пакетная отправка увеличивают счётчики."""
+        self.client.post(reverse('submit_data'), pereval_payload(), format='json')
+        self.client.post(
+            reverse('submit_data_batch'), [pereval_payload(level_spring='2Б'), pereval_payload()], format='json'
+        )
+        data = self.rebuilt()
+        month = timezone.localtime(PerevalAdded.objects.first().datetime).strftime('%Y-%m')
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(data['status'], {PerevalAdded.NEW: 3})
+        self.assertEqual(data['level_spring'], {'1A': 2, '2Б': 1})
+        self.assertEqual(data['beauty_title'], {'пер.': 3})
+        self.assertEqual(data['month'], {month: 3})
+
+    def test_edit_and_delete(self):
+        """Изменение уровня через PATCH и удаление перевала переносят счётчики."""
+        self.client.post(reverse('submit_data_batch'), [pereval_payload(), pereval_payload()], format='json')
+        first, second = PerevalAdded.objects.order_by('id')
+        self.client.patch(
+            reverse('submit_data_update', args=[first.id]), {'level_winter': '3А'}, format='json'
+        )
+        second.delete()
+        data = self.rebuilt()
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['level_winter'], {'3А': 1})
+
+    def test_moderation(self):
+        """Смена статуса очередью модерации учитывается в статистике."""
+        self.client.post(reverse('submit_data_batch'), [pereval_payload() for _ in range(3)], format='json')
+        ids = [pereval.id for pereval in moderation.claim('anna', 3)]
+        moderation.resolve('anna', ids[:2], PerevalAdded.ACCEPTED)
+        moderation.resolve('anna', ids[2:], PerevalAdded.REJECTED)
+        data = self.rebuilt()
+        self.assertEqual(data['status'], {PerevalAdded.ACCEPTED: 2, PerevalAdded.REJECTED: 1})
+
+    def test_rebuild_fixes_drift(self):
+        self.client.post(reverse('submit_data'), pereval_payload(), format='json')
+        PerevalAdded.objects.update(status=PerevalAdded.ACCEPTED, beauty_title='седл.')
+        call_command('rebuild_stats', stdout=io.StringIO())
+        data = self.stats()
+        self.assertEqual(data['status'], {PerevalAdded.ACCEPTED: 1})
+        self.assertEqual(data['beauty_title'], {'седл.': 1})
+
+
+class AreaTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.root = PerevalArea.objects.create(id_parent=0, title='Планета Земля')
+        self.caucasus = PerevalArea.objects.create(id_parent=self.root.id, title='Кавказ')
+        self.elbrus = PerevalArea.objects.create(id_parent=self.caucasus.id, title='Приэльбрусье')
+        self.valley = PerevalArea.objects.create(id_parent=self.elbrus.id, title='Адыл-Су')
+        self.altai = PerevalArea.objects.create(id_parent=self.root.id, title='Алтай')
+
+    def submit(self, area, title):
+        response = self.client.post(
+            reverse('submit_data'), pereval_payload(title=title, area=area.id), format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def passes(self, area):
+        response = self.client.get(reverse('area_passes', args=[area.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['title'] for item in response.json()['results']]
+
+    def closure(self):
+        return set(PerevalAreaClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def test_subtree_passes(self):
+        """Перевалы района включают перевалы всех вложенных районов, новые первыми."""
+        self.submit(self.caucasus, 'Кавказ')
+        self.submit(self.valley, 'Адыл-Су')
+        self.submit(self.altai, 'Алтай')
+        self.assertEqual(self.passes(self.caucasus), ['Адыл-Су', 'Кавказ'])
+        self.assertEqual(self.passes(self.elbrus), ['Адыл-Су'])
+        self.assertEqual(self.passes(self.root), ['Алтай', 'Адыл-Су', 'Кавказ'])
+        self.assertEqual(
+            PerevalAdded.objects.get(title='Адыл-Су').area_id, self.valley.id
+        )
+
+    def test_page_per_area(self):
+        """Страница выбирается по каждому району с LIMIT, а не сортировкой всего поддерева."""
+        self.submit(self.valley, 'Адыл-Су')
+        # Районы поддерева, страницы районов (на PostgreSQL — один UNION ALL), перевалы, изображения
+        self.assertLessEqual(5, settings.PEREVAL_AREA_MERGE_MAX_AREAS)
+        pages = 1 if connection.features.supports_slicing_ordering_in_compound else 5
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('area_passes', args=[self.root.id]), {'page_size': 2})
+        self.assertEqual(len(queries), 1 + pages + 2)
+        keys = [query['sql'] for query in queries if 'perevaladded' in query['sql'] and 'ORDER BY' in query['sql']]
+        self.assertTrue(keys)
+        for sql in keys:
+            self.assertIn('LIMIT 3', sql)
+            self.assertNotIn('perevalareaclosure', sql)
+
+    def test_large_subtree_joined(self):
+        """Поддерево больше PEREVAL_AREA_MERGE_MAX_AREAS выбирается одним запросом через замыкание."""
+        self.submit(self.valley, 'Адыл-Су')
+        with self.settings(PEREVAL_AREA_MERGE_MAX_AREAS=2):
+            # Районы поддерева (не больше трёх), страница, перевалы, изображения
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('area_passes', args=[self.root.id]))
+        self.assertEqual(len(queries), 4)
+        self.assertIn('perevalareaclosure', queries[1]['sql'])
+        self.assertEqual([item['title'] for item in response.json()['results']], ['Адыл-Су'])
+
+    def test_pages_merged_across_areas(self):
+        """Страницы районов сливаются от новых к старым; через замыкание — тот же порядок."""
+        titles = []
+        for i in range(5):
+            titles.append(str(i))
+            self.submit([self.caucasus, self.valley, self.elbrus][i % 3], str(i))
+        for max_areas in [10, 1]:
+            with self.subTest(max_areas=max_areas), self.settings(PEREVAL_AREA_MERGE_MAX_AREAS=max_areas):
+                url, seen = reverse('area_passes', args=[self.caucasus.id]), []
+                params = {'page_size': 2}
+                while url:
+                    response = self.client.get(url, params)
+                    seen += [item['title'] for item in response.json()['results']]
+                    url, params = response.json()['next'], None
+                self.assertEqual(seen, titles[::-1])
+
+    def test_pagination(self):
+        for i in range(3):
+            self.submit(self.valley, str(i))
+        response = self.client.get(reverse('area_passes', args=[self.caucasus.id]), {'page_size': 2})
+        self.assertEqual([item['title'] for item in response.json()['results']], ['2', '1'])
+        response = self.client.get(response.json()['next'])
+        self.assertEqual([item['title'] for item in response.json()['results']], ['0'])
+        self.assertIsNone(response.json()['next'])
+
+    def test_unknown_area(self):
+        response = self.client.get(reverse('area_passes', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_closure(self):
+        """Замыкание содержит все пары предок — потомок с глубиной и совпадает с пересчитанным."""
+        self.assertIn((self.root.id, self.valley.id, 3), self.closure())
+        self.assertIn((self.valley.id, self.valley.id, 0), self.closure())
+        self.assertEqual(len(self.closure()), 5 + 4 + 2 + 1)
+        incremental = self.closure()
+        call_command('rebuild_area_closure', stdout=io.StringIO())
+        self.assertEqual(self.closure(), incremental)
+
+    def test_move_subtree(self):
+        """Перенос района переносит вместе с ним вложенные районы и их перевалы."""
+        self.submit(self.valley, 'Адыл-Су')
+        self.elbrus.id_parent = self.altai.id
+        self.elbrus.save()
+        self.assertEqual(self.passes(self.caucasus), [])
+        self.assertEqual(self.passes(self.altai), ['Адыл-Су'])
+        incremental = self.closure()
+        call_command('rebuild_area_closure', stdout=io.StringIO())
+        self.assertEqual(self.closure(), incremental)
+
+    def test_move_into_own_subtree(self):
+        self.caucasus.id_parent = self.valley.id
+        with self.assertRaises(areas.AreaCycleError):
+            self.caucasus.save()
+
+
+@override_settings(PEREVAL_SYNC_SETTLE_SECONDS=0)
+class SyncTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('sync')
+        self.user = User.objects.create(
+            email='sync@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        self.perevals = [self.create_pereval(f'Перевал {i}') for i in range(3)]
+
+    def create_pereval(self, title):
+        return PerevalAdded.objects.create(
+            user=self.user,
+            coords=Coords.objects.create(latitude=43.0, longitude=42.0, height=3000),
+            beauty_title='пер.',
+            title=title,
+            other_titles=''
+        )
+
+    def sync(self, since=None, **params):
+        params['user__email'] = self.user.email
+        if since:
+            params['since'] = since
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_initial_sync(self):
+        """Первая синхронизация возвращает все перевалы пользователя страницами."""
+        data = self.sync(limit=2)
+        self.assertTrue(data['has_more'])
+        ids = [item['id'] for item in data['changed']]
+        data = self.sync(data['next'], limit=2)
+        self.assertFalse(data['has_more'])
+        ids.extend(item['id'] for item in data['changed'])
+        self.assertEqual(ids, [pereval.id for pereval in self.perevals])
+
+        # Без новых изменений лента пуста
+        data = self.sync(data['next'])
+        self.assertEqual((data['changed'], data['deleted']), ([], []))
+
+    def test_delta_after_changes(self):
+        """После токена возвращаются только изменённые перевалы, в том числе при правке координат."""
+        token = self.sync()['next']
+        first, second, third = self.perevals
+        first.title = 'Новое название'
+        first.save()
+        second.coords.height = 3100
+        second.coords.save()
+
+        data = self.sync(token)
+        self.assertEqual([item['id'] for item in data['changed']], [first.id, second.id])
+        self.assertEqual(data['changed'][1]['coords']['height'], 3100)
+
+    def test_deleted(self):
+        """Удалённые перевалы передаются списком id."""
+        token = self.sync()['next']
+        deleted_id = self.perevals[0].id
+        self.perevals[0].delete()
+
+        data = self.sync(token)
+        self.assertEqual(data['changed'], [])
+        self.assertEqual(data['deleted'], [deleted_id])
+        self.assertEqual(self.sync(data['next'])['deleted'], [])
+
+    def test_settle_horizon(self):
+        """Только что изменённые перевалы отдаются после задержки."""
+        with self.settings(PEREVAL_SYNC_SETTLE_SECONDS=60):
+            data = self.sync()
+        self.assertEqual(data['changed'], [])
+        self.assertEqual(len(self.sync(data['next'])['changed']), 3)
+
+    def test_invalid_params(self):
+        response = self.client.get(self.url, {'user__email': self.user.email, 'since': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'user__email': 'nobody@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ModerationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        user = User.objects.create(
+            email='moderation@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        self.perevals = [
+            PerevalAdded.objects.create(
+                user=user,
+                coords=Coords.objects.create(latitude=43.0, longitude=42.0, height=3000),
+                beauty_title='пер.',
+                title=f'Перевал {i}',
+                other_titles=''
+            )
+            for i in range(5)
+        ]
+        self.ids = [pereval.id for pereval in self.perevals]
+
+    def claim(self, moderator, limit):
+        response = self.client.post(reverse('moderation_claim'), {'moderator': moderator, 'limit': limit}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data]
+
+    def resolve(self, moderator, **decisions):
+        response = self.client.post(reverse('moderation_resolve'), {'moderator': moderator, **decisions}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_moderators_get_disjoint_batches(self):
+        """Модераторы получают разные перевалы, взятые переходят в статус pending."""
+        first = self.claim('anna', 2)
+        second = self.claim('boris', 2)
+        self.assertEqual(first, self.ids[:2])
+        self.assertEqual(second, self.ids[2:4])
+        self.assertEqual(self.claim('vera', 10), self.ids[4:])
+        self.assertEqual(self.claim('vera', 10), [])
+
+        pereval = PerevalAdded.objects.get(id=first[0])
+        self.assertEqual((pereval.status, pereval.claimed_by), (PerevalAdded.PENDING, 'anna'))
+
+    def test_expired_claims_return_to_queue(self):
+        """Непроверенные перевалы снова попадают в очередь после истечения закрепления."""
+        self.claim('anna', 5)
+        with self.settings(PEREVAL_MODERATION_CLAIM_TIMEOUT=-1):
+            self.assertEqual(self.claim('boris', 2), self.ids[:2])
+        # Перевалы, перехваченные другим модератором, прежний модератор решить не может
+        data = self.resolve('anna', accept=self.ids[:3])
+        self.assertEqual((data['accepted'], data['skipped']), (self.ids[2:3], self.ids[:2]))
+
+    def test_bulk_resolve(self):
+        """Пакетное принятие и отклонение меняет статус, updated_at и сбрасывает кэш ответа."""
+        claimed = self.claim('anna', 3)
+        detail_url = reverse('submit_data_detail', args=[claimed[0]])
+        etag = self.client.get(detail_url)['ETag']
+        updated_at = PerevalAdded.objects.get(id=claimed[0]).updated_at
+
+        data = self.resolve('anna', accept=claimed[:2], reject=[claimed[2], self.ids[4]])
+        self.assertEqual(data, {'accepted': claimed[:2], 'rejected': claimed[2:], 'skipped': [self.ids[4]]})
+
+        statuses = dict(PerevalAdded.objects.values_list('id', 'status'))
+        self.assertEqual(
+            [statuses[pk] for pk in self.ids],
+            [PerevalAdded.ACCEPTED, PerevalAdded.ACCEPTED, PerevalAdded.REJECTED, PerevalAdded.NEW, PerevalAdded.NEW]
+        )
+        pereval = PerevalAdded.objects.get(id=claimed[0])
+        self.assertEqual((pereval.claimed_by, pereval.claimed_at), ('', None))
+        self.assertGreater(pereval.updated_at, updated_at)
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['status'], PerevalAdded.ACCEPTED)
+
+    def test_invalid_resolve(self):
+        response = self.client.post(reverse('moderation_resolve'), {'moderator': 'anna'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(
+            reverse('moderation_resolve'), {'moderator': 'anna', 'accept': [1], 'reject': [1]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncReadTests(TestCase):
+    """Асинхронные представления возвращают те же ответы, что и синхронные."""
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        user = User.objects.create(
+            email='async@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        for i in range(3):
+            pereval = PerevalAdded.objects.create(
+                user=user,
+                coords=Coords.objects.create(latitude=43.0 + i, longitude=42.0, height=3000),
+                beauty_title='пер.',
+                title=f'Перевал Эльбрус {i}',
+                other_titles=''
+            )
+            PerevalImage.objects.create(pereval=pereval, data='images/test_image.jpg', title='Фото')
+        self.pereval = pereval
+
+    async def assert_same_response(self, async_view, url, params, **kwargs):
+        await cache.aclear()
+        response = await async_view(self.factory.get(url, params), **kwargs)
+        await cache.aclear()
+        expected = await self.async_client.get(url, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+        return response
+
+    async def test_detail(self):
+        url = reverse('submit_data_detail', args=[self.pereval.id])
+        response = await self.assert_same_response(async_views.pereval_detail, url, {}, id=self.pereval.id)
+        self.assertEqual(response.headers['ETag'], (await self.async_client.get(url)).headers['ETag'])
+
+        request = self.factory.get(url, headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual((await async_views.pereval_detail(request, id=self.pereval.id)).status_code, 304)
+        await self.assert_same_response(
+            async_views.pereval_detail, reverse('submit_data_detail', args=[0]), {}, id=0
+        )
+
+    async def test_list(self):
+        url = reverse('submit_data_list')
+        response = await self.assert_same_response(
+            async_views.pereval_list, url, {'user__email': 'async@example.com', 'page_size': 2}
+        )
+        self.assertIsNotNone(json.loads(response.content)['next'])
+        await self.assert_same_response(async_views.pereval_list, url, {'user__email': 'async@example.com', 'cursor': 'x'})
+        await self.assert_same_response(async_views.pereval_list, url, {'user__email': 'nobody@example.com'})
+
+    async def test_search(self):
+        url = reverse('submit_data_search')
+        response = await self.assert_same_response(async_views.pereval_search, url, {'q': 'эльбрус', 'page_size': 2})
+        self.assertEqual(len(json.loads(response.content)['results']), 2)
+        await self.assert_same_response(async_views.pereval_search, url, {})
+
+
+class GenerateDatasetTests(TestCase):
+    def setUp(self):
+        self.media_root = use_temp_media(self)
+
+    def generate(self, **options):
+        call_command('generate_dataset', users=5, passes=30, distinct_images=3, areas=2, stdout=io.StringIO(), **options)
+
+    def test_generate(self):
+        """Команда создаёт пользователей, перевалы с координатами, изображения и дерево районов."""
+        self.generate()
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(PerevalAdded.objects.count(), 30)
+        self.assertEqual(Coords.objects.count(), 30)
+        self.assertEqual(PerevalArea.objects.filter(id_parent=0).count(), 1)
+        self.assertEqual(PerevalArea.objects.count(), 1 + 6 + 6 * 2)
+        self.assertTrue(SprActivitiesType.objects.exists())
+
+        images = PerevalImage.objects.all()
+        self.assertTrue(images.exists())
+        self.assertEqual(sum(ImageBlob.objects.values_list('ref_count', flat=True)), images.count())
+
+        # Сгенерированные перевалы находятся поиском и по координатам
+        response = APIClient().get(reverse('submit_data_bbox'), {
+            'lat_min': 30, 'lat_max': 70, 'lon_min': 30, 'lon_max': 100
+        })
+        self.assertEqual(len(response.data['results']), 30)
+
+    def test_reproducible(self):
+        """С одинаковым seed данные совпадают."""
+        def snapshot():
+            return list(PerevalAdded.objects.order_by('id').values_list(
+                'title', 'status', 'user__email', 'coords__latitude', 'coords__longitude'
+            ))
+
+        self.generate(seed=7)
+        first = snapshot()
+        for model in [PerevalAdded, User, PerevalArea, SprActivitiesType]:
+            model.objects.all().delete()
+        self.generate(seed=7)
+        self.assertEqual(snapshot(), first)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.addCleanup(registry.clear)
+        user = User.objects.create(
+            email='metrics@example.com', last_name='Иванов', first_name='Иван', middle_name='Иванович', phone='1'
+        )
+        self.pereval = PerevalAdded.objects.create(
+            user=user,
+            coords=Coords.objects.create(latitude=43.0, longitude=42.0, height=3000),
+            beauty_title='пер.',
+            title='Перевал',
+            other_titles=''
+        )
+
+    def metrics(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if line and not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_request_metrics(self):
+        """Время ответа, запросы к БД и размер ответа записываются с именем эндпоинта."""
+        cache.clear()
+        url = reverse('submit_data_detail', args=[self.pereval.id])
+        body = self.client.get(url).content
+        self.client.get(url)
+        self.client.get('/api/missing/')
+
+        samples = self.metrics()
+        labels = 'endpoint="submit_data_detail",method="GET"'
+        self.assertEqual(samples[f'pereval_http_requests_total{{{labels},status="2xx"}}'], 2)
+        self.assertEqual(samples[f'pereval_http_request_duration_seconds_count{{{labels}}}'], 2)
+        self.assertEqual(samples[f'pereval_http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'], 2)
+        # Второй ответ взят из кэша: запросы к БД (перевал и изображения) только у первого
+        self.assertEqual(samples[f'pereval_db_queries_total{{{labels}}}'], 2)
+        self.assertGreater(samples[f'pereval_db_query_seconds_total{{{labels}}}'], 0)
+        self.assertEqual(samples[f'pereval_http_response_size_bytes_sum{{{labels}}}'], 2 * len(body))
+        self.assertEqual(samples['pereval_http_requests_total{endpoint="unmatched",method="GET",status="4xx"}'], 1)
+
+    def test_labels_bounded(self):
+        """Пути, методы и статусы от клиента не создают новых меток."""
+        for i in range(5):
+            self.client.generic(f'METHOD{i}', f'/api/missing/{self.pereval.beauty_title}-{i}/')
+        self.client.get(reverse('submit_data_detail', args=[self.pereval.id + 100]))
+
+        samples = self.metrics()
+        self.assertEqual(samples['pereval_http_requests_total{endpoint="unmatched",method="other",status="4xx"}'], 5)
+        self.assertEqual(samples['pereval_http_requests_total{endpoint="submit_data_detail",method="GET",status="4xx"}'], 1)
+        requests = [name for name in samples if name.startswith('pereval_http_requests_total')]
+        self.assertEqual(len(requests), 2)
+
+    def test_streaming_response(self):
+        """У потоковой выгрузки учитываются запросы к БД и размер, прочитанные во время передачи."""
+        response = self.client.get(reverse('submit_data_export'))
+        size = len(b''.join(response.streaming_content))
+
+        samples = self.metrics()
+        labels = 'endpoint="submit_data_export",method="GET"'
+        self.assertEqual(samples[f'pereval_http_response_size_bytes_sum{{{labels}}}'], size)
+        self.assertGreater(samples[f'pereval_db_queries_total{{{labels}}}'], 0)
+
+    async def test_async_requests(self):
+        """Под ASGI учитываются запросы асинхронного ORM, выполненные в других потоках."""
+        await self.async_client.get(reverse('submit_data_list'), {'user__email': 'metrics@example.com'})
+        samples = await sync_to_async(self.metrics)()
+        self.assertEqual(samples['pereval_db_queries_total{endpoint="submit_data_list",method="GET"}'], 2)
+
+
+class FastReadTests(TestCase):
+    def setUp(self):
+        users = [
+            User.objects.create(
+                email=f'fast{i}@example.com', last_name='Иванов', first_name='Иван', middle_name='', phone=str(i)
+            )
+            for i in range(2)
+        ]
+        for i in range(4):
+            PerevalAdded.objects.create(
+                user=users[i % 2],
+                coords=Coords.objects.create(latitude=43.35 + i / 7, longitude=-42.1, height=3000 + i),
+                beauty_title='пер.',
+                title=f'Перевал «{i}»',
+                other_titles='Другое\nназвание',
+                level_winter='2А',
+            )
+        first, second = PerevalAdded.objects.order_by('id')[:2]
+        PerevalAdded.objects.filter(id=second.id).update(
+            status=PerevalAdded.PENDING, claimed_by='anna', claimed_at=second.datetime,
+            area=PerevalArea.objects.create(id_parent=0, title='Кавказ')
+        )
+        # Без сигналов: файлы изображений для проверки не нужны
+        images = PerevalImage.objects.bulk_create([
+            PerevalImage(pereval=first, data='images/test_image.jpg', title='Фото'),
+            PerevalImage(pereval=first, data=f'images/ab/{"ab" * 32}.jpg', title='По хешу'),
+            PerevalImage(pereval=second, data='images/other.png', title=''),
+        ])
+        PerevalImageVariant.objects.bulk_create([
+            PerevalImageVariant(image=images[0], name=name, format=fmt, file=f'images/variants/{name}.{fmt}', width=1, height=1)
+            for name in ['thumb', 'medium'] for fmt in ['webp', 'jpeg']
+        ])
+
+    def test_same_bytes_as_serializer(self):
+        """Быстрое чтение даёт побайтно тот же JSON, что PerevalAddedSerializer с JSONRenderer."""
+        queryset = PerevalAdded.objects.order_by('id')
+        expected = JSONRenderer().render(PerevalAddedSerializer(queryset.with_related(), many=True).data)
+        with self.assertNumQueries(3):
+            actual = fast_read.render(fast_read.build_perevals(fast_read.pereval_rows(queryset)))
+        self.assertEqual(actual, expected)
+
+    def test_same_bytes_in_current_timezone(self):
+        """Даты выводятся в текущем часовом поясе, как у DRF."""
+        queryset = PerevalAdded.objects.order_by('id')
+        with timezone.override('Asia/Yekaterinburg'):
+            expected = JSONRenderer().render(PerevalAddedSerializer(queryset.with_related(), many=True).data)
+            actual = fast_read.render(fast_read.build_perevals(fast_read.pereval_rows(queryset)))
+        self.assertEqual(actual, expected)
+        self.assertIn(b'+05:00', actual)
+
+    def test_same_bytes_for_edge_values(self):
+        """Малые и большие числа и разделители строк U+2028/U+2029 записываются как у JSONRenderer."""
+        pereval = PerevalAdded.objects.order_by('id').first()
+        Coords.objects.filter(id=pereval.coords_id).update(latitude=0.00001, longitude=1e16)
+        PerevalAdded.objects.update(title='Перевал\u2028\u2029')
+        # С такими числами и без них
+        for queryset in (PerevalAdded.objects.filter(id=pereval.id), PerevalAdded.objects.exclude(id=pereval.id)):
+            expected = JSONRenderer().render(PerevalAddedSerializer(queryset.with_related(), many=True).data)
+            actual = fast_read.render(fast_read.build_perevals(fast_read.pereval_rows(queryset)))
+            self.assertEqual(actual, expected)
+
+    def test_list_matches_serializer(self):
+        """Ответ списка совпадает с сериализатором."""
+        response = self.client.get(reverse('submit_data_list'), {'user__email': 'fast0@example.com'})
+        perevals = PerevalAdded.objects.with_related().filter(user__email='fast0@example.com').order_by('-datetime', '-id')
+        expected = JSONRenderer().render(PerevalAddedSerializer(perevals, many=True).data)
+        self.assertEqual(json.loads(response.content)['results'], json.loads(expected))
@@ -0,0 +1,148 @@
+"""
+Тайлы карты в GeoJSON: GET /tiles/<z>/<x>/<y>.geojson.
+
+Тайлы нумеруются как в OpenStreetMap (проекция Web Mercator, y растёт к югу).
+До масштаба PEREVAL_TILE_CLUSTER_MAX_ZOOM тайл делится на сетку
+PEREVAL_TILE_CLUSTER_GRID × PEREVAL_TILE_CLUSTER_GRID ячеек, и для каждой
+ячейки с перевалами БД возвращает количество и средние координаты одним
+GROUP BY. На крупных масштабах отдаются отдельные перевалы, а если их в тайле
+больше PEREVAL_TILE_MAX_POINTS — тоже кластеры.
+
+Готовые тайлы кэшируются (caching.py). При изменении перевала удаляются
+только тайлы, в которые попадает его точка: по одному-два на каждый масштаб.
+"""
+import math
+from itertools import product
+
+import orjson
+from django.conf import settings
+from django.db.models import Avg, Count, F, Value
+from django.db.models.functions import Floor
+
+from .caching import invalidate_tiles
+from .models import PerevalAdded
+
+# Web Mercator не отображает широты за этими пределами
+MAX_LATITUDE = math.degrees(math.atan(math.sinh(math.pi)))
+# Точка ближе этой доли тайла к его границе проверяется и в соседних тайлах
+EDGE = 1e-6
+
+
+class TileError(ValueError):
+    pass
+
+
+def check_tile(z, x, y):
+    if z > settings.PEREVAL_TILE_MAX_ZOOM:
+        raise TileError(f'Масштаб должен быть не больше {settings.PEREVAL_TILE_MAX_ZOOM}')
+    if x >= 2 ** z or y >= 2 ** z:
+        raise TileError(f'На масштабе {z} номера тайлов от 0 до {2 ** z - 1}')
+
+
+def tile_latitude(y, n):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+
+def tile_bbox(z, x, y):
+    """Границы тайла (lat_min, lat_max, lon_min, lon_max)."""
+    n = 2 ** z
+    return tile_latitude(y + 1, n), tile_latitude(y, n), x / n * 360 - 180, (x + 1) / n * 360 - 180
+
+
+def mercator(latitude, longitude):
+    """Положение точки на карте Web Mercator: доли от 0 до 1 по x (на восток) и y (на юг)."""
+    latitude = min(max(latitude, -MAX_LATITUDE), MAX_LATITUDE)
+    return (longitude + 180) / 360, (1 - math.asinh(math.tan(math.radians(latitude))) / math.pi) / 2
+
+
+def point_tile(latitude, longitude, z):
+    n = 2 ** z
+    fx, fy = mercator(latitude, longitude)
+    return min(max(int(fx * n), 0), n - 1), min(max(int(fy * n), 0), n - 1)
+
+
+def contains(bbox, latitude, longitude):
+    lat_min, lat_max, lon_min, lon_max = bbox
+    return lat_min <= latitude <= lat_max and lon_min <= longitude <= lon_max
+
+
+def tiles_for_point(latitude, longitude):
+    """
+         Тайлы всех масштабов, в которые попадает точка.
+
+         Границы тайла входят в него (как в in_bbox), поэтому точка на границе
+         попадает и в соседний тайл. Границы в градусах считаются только для
+         точек рядом с краем тайла.
+     """
+    fx, fy = mercator(latitude, longitude)
+    tiles = []
+    for z in range(settings.PEREVAL_TILE_MAX_ZOOM + 1):
+        n = 2 ** z
+        x, y = min(max(int(fx * n), 0), n - 1), min(max(int(fy * n), 0), n - 1)
+        if EDGE < fx * n - x < 1 - EDGE and EDGE < fy * n - y < 1 - EDGE:
+            tiles.append((z, x, y))
+            continue
+        for column, row in product((x - 1, x, x + 1), (y - 1, y, y + 1)):
+            if 0 <= column < n and 0 <= row < n and contains(tile_bbox(z, column, row), latitude, longitude):
+                tiles.append((z, column, row))
+    return tiles
+
+
+def invalidate_points(points):
+    """Сбрасывает кэш тайлов для точек [(широта, долгота)] изменённых перевалов."""
+    invalidate_tiles({tile for latitude, longitude in set(points) for tile in tiles_for_point(latitude, longitude)})
+
+
+def feature(latitude, longitude, properties):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [longitude, latitude]},
+        'properties': properties,
+    }
+
+
+def cluster_features(perevals, bbox):
+    lat_min, lat_max, lon_min, lon_max = bbox
+    grid = settings.PEREVAL_TILE_CLUSTER_GRID
+    cells = (
+        perevals.order_by()
+        .annotate(
+            row=Floor((F('coords__latitude') - Value(lat_min)) / Value((lat_max - lat_min) / grid)),
+            column=Floor((F('coords__longitude') - Value(lon_min)) / Value((lon_max - lon_min) / grid)),
+        )
+        .values('row', 'column')
+        .annotate(count=Count('id'), latitude=Avg('coords__latitude'), longitude=Avg('coords__longitude'))
+        .order_by('row', 'column')
+    )
+    return [
+        feature(cell['latitude'], cell['longitude'], {'cluster': True, 'count': cell['count']})
+        for cell in cells
+    ]
+
+
+def point_features(perevals, limit):
+    """Отдельные перевалы или None, если их больше limit."""
+    rows = list(
+        perevals.order_by('id')
+        .values('id', 'title', 'coords__latitude', 'coords__longitude', 'coords__height')[:limit + 1]
+    )
+    if len(rows) > limit:
+        return None
+    return [
+        feature(row['coords__latitude'], row['coords__longitude'], {
+            'cluster': False, 'id': row['id'], 'title': row['title'], 'height': row['coords__height'],
+        })
+        for row in rows
+    ]
+
+
+def render_tile(z, x, y):
+    """Тело GeoJSON тайла."""
+    bbox = tile_bbox(z, x, y)
+    perevals = PerevalAdded.objects.in_bbox(*bbox)
+    features = None
+    if z > settings.PEREVAL_TILE_CLUSTER_MAX_ZOOM:
+        features = point_features(perevals, settings.PEREVAL_TILE_MAX_POINTS)
+    if features is None:
+        features = cluster_features(perevals, bbox)
+    return orjson.dumps({'type': 'FeatureCollection', 'features': features})
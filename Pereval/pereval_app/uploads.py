@@ -0,0 +1,148 @@
+"""
+Докачиваемая загрузка изображений частями.
+
+Клиент создаёт сессию (UploadSession), отправляет части файла с указанием
+смещения и после последней части завершает загрузку. Части пишутся сразу
+в файл uploads/<id>.part в хранилище медиафайлов, тело запроса целиком
+в памяти не держится. При завершении файл сохраняется в images/ под именем
+по хешу содержимого (см. storage.py) и прикрепляется к перевалу как PerevalImage.
+
+Используется локальное файловое хранилище (FileSystemStorage).
+"""
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from PIL import Image
+
+from .models import PerevalImage, UploadSession
+from .storage import image_storage
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+# Расширение файла по формату, который определил Pillow
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+class UploadError(Exception):
+    """Ошибка загрузки; status — HTTP статус ответа клиенту."""
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def parse_content_range(header, session):
+    """Начало и длина части из заголовка Content-Range: bytes <start>-<end>/<size>."""
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise UploadError('Ожидается заголовок Content-Range: bytes <start>-<end>/<size>', 400)
+    start, end, total = match.groups()
+    start, end = int(start), int(end)
+    if end < start or end >= session.size or (total != '*' and int(total) != session.size):
+        raise UploadError('Content-Range не соответствует размеру файла', 416)
+    return start, end - start + 1
+
+
+def copy_blocks(source, target, length):
+    """Копирует до length байт блоками PEREVAL_UPLOAD_BLOCK_SIZE; возвращает число скопированных."""
+    copied = 0
+    while copied < length:
+        block = source.read(min(settings.PEREVAL_UPLOAD_BLOCK_SIZE, length - copied))
+        if not block:
+            break
+        target.write(block)
+        copied += len(block)
+    return copied
+
+
+def write_chunk(session, start, length, stream):
+    """
+         Дописывает часть файла из потока запроса и возвращает новое смещение сессии.
+
+         Часть должна начинаться с текущего смещения. Если соединение оборвалось,
+         засчитываются байты, которые успели прийти, — клиент продолжит с них.
+         Тело запроса сначала читается во временный файл вне транзакции, чтобы
+         медленный клиент не держал блокировку и соединение с БД. Затем под
+         блокировкой строки сессии смещение проверяется ещё раз и часть переносится
+         в файл загрузки: параллельный или повторный запрос с тем же смещением
+         получает 409, не трогая файл.
+     """
+    if start != session.received:
+        raise UploadError(f'Ожидается часть со смещения {session.received}', 409)
+
+    with tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR) as chunk:
+        written = copy_blocks(stream, chunk, length)
+        chunk.seek(0)
+
+        with transaction.atomic():
+            received = UploadSession.objects.select_for_update().filter(id=session.id).values_list(
+                'received', flat=True
+            ).first()
+            if received is None:
+                raise UploadError('Сессия загрузки не найдена', 404)
+            session.received = received
+            if start != session.received:
+                raise UploadError(f'Ожидается часть со смещения {session.received}', 409)
+
+            path = image_storage.path(session.part_name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as file:
+                file.seek(start)
+                copy_blocks(chunk, file, written)
+                file.truncate()
+            UploadSession.objects.filter(id=session.id, received=start).update(received=start + written)
+
+    session.received = start + written
+    return session.received
+
+
+class PartFile(File):
+    """Загруженный файл сессии: хранилище переносит его в images/ без копирования (см. storage.py)."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def finalize_upload(session, pereval, title):
+    """
+         Проверяет загруженный файл, переносит его в images/ и прикрепляет к перевалу.
+
+         Сессия блокируется до конца: параллельное завершение той же загрузки
+         дожидается первого и получает 404, так как сессии уже нет.
+     """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().filter(id=session.id).first()
+        if session is None:
+            raise UploadError('Сессия загрузки не найдена', 404)
+        if session.received != session.size:
+            raise UploadError(f'Загружено {session.received} из {session.size} байт', 409)
+
+        path = image_storage.path(session.part_name)
+        try:
+            with Image.open(path) as image:
+                image.verify()
+                image_format = image.format
+        except Exception:
+            raise UploadError('Файл не является изображением', 400)
+
+        # Файл сохраняется по хешу: если такое изображение уже есть, хранилище защищает его
+        # от gc_blobs, а загруженная копия удаляется. Расширение — по содержимому, а не по имени от клиента
+        extension = FORMAT_EXTENSIONS.get(image_format, image_format.lower())
+        with open(path, 'rb') as file:
+            name = image_storage.save(f'images/image.{extension}', PartFile(file))
+        if os.path.exists(path):
+            os.remove(path)
+
+        image = PerevalImage.objects.create(pereval=pereval, data=name, title=title)
+        session.delete()
+    return image
+
+
+def delete_session(session):
+    """Удаляет сессию вместе с недокачанным файлом."""
+    if image_storage.exists(session.part_name):
+        image_storage.delete(session.part_name)
+    session.delete()
@@ -1,9 +1,54 @@
+from django.conf import settings
 from django.urls import path
-from .views import SubmitDataView, SubmitDataDetailView, SubmitDataUpdateView, SubmitDataListView
+from . import async_views
+from .views import (
+    SubmitDataView,
+    SubmitDataBatchView,
+    SubmitDataDetailView,
+    SubmitDataUpdateView,
+    SubmitDataListView,
+    SubmitDataExportView,
+    SubmitDataNearbyView,
+    SubmitDataBboxView,
+    SubmitDataSearchView,
+    AreaPassesView,
+    StatsView,
+    TileView,
+    SyncView,
+    ModerationClaimView,
+    ModerationResolveView,
+    UploadSessionCreateView,
+    UploadSessionView,
+    UploadSessionFinalizeView,
+)
+
+# Под ASGI чтение перевала, списка и поиск обслуживают асинхронные представления
+if settings.PEREVAL_ASYNC_READS:
+    detail_view = async_views.pereval_detail
+    list_view = async_views.pereval_list
+    search_view = async_views.pereval_search
+else:
+    detail_view = SubmitDataDetailView.as_view()
+    list_view = SubmitDataListView.as_view()
+    search_view = SubmitDataSearchView.as_view()
 
 urlpatterns = [
     path('submitData/', SubmitDataView.as_view(), name='submit_data'),
-    path('submitData/<int:id>/', SubmitDataDetailView.as_view(), name='submit_data_detail'),
+    path('submitData/batch/', SubmitDataBatchView.as_view(), name='submit_data_batch'),
+    path('submitData/<int:id>/', detail_view, name='submit_data_detail'),
     path('submitData/<int:id>/edit/', SubmitDataUpdateView.as_view(), name='submit_data_update'),
-    path('submitData/list/', SubmitDataListView.as_view(), name='submit_data_list')
+    path('submitData/list/', list_view, name='submit_data_list'),
+    path('submitData/export/', SubmitDataExportView.as_view(), name='submit_data_export'),
+    path('submitData/nearby/', SubmitDataNearbyView.as_view(), name='submit_data_nearby'),
+    path('submitData/bbox/', SubmitDataBboxView.as_view(), name='submit_data_bbox'),
+    path('submitData/search/', search_view, name='submit_data_search'),
+    path('areas/<int:id>/passes/', AreaPassesView.as_view(), name='area_passes'),
+    path('stats/', StatsView.as_view(), name='stats'),
+    path('tiles/<int:z>/<int:x>/<int:y>.geojson', TileView.as_view(), name='tile'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('moderation/claim/', ModerationClaimView.as_view(), name='moderation_claim'),
+    path('moderation/resolve/', ModerationResolveView.as_view(), name='moderation_resolve'),
+    path('uploads/', UploadSessionCreateView.as_view(), name='upload_create'),
+    path('uploads/<uuid:id>/', UploadSessionView.as_view(), name='upload_session'),
+    path('uploads/<uuid:id>/finalize/', UploadSessionFinalizeView.as_view(), name='upload_finalize'),
 ]
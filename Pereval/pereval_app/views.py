@@ -1,17 +1,60 @@
+import heapq
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import PerevalAdded
-from .serializers import PerevalAddedSerializer
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import replace_query_param
+from .models import PerevalAdded, PerevalArea, UploadSession, User
+from .serializers import (
+    PerevalAddedSerializer,
+    NearbyQuerySerializer,
+    BboxQuerySerializer,
+    SearchQuerySerializer,
+    SyncQuerySerializer,
+    ModerationClaimSerializer,
+    ModerationResolveSerializer,
+    UploadSessionSerializer,
+    UploadFinalizeSerializer,
+)
+from .pagination import PerevalCursorPagination
+from .export import EXPORT_FORMATS, iter_export
+from . import fast_read, geo
+from .search import search_ids
+from .caching import get_detail, get_tile, set_detail, set_tile
+from .idempotency import idempotent
+from .parsers import StreamingJSONParser
+from .sync import InvalidToken, build_feed
+from . import areas, moderation, stats, tiles
+from .uploads import UploadError, parse_content_range, write_chunk, finalize_upload, delete_session
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
+IDEMPOTENCY_KEY_PARAMETER = openapi.Parameter(
+    name="Idempotency-Key",
+    in_=openapi.IN_HEADER,
+    type=openapi.TYPE_STRING,
+    description="Ключ для безопасного повтора запроса: повтор с тем же ключом возвращает сохранённый ответ"
+                " без повторного добавления"
+)
+
+
 class SubmitDataView(APIView):
+    # Изображения base64 из JSON декодируются во временные файлы по ходу чтения тела
+    parser_classes = [StreamingJSONParser, FormParser, MultiPartParser]
+
     @swagger_auto_schema(
          operation_summary="Добавить новый перевал",
          operation_description="Создание нового объекта перевала. "
-         "Пользователь передаёт данные перевала, координаты, уровень сложности и изображения.",
+         "Пользователь передаёт данные перевала, координаты, уровень сложности и изображения. "
+         "В JSON изображение images[].data передаётся строкой base64 (допускается префикс data:<тип>;base64,).",
          request_body=PerevalAddedSerializer,
+         manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
          responses={
              200: openapi.Response(description="Успешное добавление", examples={
                  "application/json": {
@@ -21,9 +64,11 @@ class SubmitDataView(APIView):
                  }
              }),
              400: openapi.Response(description="Ошибка валидации"),
+             422: openapi.Response(description="Idempotency-Key уже использован для другого запроса"),
              500: openapi.Response(description="Внутренняя ошибка сервера"),
          }
     )
+    @idempotent
     def post(self, request):
         try:
             serializer = PerevalAddedSerializer(data=request.data)
@@ -47,6 +92,15 @@ class SubmitDataView(APIView):
                     },
                     status=status.HTTP_400_BAD_REQUEST
                 )
+        except ParseError as e:
+            return Response(
+                {
+                    "status": 400,
+                    "message": str(e.detail),
+                    "id": None
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             return Response(
                 {
@@ -58,25 +112,117 @@ class SubmitDataView(APIView):
             )
 
 
+class SubmitDataBatchView(APIView):
+    @swagger_auto_schema(
+         operation_summary="Добавить пакет перевалов",
+         operation_description="Создание нескольких перевалов одним запросом. "
+         "Каждый элемент списка валидируется отдельно, корректные перевалы сохраняются в одной транзакции. "
+         "Для каждого элемента возвращается id или ошибки валидации.",
+         request_body=PerevalAddedSerializer(many=True),
+         manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
+         responses={
+             201: openapi.Response(description="Все перевалы добавлены", examples={
+                 "application/json": {
+                     "status": 201,
+                     "message": None,
+                     "results": [
+                         {"status": 200, "message": None, "id": 42},
+                         {"status": 200, "message": None, "id": 43}
+                     ]
+                 }
+             }),
+             207: openapi.Response(description="Добавлена часть перевалов"),
+             400: openapi.Response(description="Ошибка валидации"),
+             422: openapi.Response(description="Idempotency-Key уже использован для другого запроса"),
+             500: openapi.Response(description="Внутренняя ошибка сервера"),
+         }
+    )
+    @idempotent
+    def post(self, request):
+        items = request.data
+        max_size = settings.PEREVAL_BATCH_MAX_SIZE
+
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"status": 400, "message": "Ожидается непустой список перевалов", "results": []},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > max_size:
+            return Response(
+                {"status": 400, "message": f"Максимальный размер пакета: {max_size}", "results": []},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            item_serializers = [PerevalAddedSerializer(data=item) for item in items]
+            valid = [serializer for serializer in item_serializers if serializer.is_valid()]
+
+            # Все корректные перевалы сохраняются одной пачкой
+            perevals = iter(PerevalAddedSerializer(many=True).create([s.validated_data for s in valid]))
+
+            results = []
+            for serializer in item_serializers:
+                if not serializer.errors:
+                    results.append({"status": 200, "message": None, "id": next(perevals).id})
+                else:
+                    results.append({
+                        "status": 400,
+                        "message": "Ошибка валидации данных",
+                        "errors": serializer.errors,
+                        "id": None
+                    })
+        except Exception as e:
+            return Response(
+                {"status": 500, "message": f"Ошибка сервера: {str(e)}", "results": []},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        if len(valid) == len(item_serializers):
+            response_status = status.HTTP_201_CREATED
+        elif valid:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+
+        return Response(
+            {"status": response_status, "message": None, "results": results},
+            status=response_status
+        )
+
+
 class SubmitDataDetailView(APIView):
     @swagger_auto_schema(
          operation_summary="Получить перевал по ID",
-         operation_description="Возвращает объект перевала с указанным id. Включает координаты, уровень сложности, пользователя, статус модерации и изображения.",
+         operation_description="Возвращает объект перевала с указанным id. Включает координаты, уровень сложности, пользователя, статус модерации и изображения."
+                               " Ответ содержит ETag; при совпадении с заголовком If-None-Match возвращается 304.",
          responses={
              200: PerevalAddedSerializer,
+             304: openapi.Response(description="Перевал не изменился"),
              404: openapi.Response(description="Запись не найдена"),
          }
     )
     def get(self, request, id):
-        try:
-            pereval = PerevalAdded.objects.get(id=id)
-            serializer = PerevalAddedSerializer(pereval)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except PerevalAdded.DoesNotExist:
-            return Response(
-                {"message": "Запись не найдена", "status": 404},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        cached, version = get_detail(id)
+        if cached is None:
+            try:
+                pereval = PerevalAdded.objects.with_related().get(id=id)
+            except PerevalAdded.DoesNotExist:
+                return Response(
+                    {"message": "Запись не найдена", "status": 404},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            body = JSONRenderer().render(PerevalAddedSerializer(pereval).data)
+            etag = set_detail(id, body, version)
+        else:
+            body, etag = cached
+
+        # Клиент уже получал эту версию перевала
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        return response
 
 
 class SubmitDataUpdateView(APIView):
@@ -92,7 +238,7 @@ class SubmitDataUpdateView(APIView):
     )
     def patch(self, request, id):
         try:
-            pereval = PerevalAdded.objects.get(id=id)
+            pereval = PerevalAdded.objects.select_related('user', 'coords').get(id=id)
         except PerevalAdded.DoesNotExist:
             return Response(
                 {"state": 0, "message": "Запись не найдена."},
@@ -126,7 +272,8 @@ class SubmitDataListView(APIView):
     @swagger_auto_schema(
          operation_summary="Получить список перевалов по email",
          operation_description="Передай параметр user__email в строке запроса: http://127.0.0.1:8000/api/submitData/?user__email=qwerty@mail.ru"
-                               " Возвращает список перевалов, отправленных этим пользователем.",
+                               " Возвращает список перевалов, отправленных этим пользователем, страницами от новых к старым."
+                               " Ссылка на следующую страницу передаётся в поле next.",
          manual_parameters=[
              openapi.Parameter(
                  name="user__email",
@@ -134,11 +281,28 @@ class SubmitDataListView(APIView):
                  type=openapi.TYPE_STRING,
                  description="Email пользователя, по которому фильтруются перевалы",
                  required=True
+             ),
+             openapi.Parameter(
+                 name="cursor",
+                 in_=openapi.IN_QUERY,
+                 type=openapi.TYPE_STRING,
+                 description="Курсор следующей страницы из поля next предыдущего ответа"
+             ),
+             openapi.Parameter(
+                 name="page_size",
+                 in_=openapi.IN_QUERY,
+                 type=openapi.TYPE_INTEGER,
+                 description="Количество перевалов на странице"
              )
          ],
          responses={
-             200: PerevalAddedSerializer(many=True),
-             400: openapi.Response(description="Не указан email"),
+             200: openapi.Response(description="Страница перевалов", examples={
+                 "application/json": {
+                     "next": "http://127.0.0.1:8000/api/submitData/list/?user__email=qwerty@mail.ru&cursor=...",
+                     "results": []
+                 }
+             }),
+             400: openapi.Response(description="Не указан email или некорректный курсор"),
              404: openapi.Response(description="Записи не найдены"),
          }
      )
@@ -157,19 +321,540 @@ class SubmitDataListView(APIView):
             # Фильтруем записи по email пользователя
             perevals = PerevalAdded.objects.filter(user__email=email)
 
+            # Выбираем страницу по курсору; строки читаются без создания моделей (fast_read.py)
+            paginator = PerevalCursorPagination()
+            page = paginator.set_page(fast_read.pereval_rows(paginator.page_queryset(perevals, request)))
+
             # Если записи не найдены, возвращаем пустой список
-            if not perevals.exists():
+            if not page and 'cursor' not in request.query_params:
                 return Response(
                     {"message": "Нет записей для указанного пользователя", "status": 404},
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            # Сериализуем найденные записи
-            serializer = PerevalAddedSerializer(perevals, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            body = {"next": paginator.get_next_link(), "results": fast_read.build_perevals(page)}
+            return HttpResponse(fast_read.render(body), content_type='application/json')
 
+        except ValidationError as e:
+            return Response(
+                {"message": e.detail, "status": 400},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             return Response(
                 {"message": f"Ошибка сервера: {str(e)}", "status": 500},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+
+class SubmitDataExportView(APIView):
+    @swagger_auto_schema(
+         operation_summary="Выгрузить все перевалы",
+         operation_description="Потоковая выгрузка всех перевалов с пользователями, координатами и изображениями. "
+                               "Формат задаётся параметром output: ndjson (по умолчанию) или csv.",
+         manual_parameters=[
+             openapi.Parameter(
+                 name="output",
+                 in_=openapi.IN_QUERY,
+                 type=openapi.TYPE_STRING,
+                 enum=sorted(EXPORT_FORMATS),
+                 description="Формат выгрузки"
+             )
+         ],
+         responses={
+             200: openapi.Response(description="Файл выгрузки"),
+             400: openapi.Response(description="Неизвестный формат"),
+         }
+    )
+    def get(self, request):
+        export_format = request.query_params.get('output', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"message": f"Неизвестный формат выгрузки: {export_format}", "status": 400},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Строки отдаются по мере чтения из БД, вся выгрузка в памяти не собирается
+        response = StreamingHttpResponse(
+            iter_export(export_format),
+            content_type=f'{EXPORT_FORMATS[export_format]}; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="perevals.{export_format}"'
+        return response
+
+
+
+class SubmitDataNearbyView(APIView):
+    @swagger_auto_schema(
+         operation_summary="Найти перевалы рядом с точкой",
+         operation_description="Возвращает перевалы в радиусе radius_km километров от точки (lat, lon), "
+                               "отсортированные по расстоянию. Расстояние до точки передаётся в поле distance_km.",
+         query_serializer=NearbyQuerySerializer,
+         responses={
+             200: openapi.Response(description="Перевалы рядом с точкой"),
+             400: openapi.Response(description="Некорректные параметры"),
+         }
+    )
+    def get(self, request):
+        query = NearbyQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(
+                {"message": query.errors, "status": 400},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        lat, lon = query.validated_data['lat'], query.validated_data['lon']
+        radius_km = query.validated_data['radius_km']
+
+        # Кандидаты из описанного прямоугольника, затем точная проверка расстояния
+        # Расстояния считаются по одним координатам, полные записи загружаются только для первых limit
+        candidates = PerevalAdded.objects.in_bbox(*geo.bbox_around(lat, lon, radius_km)).values_list(
+            'id', 'coords__latitude', 'coords__longitude'
+        )
+        nearby = []
+        for pereval_id, latitude, longitude in candidates.iterator():
+            distance = geo.haversine_km(lat, lon, latitude, longitude)
+            if distance <= radius_km:
+                nearby.append((distance, pereval_id))
+        nearby = heapq.nsmallest(query.validated_data['limit'], nearby)
+
+        perevals = PerevalAdded.objects.with_related().in_bulk([pereval_id for _, pereval_id in nearby])
+        # Перевал мог быть удалён между запросами
+        nearby = [(distance, perevals[pereval_id]) for distance, pereval_id in nearby if pereval_id in perevals]
+
+        results = PerevalAddedSerializer([pereval for _, pereval in nearby], many=True).data
+        for data, (distance, _) in zip(results, nearby):
+            data['distance_km'] = round(distance, 3)
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+class SubmitDataBboxView(APIView):
+    @swagger_auto_schema(
+         operation_summary="Найти перевалы в прямоугольной области",
+         operation_description="Возвращает перевалы, координаты которых лежат в заданных границах широты и долготы.",
+         query_serializer=BboxQuerySerializer,
+         responses={
+             200: openapi.Response(description="Перевалы в области"),
+             400: openapi.Response(description="Некорректные параметры"),
+         }
+    )
+    def get(self, request):
+        query = BboxQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(
+                {"message": query.errors, "status": 400},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        data = query.validated_data
+
+        perevals = PerevalAdded.objects.with_related().in_bbox(
+            data['lat_min'], data['lat_max'], data['lon_min'], data['lon_max']
+        ).order_by('id')[:data['limit']]
+        serializer = PerevalAddedSerializer(perevals, many=True)
+        return Response({"results": serializer.data}, status=status.HTTP_200_OK)
+
+
+
+class SubmitDataSearchView(APIView):
+    @swagger_auto_schema(
+         operation_summary="Полнотекстовый поиск перевалов",
+         operation_description="Ищет перевалы по названию, другим названиям и типу местности. "
+                               "Результаты отсортированы по релевантности, ссылка на следующую страницу "
+                               "передаётся в поле next.",
+         query_serializer=SearchQuerySerializer,
+         responses={
+             200: openapi.Response(description="Найденные перевалы", examples={
+                 "application/json": {
+                     "next": "http://127.0.0.1:8000/api/submitData/search/?q=эльбрус&page=2",
+                     "results": []
+                 }
+             }),
+             400: openapi.Response(description="Некорректные параметры"),
+         }
+    )
+    def get(self, request):
+        query = SearchQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(
+                {"message": query.errors, "status": 400},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        data = query.validated_data
+        page_size = min(data.get('page_size', settings.PEREVAL_LIST_PAGE_SIZE), settings.PEREVAL_LIST_MAX_PAGE_SIZE)
+
+        # Лишняя запись показывает, есть ли следующая страница
+        ids = search_ids(data['q'], limit=page_size + 1, offset=(data['page'] - 1) * page_size)
+        next_link = None
+        if len(ids) > page_size:
+            next_link = replace_query_param(request.build_absolute_uri(), 'page', data['page'] + 1)
+
+        ids = ids[:page_size]
+        rows = fast_read.rows_in_order(fast_read.pereval_rows(PerevalAdded.objects.filter(id__in=ids)), ids)
+        body = {"next": next_link, "results": fast_read.build_perevals(rows)}
+        return HttpResponse(fast_read.render(body), content_type='application/json')
+
+
+class AreaPassesView(APIView):
+    @swagger_auto_schema(
+         operation_summary="Перевалы района вместе с вложенными районами",
+         operation_description="Возвращает перевалы района с указанным id и всех районов внутри него на любой глубине, "
+                               "страницами от новых к старым. Ссылка на следующую страницу передаётся в поле next.",
+         manual_parameters=[
+             openapi.Parameter(
+                 name="cursor",
+                 in_=openapi.IN_QUERY,
+                 type=openapi.TYPE_STRING,
+                 description="Курсор следующей страницы из поля next предыдущего ответа"
+             ),
+             openapi.Parameter(
+                 name="page_size",
+                 in_=openapi.IN_QUERY,
+                 type=openapi.TYPE_INTEGER,
+                 description="Количество перевалов на странице"
+             )
+         ],
+         responses={
+             200: openapi.Response(description="Страница перевалов района", examples={
+                 "application/json": {
+                     "next": "http://127.0.0.1:8000/api/areas/2/passes/?cursor=...",
+                     "results": []
+                 }
+             }),
+             400: openapi.Response(description="Некорректный курсор или размер страницы"),
+             404: openapi.Response(description="Район не найден"),
+         }
+    )
+    def get(self, request, id):
+        try:
+            paginator = PerevalCursorPagination()
+            ids = [key['id'] for key in areas.page_keys(id, paginator, request)]
+        except PerevalArea.DoesNotExist:
+            return Response(
+                {"message": "Район не найден", "status": 404},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except ValidationError as e:
+            return Response(
+                {"message": e.detail, "status": 400},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = fast_read.pereval_rows(PerevalAdded.objects.filter(id__in=ids)) if ids else []
+        page = fast_read.rows_in_order(rows, ids)
+        body = {"next": paginator.get_next_link(), "results": fast_read.build_perevals(page)}
+        return HttpResponse(fast_read.render(body), content_type='application/json')
+
+
+class TileView(APIView):
+    @swagger_auto_schema(
+         operation_summary="Тайл карты перевалов в GeoJSON",
+         operation_description="Возвращает перевалы тайла z/x/y (нумерация OpenStreetMap) как FeatureCollection. "
+                               "На мелких масштабах — кластеры с количеством перевалов (properties.count) в средней "
+                               "точке, на крупных — отдельные перевалы. Ответ содержит ETag; при совпадении с "
+                               "заголовком If-None-Match возвращается 304.",
+         responses={
+             200: openapi.Response(description="Тайл", examples={
+                 "application/geo+json": {
+                     "type": "FeatureCollection",
+                     "features": [{
+                         "type": "Feature",
+                         "geometry": {"type": "Point", "coordinates": [42.5, 43.2]},
+                         "properties": {"cluster": True, "count": 12}
+                     }]
+                 }
+             }),
+             304: openapi.Response(description="Тайл не изменился"),
+             400: openapi.Response(description="Некорректный номер тайла"),
+         }
+    )
+    def get(self, request, z, x, y):
+        try:
+            tiles.check_tile(z, x, y)
+        except tiles.TileError as error:
+            return Response(
+                {"message": str(error), "status": 400},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cached = get_tile(z, x, y)
+        if cached is None:
+            body = tiles.render_tile(z, x, y)
+            etag = set_tile(z, x, y, body)
+        else:
+            body, etag = cached
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(body, content_type='application/geo+json')
+        response['ETag'] = etag
+        return response
+
+
+class StatsView(APIView):
+    @swagger_auto_schema(
+         operation_summary="Статистика перевалов",
+         operation_description="Количество перевалов по статусу, уровням сложности по сезонам, типу местности "
+                               "и месяцу отправки. Счётчики обновляются при каждом изменении перевалов, "
+                               "поэтому ответ не зависит от количества перевалов.",
+         responses={
+             200: openapi.Response(description="Статистика", examples={
+                 "application/json": {
+                     "total": 3,
+                     "status": {"AC": 1, "NE": 2},
+                     "level_spring": {"": 1, "1A": 2},
+                     "level_summer": {"1A": 3},
+                     "level_autumn": {"1A": 3},
+                     "level_winter": {"2A": 3},
+                     "beauty_title": {"пер.": 3},
+                     "month": {"2025-06": 1, "2025-07": 2}
+                 }
+             }),
+         }
+    )
+    def get(self, request):
+        return Response(stats.summary())
+
+
+class SyncView(APIView):
+    @swagger_auto_schema(
+         operation_summary="Изменения перевалов пользователя для офлайн-клиента",
+         operation_description="Возвращает перевалы пользователя, изменённые после токена since, и id удалённых перевалов. "
+                               "Токен из поля next передаётся в следующем запросе; пока has_more равно true, "
+                               "изменения ещё есть. Без since возвращаются все перевалы пользователя.",
+         query_serializer=SyncQuerySerializer,
+         responses={
+             200: openapi.Response(description="Изменения", examples={
+                 "application/json": {
+                     "changed": [],
+                     "deleted": [12],
+                     "next": "eyJjaGFuZ2VkIjogbnVsbCwgImRlbGV0ZWQiOiBudWxsfQ==",
+                     "has_more": False
+                 }
+             }),
+             400: openapi.Response(description="Некорректные параметры или токен"),
+         }
+    )
+    def get(self, request):
+        query = SyncQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(
+                {"message": query.errors, "status": 400},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        data = query.validated_data
+        limit = min(data.get('limit', settings.PEREVAL_LIST_PAGE_SIZE), settings.PEREVAL_LIST_MAX_PAGE_SIZE)
+
+        user = User.objects.filter(email=data['user__email']).first()
+        if user is None:
+            return Response(
+                {"message": "Пользователь не найден", "status": 404},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        try:
+            feed = build_feed(user, data.get('since'), limit)
+        except InvalidToken as error:
+            return Response(
+                {"message": str(error), "status": 400},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            "changed": PerevalAddedSerializer(feed['changed'], many=True).data,
+            "deleted": feed['deleted'],
+            "next": feed['token'],
+            "has_more": feed['has_more'],
+        }, status=status.HTTP_200_OK)
+
+
+class ModerationClaimView(APIView):
+    @swagger_auto_schema(
+         operation_summary="Взять перевалы на модерацию",
+         operation_description="Закрепляет за модератором пачку новых перевалов и переводит их в статус 'pending'. "
+                               "Параллельные модераторы получают разные перевалы. Непроверенные перевалы "
+                               "возвращаются в очередь по истечении времени закрепления.",
+         request_body=ModerationClaimSerializer,
+         responses={
+             200: PerevalAddedSerializer(many=True),
+             400: openapi.Response(description="Ошибка валидации"),
+         }
+    )
+    def post(self, request):
+        serializer = ModerationClaimSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {"message": serializer.errors, "status": 400},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        data = serializer.validated_data
+        limit = min(data.get('limit', settings.PEREVAL_MODERATION_BATCH_SIZE), settings.PEREVAL_LIST_MAX_PAGE_SIZE)
+
+        perevals = moderation.claim(data['moderator'], limit)
+        return Response(PerevalAddedSerializer(perevals, many=True).data, status=status.HTTP_200_OK)
+
+
+class ModerationResolveView(APIView):
+    @swagger_auto_schema(
+         operation_summary="Принять или отклонить перевалы",
+         operation_description="Переводит взятые модератором перевалы в статус 'accepted' или 'rejected'. "
+                               "Перевалы, закреплённые за другим модератором, пропускаются и возвращаются в поле skipped.",
+         request_body=ModerationResolveSerializer,
+         responses={
+             200: openapi.Response(description="Результат", examples={
+                 "application/json": {"accepted": [1, 2], "rejected": [3], "skipped": []}
+             }),
+             400: openapi.Response(description="Ошибка валидации"),
+         }
+    )
+    def post(self, request):
+        serializer = ModerationResolveSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {"message": serializer.errors, "status": 400},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        data = serializer.validated_data
+
+        accepted = moderation.resolve(data['moderator'], data['accept'], PerevalAdded.ACCEPTED)
+        rejected = moderation.resolve(data['moderator'], data['reject'], PerevalAdded.REJECTED)
+        skipped = sorted(set(data['accept'] + data['reject']) - set(accepted) - set(rejected))
+        return Response(
+            {"accepted": accepted, "rejected": rejected, "skipped": skipped},
+            status=status.HTTP_200_OK
+        )
+
+
+
+class UploadSessionCreateView(APIView):
+    @swagger_auto_schema(
+         operation_summary="Начать загрузку изображения частями",
+         operation_description="Создаёт сессию загрузки. Части файла отправляются запросами PUT /uploads/<id>/ "
+                               "с заголовком Content-Range, после последней части вызывается /uploads/<id>/finalize/.",
+         request_body=UploadSessionSerializer,
+         responses={
+             201: UploadSessionSerializer,
+             400: openapi.Response(description="Ошибка валидации"),
+         }
+    )
+    def post(self, request):
+        serializer = UploadSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {"message": serializer.errors, "status": 400},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionView(APIView):
+    def get_session(self, id):
+        try:
+            return UploadSession.objects.get(id=id)
+        except UploadSession.DoesNotExist:
+            return None
+
+    def not_found(self):
+        return Response(
+            {"message": "Сессия загрузки не найдена", "status": 404},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    @swagger_auto_schema(
+         operation_summary="Состояние загрузки",
+         operation_description="Возвращает количество полученных байт — с этого смещения нужно продолжить загрузку.",
+         responses={
+             200: UploadSessionSerializer,
+             404: openapi.Response(description="Сессия не найдена"),
+         }
+    )
+    def get(self, request, id):
+        session = self.get_session(id)
+        if session is None:
+            return self.not_found()
+        return Response(UploadSessionSerializer(session).data)
+
+    @swagger_auto_schema(
+         operation_summary="Загрузить часть файла",
+         operation_description="Тело запроса — байты части файла, заголовок Content-Range: bytes <start>-<end>/<size>. "
+                               "Часть должна начинаться с текущего смещения сессии.",
+         responses={
+             200: UploadSessionSerializer,
+             400: openapi.Response(description="Нет заголовка Content-Range"),
+             404: openapi.Response(description="Сессия не найдена"),
+             409: openapi.Response(description="Смещение части не совпадает с полученным"),
+             416: openapi.Response(description="Диапазон вне размера файла"),
+         }
+    )
+    def put(self, request, id):
+        session = self.get_session(id)
+        if session is None:
+            return self.not_found()
+        try:
+            start, length = parse_content_range(request.headers.get('Content-Range'), session)
+            # Тело читается из потока запроса блоками и сразу пишется в файл
+            write_chunk(session, start, length, request.stream)
+        except UploadError as e:
+            return Response(
+                {"message": e.message, "status": e.status, "received": session.received},
+                status=e.status
+            )
+        return Response(UploadSessionSerializer(session).data)
+
+    @swagger_auto_schema(
+         operation_summary="Отменить загрузку",
+         responses={
+             204: openapi.Response(description="Сессия удалена"),
+             404: openapi.Response(description="Сессия не найдена"),
+         }
+    )
+    def delete(self, request, id):
+        session = self.get_session(id)
+        if session is None:
+            return self.not_found()
+        delete_session(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadSessionFinalizeView(APIView):
+    @swagger_auto_schema(
+         operation_summary="Завершить загрузку",
+         operation_description="Проверяет, что файл загружен полностью и является изображением, "
+                               "и прикрепляет его к перевалу.",
+         request_body=UploadFinalizeSerializer,
+         responses={
+             201: openapi.Response(description="Изображение прикреплено", examples={
+                 "application/json": {
+                     "status": 200,
+                     "message": None,
+                     "id": 42
+                 }
+             }),
+             400: openapi.Response(description="Ошибка валидации или файл не является изображением"),
+             404: openapi.Response(description="Сессия не найдена"),
+             409: openapi.Response(description="Файл загружен не полностью"),
+         }
+    )
+    def post(self, request, id):
+        try:
+            session = UploadSession.objects.get(id=id)
+        except UploadSession.DoesNotExist:
+            return Response(
+                {"message": "Сессия загрузки не найдена", "status": 404},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        serializer = UploadFinalizeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {"message": serializer.errors, "status": 400},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            image = finalize_upload(session, **serializer.validated_data)
+        except UploadError as e:
+            return Response({"message": e.message, "status": e.status}, status=e.status)
+
+        return Response(
+            {"status": 200, "message": None, "id": image.id},
+            status=status.HTTP_201_CREATED
+        )
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pereval_project.settings')
+# Чтение перевалов через асинхронные представления; PEREVAL_ASYNC_READS=0 возвращает синхронные
+os.environ.setdefault('PEREVAL_ASYNC_READS', '1')
 
 application = get_asgi_application()
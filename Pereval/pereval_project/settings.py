@@ -44,6 +44,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы время ответа включало остальные middleware
+    'pereval_app.middleware.MetricsMiddleware',
+    'pereval_app.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,18 +81,70 @@ WSGI_APPLICATION = 'pereval_project.wsgi.application'
 
 load_dotenv()
 
-DATABASES = {
+if os.getenv('FSTR_DB_NAME'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('FSTR_DB_NAME'),
+            'USER': os.getenv('FSTR_DB_LOGIN'),
+            'PASSWORD': os.getenv('FSTR_DB_PASS'),
+            'HOST': os.getenv('FSTR_DB_HOST'),
+            'PORT': os.getenv('FSTR_DB_PORT'),
+            # Соединение остаётся открытым между запросами столько секунд
+            'CONN_MAX_AGE': int(os.getenv('FSTR_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    # Пул соединений (psycopg-pool из requirements.txt); с пулом Django не
+    # держит соединения сам, поэтому CONN_MAX_AGE должен быть 0
+    if os.getenv('FSTR_DB_POOL_MAX_SIZE'):
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.getenv('FSTR_DB_POOL_MIN_SIZE', 1)),
+                'max_size': int(os.getenv('FSTR_DB_POOL_MAX_SIZE')),
+            }
+        }
+    # Реплика для чтения (pereval_app/routers.py): те же параметры, другой сервер.
+    # В тестах реплика совпадает с основной БД
+    if os.getenv('FSTR_DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.getenv('FSTR_DB_REPLICA_HOST'),
+            'PORT': os.getenv('FSTR_DB_REPLICA_PORT', os.getenv('FSTR_DB_PORT')),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    # Локальный запуск и тесты без PostgreSQL. Вторая SQLite заменяет реплику:
+    # чтение с неё включает FSTR_DB_REPLICA_NAME, тесты подключают её сами
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        },
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('FSTR_DB_REPLICA_NAME', BASE_DIR / 'db_replica.sqlite3'),
+        },
+    }
+
+DATABASE_ROUTERS = ['pereval_app.routers.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Кэш ответов сбрасывают и другие процессы (рабочие процессы сервера,
+# manage.py process_images, import_perevals), поэтому он должен быть общим:
+# по умолчанию файлы в BASE_DIR / 'cache', в продакшене — Redis или Memcached.
+# LocMemCache виден только своему процессу и годится лишь для одного процесса
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.getenv('FSTR_DB_NAME'),
-        'USER': os.getenv('FSTR_DB_LOGIN'),
-        'PASSWORD': os.getenv('FSTR_DB_PASS'),
-        'HOST': os.getenv('FSTR_DB_HOST'),
-        'PORT': os.getenv('FSTR_DB_PORT'),
+        'BACKEND': os.getenv('FSTR_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('FSTR_CACHE_LOCATION', str(BASE_DIR / 'cache')),
     }
 }
 
-
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -126,7 +181,89 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Pereval API
+
+# Максимальное количество перевалов в одном запросе POST /api/submitData/batch/
+PEREVAL_BATCH_MAX_SIZE = int(os.getenv('PEREVAL_BATCH_MAX_SIZE', 100))
+
+# Размер страницы GET /api/submitData/list/ по умолчанию и максимально допустимый
+PEREVAL_LIST_PAGE_SIZE = int(os.getenv('PEREVAL_LIST_PAGE_SIZE', 50))
+PEREVAL_LIST_MAX_PAGE_SIZE = int(os.getenv('PEREVAL_LIST_MAX_PAGE_SIZE', 500))
+
+# Количество записей, читаемых из БД за раз при выгрузке перевалов
+PEREVAL_EXPORT_CHUNK_SIZE = int(os.getenv('PEREVAL_EXPORT_CHUNK_SIZE', 2000))
+
+# Время жизни закэшированного ответа GET /api/submitData/<id>/ в секундах
+PEREVAL_DETAIL_CACHE_TIMEOUT = int(os.getenv('PEREVAL_DETAIL_CACHE_TIMEOUT', 10 * 60))
+
+# Уменьшенные копии изображений: имя копии -> максимальная сторона в пикселях
+PEREVAL_IMAGE_VARIANTS = {
+    'thumb': 320,
+    'medium': 1280,
+}
+PEREVAL_IMAGE_FORMATS = ['webp', 'jpeg']
+# Попытки обработки изображения и время, после которого зависшее задание забирается снова (секунды)
+PEREVAL_IMAGE_JOB_MAX_ATTEMPTS = 3
+PEREVAL_IMAGE_JOB_TIMEOUT = 10 * 60
+
+# Загрузка изображений частями: максимальный размер файла и размер блока записи на диск (байты)
+PEREVAL_UPLOAD_MAX_SIZE = int(os.getenv('PEREVAL_UPLOAD_MAX_SIZE', 50 * 1024 * 1024))
+PEREVAL_UPLOAD_BLOCK_SIZE = 64 * 1024
+# Через сколько часов брошенные сессии загрузки удаляет manage.py clean_uploads
+PEREVAL_UPLOAD_SESSION_TTL_HOURS = 24
+
+# Лента синхронизации отдаёт только изменения старше этого числа секунд,
+# чтобы не пропустить записи из ещё не зафиксированных транзакций
+PEREVAL_SYNC_SETTLE_SECONDS = int(os.getenv('PEREVAL_SYNC_SETTLE_SECONDS', 5))
+
+# Асинхронные представления чтения (pereval_app/async_views.py); включаются в asgi.py
+PEREVAL_ASYNC_READS = os.getenv('PEREVAL_ASYNC_READS', '0') == '1'
+
+# Очередь модерации: сколько перевалов модератор берёт за раз по умолчанию и
+# через сколько секунд непроверенные перевалы возвращаются в очередь
+PEREVAL_MODERATION_BATCH_SIZE = int(os.getenv('PEREVAL_MODERATION_BATCH_SIZE', 20))
+PEREVAL_MODERATION_CLAIM_TIMEOUT = int(os.getenv('PEREVAL_MODERATION_CLAIM_TIMEOUT', 30 * 60))
+
+# Ключи идемпотентности (заголовок Idempotency-Key): сколько секунд хранится
+# ответ для повторов; устаревшие ключи удаляет manage.py clean_idempotency_keys
+PEREVAL_IDEMPOTENCY_TTL = int(os.getenv('PEREVAL_IDEMPOTENCY_TTL', 24 * 60 * 60))
+
+# Тайлы карты: до какого масштаба перевалы объединяются в кластеры, на сколько
+# ячеек по каждой стороне делится тайл для кластеров, сколько отдельных точек
+# может быть в тайле (при большем количестве тоже отдаются кластеры) и
+# сколько секунд хранится готовый тайл
+PEREVAL_TILE_MAX_ZOOM = 20
+PEREVAL_TILE_CLUSTER_MAX_ZOOM = int(os.getenv('PEREVAL_TILE_CLUSTER_MAX_ZOOM', 10))
+PEREVAL_TILE_CLUSTER_GRID = int(os.getenv('PEREVAL_TILE_CLUSTER_GRID', 8))
+PEREVAL_TILE_MAX_POINTS = int(os.getenv('PEREVAL_TILE_MAX_POINTS', 500))
+PEREVAL_TILE_CACHE_TIMEOUT = int(os.getenv('PEREVAL_TILE_CACHE_TIMEOUT', 10 * 60))
+
+# Перевалы района: поддерево до стольких районов читается постранично по каждому
+# району и сливается, большее — одним запросом через таблицу замыкания
+PEREVAL_AREA_MERGE_MAX_AREAS = int(os.getenv('PEREVAL_AREA_MERGE_MAX_AREAS', 10))
+
+# Реплика БД для чтения перевала, списка, поиска и выгрузки (pereval_app/routers.py)
+# и на сколько секунд после записи клиент читает основную БД, чтобы видеть свои изменения
+PEREVAL_DB_REPLICA = 'replica' if os.getenv('FSTR_DB_REPLICA_HOST') or os.getenv('FSTR_DB_REPLICA_NAME') else None
+PEREVAL_DB_REPLICA_LAG = int(os.getenv('PEREVAL_DB_REPLICA_LAG', 5))
+
+# Отдача медиафайлов (pereval_app/media.py). За прокси файл отдаёт сам прокси:
+# x-accel-redirect для nginx (location с префиксом PEREVAL_MEDIA_ACCEL_PREFIX,
+# internal и alias на MEDIA_ROOT) или x-sendfile для Apache и lighttpd;
+# без настройки файлы отдаёт Django через FileResponse
+PEREVAL_MEDIA_OFFLOAD = os.getenv('PEREVAL_MEDIA_OFFLOAD', '')
+PEREVAL_MEDIA_ACCEL_PREFIX = os.getenv('PEREVAL_MEDIA_ACCEL_PREFIX', '/protected-media/')
+# Сколько секунд клиенты кэшируют копии изображений; файлы, сохранённые по хешу
+# содержимого, не меняются и кэшируются на год
+PEREVAL_MEDIA_MAX_AGE = int(os.getenv('PEREVAL_MEDIA_MAX_AGE', 60 * 60))
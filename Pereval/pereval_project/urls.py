@@ -1,9 +1,13 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include, re_path
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from pereval_app.media import media_view
+from pereval_app.metrics import metrics_view
+
 schema_view = get_schema_view(
     openapi.Info(
         title="FSTR API",
@@ -18,6 +22,8 @@ schema_view = get_schema_view(
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('pereval_app.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>', media_view, name='media'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]